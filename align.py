@@ -0,0 +1,241 @@
+"""
+Timestamp-based pairing of the accelerometer and potentiometer streams.
+
+While capturing, when each chunk's bytes arrived goes to <path>stream.times,
+a .times log like the ones capture.RotatingCapture keeps for raw captures,
+and the stream offset where every sample's record ends goes to
+<path>accel_offsets.npy and <path>pot_offsets.npy next to the usual outputs.
+Sample times come from the log through rawindex.time_of, so there's one
+record of host time and one rule for reading it. Afterwards each accel
+sample is matched to the nearest pot sample in time with np.searchsorted,
+instead of pairing the two by index, and the quality of the match is
+summarised in <path>alignment.csv.
+"""
+
+import csv
+
+import numpy as np
+
+import capture
+import pipeline
+import columnar
+import rawindex
+from records import ACCEL_TAG, POT_TAG
+
+# <path>STREAM_NAME + rawindex.TIMES_SUFFIX is the stream's .times log.
+STREAM_NAME = 'stream'
+
+OFFSET_DTYPE = np.dtype('<u8')
+
+ALIGNED_FIELDS = ['Time', 'Accelerometer Sample', 'Potentiometer Sample', 'X Data', 'Y Data', 'Z Data', 'Potentiometer Data', 'Offset']
+RESAMPLED_FIELDS = ['Time', 'X Data', 'Y Data', 'Z Data', 'Potentiometer Data']
+
+CHUNK_ROWS = 1 << 16
+
+class OffsetSink(object):
+    """
+    Streams the end offset of every sample's record to <path>accel_offsets.npy
+    and <path>pot_offsets.npy.
+    """
+
+    def __init__(self, path):
+        self.accel = columnar.NpyWriter(path + 'accel_offsets.npy', OFFSET_DTYPE)
+        self.pot = columnar.NpyWriter(path + 'pot_offsets.npy', OFFSET_DTYPE)
+
+    def write(self, tag, offset):
+
+        if tag == ACCEL_TAG:
+            self.accel.append(offset)
+        elif tag == POT_TAG:
+            self.pot.append(offset)
+
+    def close(self, accel_count, pot_count):
+        """
+        Trim the offsets to the sample counts the data sink kept.
+        """
+
+        self.accel.close(accel_count)
+        self.pot.close(pot_count)
+
+def logged_chunks(timed_chunks, log, byte_time):
+    """
+    Yield the chunks of (timestamp, chunk) pairs, logging when each one's
+    bytes arrived to log, a capture.TimeLog.
+    """
+
+    offset = 0
+
+    for (timestamp, chunk) in timed_chunks:
+        log.add_chunk(timestamp, offset, offset + len(chunk), byte_time)
+        offset += len(chunk)
+
+        yield chunk
+
+def run_timed(path, timed_chunks, byte_time, sink_class=pipeline.CsvSink, instruments=None, stats=None):
+    """
+    Like pipeline.run, for (timestamp, chunk) pairs, also logging when the
+    bytes arrived to <path>stream.times and each sample's offset through an
+    OffsetSink. byte_time is the line's seconds per byte, for working back
+    when each chunk began arriving.
+    """
+
+    sink = sink_class(path)
+    offsets = OffsetSink(path)
+    log = capture.TimeLog(path + STREAM_NAME, 0, interval=0)
+
+    if instruments is not None:
+        timed_chunks = instruments.watch_timed_chunks(timed_chunks)
+
+    try:
+        offset_records = pipeline.frame_offsets(logged_chunks(timed_chunks, log, byte_time), instruments)
+        for (offset, tag, values) in pipeline.decode_offsets(offset_records, instruments):
+            sink.write(tag, values)
+            offsets.write(tag, offset)
+            if stats is not None:
+                stats.write(tag, values)
+    finally:
+        counts = sink.close()
+        offsets.close(*counts)
+        log.close()
+        if stats is not None:
+            stats.close()
+
+    return counts
+
+def load_times(path):
+    """
+    Return the (accel, pot) host timestamps for the outputs at path, reading
+    each sample's offset against the stream's .times log.
+    """
+
+    times = rawindex.load_times(path + STREAM_NAME)
+    if times is None:
+        raise ValueError("No host timestamps in " + path + STREAM_NAME + rawindex.TIMES_SUFFIX)
+
+    accel = rawindex.time_of(times, np.load(path + 'accel_offsets.npy', mmap_mode='r'))
+    pot = rawindex.time_of(times, np.load(path + 'pot_offsets.npy', mmap_mode='r'))
+
+    return (accel, pot)
+
+def nearest(reference, times):
+    """
+    For every value in times, return the index of the nearest value in the
+    sorted array reference, and the signed offset times - reference[index].
+    """
+
+    if len(reference) == 1:
+        index = np.zeros(len(times), dtype=np.intp)
+    else:
+        index = np.clip(np.searchsorted(reference, times), 1, len(reference) - 1)
+        index -= (times - reference[index - 1]) < (reference[index] - times)
+
+    return (index, times - reference[index])
+
+def align(accel_times, pot_times, tolerance=None):
+    """
+    Match every accel sample to the nearest pot sample in time. Pairs further
+    apart than tolerance seconds are left unmatched; by default the
+    tolerance is half the median pot sample interval.
+
+    Returns (accel_index, pot_index, offset) for the matched pairs.
+    """
+
+    if len(accel_times) == 0 or len(pot_times) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return (empty, empty, np.zeros(0))
+
+    if tolerance is None:
+        tolerance = 0.5 * np.median(np.diff(pot_times)) if len(pot_times) > 1 else np.inf
+
+    (pot_index, offset) = nearest(pot_times, accel_times)
+    matched = np.abs(offset) <= tolerance
+    accel_index = np.flatnonzero(matched)
+
+    return (accel_index, pot_index[matched], offset[matched])
+
+def statistics(accel_times, pot_times, accel_index, pot_index, offset):
+    """
+    Summarise how well the streams lined up, as (name, value) rows.
+    """
+
+    rows = [
+        ('Accelerometer Samples', len(accel_times)),
+        ('Potentiometer Samples', len(pot_times)),
+        ('Matched Pairs', len(accel_index)),
+        ('Unmatched Accelerometer Samples', len(accel_times) - len(accel_index)),
+        ('Potentiometer Samples Used More Than Once', len(pot_index) - len(np.unique(pot_index))),
+    ]
+
+    if len(offset):
+        magnitude = np.abs(offset)
+        drift = pot_index.astype(np.int64) - accel_index
+
+        rows += [
+            ('Mean Offset (s)', float(offset.mean())),
+            ('Median Absolute Offset (s)', float(np.median(magnitude))),
+            ('95th Percentile Absolute Offset (s)', float(np.percentile(magnitude, 95))),
+            ('Max Absolute Offset (s)', float(magnitude.max())),
+            ('Index Drift Min (samples)', int(drift.min())),
+            ('Index Drift Max (samples)', int(drift.max())),
+        ]
+
+    return rows
+
+def resample(times, values, grid):
+    """
+    Linearly interpolate values sampled at times onto grid.
+    """
+
+    return np.interp(grid, times, values)
+
+def write_rows(filename, fields, columns):
+
+    with open(filename, 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fields)
+
+        for start in range(0, len(columns[0]), CHUNK_ROWS):
+            writer.writerows(zip(*[column[start:start + CHUNK_ROWS].tolist() for column in columns]))
+
+def align_outputs(path, load_output=pipeline.load_output, tolerance=None, rate=None):
+    """
+    Align the streams of a timed capture at path. Writes <path>aligned.csv
+    with the matched pairs and <path>alignment.csv with the statistics. With
+    a rate in Hz, also writes <path>resampled.csv with both streams
+    interpolated onto a common grid. Returns the statistics rows.
+    """
+
+    (sample_num, accel, pot) = load_output(path)
+    (accel_times, pot_times) = load_times(path)
+
+    accel = np.asarray(accel)
+    if accel.dtype.names:
+        accel = np.column_stack((accel['x'], accel['y'], accel['z']))
+    pot = np.asarray(pot)
+
+    (accel_index, pot_index, offset) = align(accel_times, pot_times, tolerance)
+    start = min(accel_times[0], pot_times[0]) if len(accel_times) and len(pot_times) else 0.0
+
+    write_rows(path + 'aligned.csv', ALIGNED_FIELDS, [
+        accel_times[accel_index] - start, accel_index, pot_index,
+        accel[accel_index, 0], accel[accel_index, 1], accel[accel_index, 2],
+        pot[pot_index], offset])
+
+    rows = statistics(accel_times, pot_times, accel_index, pot_index, offset)
+
+    with open(path + 'alignment.csv', 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Statistic', 'Value'])
+        writer.writerows(rows)
+
+    if rate and len(accel_times) > 1 and len(pot_times) > 1:
+        grid = np.arange(max(accel_times[0], pot_times[0]), min(accel_times[-1], pot_times[-1]), 1.0 / rate)
+
+        write_rows(path + 'resampled.csv', RESAMPLED_FIELDS, [
+            grid - start,
+            resample(accel_times, accel[:, 0], grid),
+            resample(accel_times, accel[:, 1], grid),
+            resample(accel_times, accel[:, 2], grid),
+            resample(pot_times, pot, grid)])
+
+    return rows
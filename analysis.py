@@ -0,0 +1,62 @@
+"""
+NumPy versions of the per-sample math in the plot_* functions. The operations
+are done in the same order and precision as the original list comprehensions,
+so the results are identical to them, not just close.
+"""
+
+import numpy as np
+
+# Divisor used when every sample has the same value, as in the original code.
+ZERO_RANGE = 0.00001
+
+def as_columns(data):
+    """
+    Return accelerometer data as an (n, 3) array. Accepts a sequence of
+    (x, y, z) tuples, an (n, 3) array or a structured array with x, y and z
+    fields such as vector_decode returns.
+    """
+
+    if isinstance(data, np.ndarray) and data.dtype.names:
+        return np.column_stack((data['x'], data['y'], data['z']))
+
+    return np.asarray(data).reshape(-1, 3)
+
+def magnitude(data):
+    """
+    Return the vector magnitude of every (x, y, z) sample as float64.
+    """
+
+    columns = as_columns(data)
+
+    if columns.dtype.kind in 'iub':
+        # Integer squares and sums are exact, as they are for Python ints.
+        columns = columns.astype(np.int64)
+
+    squares = columns ** 2
+    total = squares[:, 0] + squares[:, 1] + squares[:, 2]
+
+    return np.sqrt(total.astype(np.float64))
+
+def normalize(data, bounds=None):
+    """
+    Scale data into [0, 1] using its min and max, or the (min, max) given in
+    bounds, such as runstats.RunningStats.bounds() kept while collecting.
+    When every sample is the same, divide by ZERO_RANGE instead, matching
+    the original fallback.
+    """
+
+    values = np.asarray(data)
+    if values.dtype.kind in 'iub':
+        values = values.astype(np.int64)
+
+    if bounds is None:
+        (min_data, max_data) = (values.min(), values.max())
+    else:
+        (min_data, max_data) = bounds
+
+    difference = (values - min_data).astype(np.float64)
+
+    if max_data == min_data:
+        return difference / ZERO_RANGE
+
+    return difference / float(max_data - min_data)
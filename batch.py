@@ -0,0 +1,147 @@
+import os
+import sys
+import csv
+import glob
+import time
+import multiprocessing
+
+import parser
+import columnar
+import pipeline
+import rawindex
+
+SUMMARY_FIELDS = ['File', 'Bytes', 'Accelerometer Samples', 'Potentiometer Samples', 'Seconds', 'MB/s', 'Records/s', 'Error']
+
+def check_arguments():
+
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python batch.py <capture-directory-or-glob> <output-folder-name> [worker-count]")
+        sys.exit(-1)
+
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    return (sys.argv[1], sys.argv[2], workers)
+
+def find_captures(source):
+    """
+    Return the capture files in a directory, or matching a glob pattern,
+    leaving out the sidecar files rawindex keeps next to them.
+    """
+
+    if os.path.isdir(source):
+        names = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        names = glob.glob(source)
+
+    return sorted(name for name in names if os.path.isfile(name) and not rawindex.is_sidecar(name))
+
+def output_names(captures):
+    """
+    Return the output folder name for each capture: its path relative to the
+    directory all of them share, without the extension and with separators
+    turned into '_', so 'a/run.txt' and 'b/run.txt' get 'a_run' and 'b_run'.
+    Raises ValueError when two captures would still share a folder, as
+    'run.txt' and 'run.gz' would.
+    """
+
+    common = os.path.commonpath([os.path.dirname(os.path.abspath(filename)) for filename in captures]) if captures else ''
+    names = []
+    seen = {}
+
+    for filename in captures:
+        name = os.path.splitext(os.path.relpath(os.path.abspath(filename), common))[0].replace(os.sep, '_')
+        if name in seen:
+            raise ValueError("'" + seen[name] + "' and '" + filename + "' would both be written to '" + name + "'.")
+        seen[name] = filename
+        names.append(name)
+
+    return names
+
+def process_capture(job):
+    """
+    Parse one capture as a stream into .npy columns in its own folder, then
+    write the CSVs and plots from the memory-mapped columns. Parsing doesn't
+    hold the capture in memory, but the plots normalize the full series, so
+    that step's memory grows with the capture. Any failure, a corrupt or
+    unreadable file included, is returned as the row's error.
+    """
+
+    (filename, path) = job
+
+    start = time.perf_counter()
+    accel_count = 0
+    pot_count = 0
+    error = ''
+
+    try:
+        os.makedirs(path, exist_ok=True)
+
+        (accel_count, pot_count) = pipeline.run(path, pipeline.file_chunks(filename), flush=True,
+                                                sink_class=columnar.NpySink)
+        columnar.to_csv(path)
+
+        if accel_count and pot_count:
+            (sample_num, accel, pot) = columnar.load_output(path)
+
+            pot_norm   = parser.plot_potentiometer(path, sample_num, pot)
+            accel_norm = parser.plot_accelerometer(path, sample_num, accel)
+
+            parser.plot_both(path, sample_num, pot_norm, accel_norm)
+    except Exception as e:
+        error = type(e).__name__ + ": " + str(e)
+
+    return (filename, os.path.getsize(filename), accel_count, pot_count, time.perf_counter() - start, error)
+
+def run(captures, output, workers=None):
+    """
+    Process captures on a pool of workers, writing each one's outputs to
+    <output>/<name>/, named by output_names, and a summary of all of them
+    to <output>/summary.csv. Each worker is replaced after every capture so
+    memory from one file isn't carried into the next.
+    """
+
+    jobs = [(filename, os.path.join(output, name) + '/') for (filename, name) in zip(captures, output_names(captures))]
+    rows = []
+
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+        for (filename, size, accel_count, pot_count, seconds, error) in pool.imap_unordered(process_capture, jobs):
+            records = accel_count + pot_count
+            rows.append([filename, size, accel_count, pot_count, '%.3f' % seconds,
+                         '%.2f' % (size / 1e6 / seconds), '%.0f' % (records / seconds), error])
+
+            print(filename + ": " + str(records) + " records in " + ('%.2f' % seconds) + " s" + (" - " + error if error else ""))
+
+    elapsed = time.perf_counter() - start
+    rows.sort()
+
+    with open(os.path.join(output, 'summary.csv'), 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(SUMMARY_FIELDS)
+        writer.writerows(rows)
+
+    total_bytes = sum(row[1] for row in rows)
+    total_records = sum(row[2] + row[3] for row in rows)
+    print("Processed " + str(len(rows)) + " captures, " + str(total_records) + " records in " + ('%.2f' % elapsed) +
+          " s (" + ('%.2f' % (total_bytes / 1e6 / elapsed)) + " MB/s, " + ('%.0f' % (total_records / elapsed)) + " records/s).")
+
+    return rows
+
+if __name__ == "__main__":
+
+    source, output, workers = check_arguments()
+
+    captures = find_captures(source)
+    if not captures:
+        print("No capture files found in '" + source + "'.")
+        sys.exit(-1)
+
+    try:
+        output_names(captures)
+    except ValueError as e:
+        print("Error: " + str(e) + " Rename one of them, or process them separately.")
+        sys.exit(-1)
+
+    path = parser.check_filename(output)
+    run(captures, path, workers)
@@ -0,0 +1,153 @@
+"""
+Aligns synthetic accel and pot timestamps, with per-record jitter and a
+slow clock drift between the streams, and checks align() pairs each accel
+sample with the pot sample it was generated next to. Reports the time taken
+and the match statistics, against the index pairing the tail truncation
+implied.
+
+Also runs a synthetic stream through align.run_timed, read in uneven chunks
+with pauses, and checks every sample's time from the stream's .times log is
+within about a read's latency of when its record really arrived, and that
+rawindex, reading the same log, maps each of those times back to the end of
+that sample's record.
+
+Usage: python benchmarks/bench_align.py [samples-per-stream]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+import synthetic
+
+import align
+import rawindex
+from framing import byte_time
+
+RATE = 1000.0
+JITTER = 0.00005
+DRIFT = 20e-6
+
+def synthetic_times(count, seed=0):
+    """
+    Return (accel_times, pot_times, pot_for_accel), pot_for_accel being the
+    pot sample each accel sample was generated next to. The pot clock runs DRIFT
+    fast, so by the end of a long capture the streams have slipped by whole
+    samples and pairing by index goes wrong.
+    """
+
+    random = np.random.RandomState(seed)
+    base = np.arange(count) / RATE
+
+    accel_times = base + random.uniform(-JITTER, JITTER, count)
+    pot_times = base * (1.0 - DRIFT) + 0.3 / RATE + random.uniform(-JITTER, JITTER, count)
+    accel_times.sort()
+    pot_times.sort()
+
+    # Ground truth from the jitter-free clocks.
+    pot_for_accel = np.clip(np.rint((base - 0.3 / RATE) / (1.0 - DRIFT) * RATE), 0, count - 1).astype(np.intp)
+
+    return (accel_times, pot_times, pot_for_accel)
+
+# Most a synthetic read lags the arrival of its last byte, in seconds.
+READ_LATENCY = 0.002
+
+def timed_chunks(payload, seconds_per_byte, seed=0):
+    """
+    Yield (timestamp, chunk) pairs for payload arriving at seconds_per_byte,
+    with a pause now and then, each chunk read up to READ_LATENCY after its
+    last byte arrived (a little more when reads come back to back). Sets arrival[offset] to when the byte ending at offset
+    arrived.
+    """
+
+    random = np.random.RandomState(seed)
+    clock = time.monotonic() + 1.0    # After the entry the log opens with.
+    read = clock
+    offset = 0
+
+    while offset < len(payload):
+        size = int(random.randint(1, 400))
+        if random.rand() < 0.05:
+            clock += random.uniform(0.01, 0.5)
+
+        ends = np.arange(offset + 1, min(offset + size, len(payload)) + 1)
+        arrival[ends] = clock + (ends - offset) * seconds_per_byte
+        clock = arrival[ends[-1]]
+        offset = int(ends[-1])
+
+        # Reads happen one after another, each taking a few microseconds.
+        read = max(read + 5e-6, clock + random.uniform(0, READ_LATENCY))
+
+        yield (read, payload[ends[0] - 1:offset])
+
+def check_stream_times(pairs):
+
+    global arrival
+
+    payload = synthetic.synthetic_stream(pairs)
+    seconds_per_byte = byte_time(115200)
+    arrival = np.zeros(len(payload) + 1)
+    workdir = tempfile.mkdtemp() + '/'
+
+    try:
+        opened = time.time()
+        counts = align.run_timed(workdir, timed_chunks(payload, seconds_per_byte), seconds_per_byte)
+        assert counts == (pairs, pairs)
+
+        (accel_times, pot_times) = align.load_times(workdir)
+        worst = 0.0
+        for (name, times) in (('accel', accel_times), ('pot', pot_times)):
+            offsets = np.load(workdir + name + '_offsets.npy')
+            error = times - arrival[offsets]
+            assert np.all(error >= -seconds_per_byte) and np.all(error <= 2 * READ_LATENCY), (name, error.min(), error.max())
+            worst = max(worst, np.abs(error).max())
+
+        # The same bytes as a raw capture next to the log, as RotatingCapture leaves them.
+        with open(workdir + align.STREAM_NAME, 'wb') as file:
+            file.write(payload)
+        index = rawindex.open_index(workdir + align.STREAM_NAME)
+        offsets = np.load(workdir + 'accel_offsets.npy')
+        for i in range(0, pairs, max(1, pairs // 1000)):
+            assert index.offset_at(accel_times[i]) == offsets[i], i
+
+        # Log times are monotonic; the anchor turns them back into dates.
+        assert abs(index.start_time() - opened) < 1.0, (index.start_time(), opened)
+
+        print("%d samples per stream timed from the .times log, at worst %.2f ms from arrival; rawindex agrees" %
+              (pairs, worst * 1e3))
+    finally:
+        shutil.rmtree(workdir)
+
+def main():
+
+    check_stream_times(20000)
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    (accel_times, pot_times, pot_for_accel) = synthetic_times(count)
+
+    start = time.perf_counter()
+    (accel_index, pot_index, offset) = align.align(accel_times, pot_times)
+    elapsed = time.perf_counter() - start
+
+    correct = np.count_nonzero(pot_index == pot_for_accel[accel_index])
+    by_index = np.count_nonzero(pot_for_accel == np.arange(count))
+
+    # Every pair is the nearest pot sample; the ground truth only differs
+    # where the jitter moved a sample across the midpoint between two others.
+    for neighbour in (pot_index - 1, pot_index + 1):
+        valid = (neighbour >= 0) & (neighbour < count)
+        assert np.all(np.abs(offset[valid]) <= np.abs(accel_times[accel_index][valid] - pot_times[neighbour[valid]]))
+    assert correct >= 0.95 * count
+
+    print("%d samples per stream aligned in %.3f s (%.1f M samples/s)" % (count, elapsed, count / elapsed / 1e6))
+    print("align(): %d of %d pairs correct   pairing by index: %d of %d correct" % (correct, count, by_index, count))
+
+    for (name, value) in align.statistics(accel_times, pot_times, accel_index, pot_index, offset):
+        print("  %-45s %s" % (name, value))
+
+if __name__ == "__main__":
+    main()
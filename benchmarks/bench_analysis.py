@@ -0,0 +1,73 @@
+"""
+Checks analysis.magnitude and analysis.normalize against the list
+comprehensions the plot_* functions used to run, and times both.
+
+Usage: python benchmarks/bench_analysis.py [samples ...]
+"""
+
+import sys
+import math
+import time
+import random
+
+import numpy as np
+
+import synthetic
+
+import analysis
+
+def legacy_normalize(data):
+
+    min_data = min(data)
+    max_data = max(data)
+
+    try:
+        normalized = [float(x - min_data)/float(max_data - min_data) for x in data]
+    except ZeroDivisionError:
+        normalized = [float(x - min_data)/0.00001 for x in data]
+
+    return normalized
+
+def legacy_magnitude(data):
+
+    return [math.sqrt((i[0] ** 2) + (i[1] ** 2) + (i[2] ** 2)) for i in data]
+
+def timed(function, *args):
+
+    start = time.perf_counter()
+    result = function(*args)
+
+    return (result, time.perf_counter() - start)
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    rng = random.Random(0)
+
+    # The zero-range fallback has to match too.
+    assert analysis.normalize([7, 7, 7]).tolist() == legacy_normalize([7, 7, 7])
+    assert analysis.normalize(analysis.magnitude([(1, 2, 3)] * 3)).tolist() == legacy_normalize(legacy_magnitude([(1, 2, 3)] * 3))
+
+    for samples in sizes:
+        accel = [(rng.randrange(0x10000), rng.randrange(0x10000), rng.randrange(0x10000)) for i in range(samples)]
+        pot = [rng.randrange(0x1000) for i in range(samples)]
+
+        (old_accel, old_accel_time) = timed(lambda: legacy_normalize(legacy_magnitude(accel)))
+        (old_pot, old_pot_time) = timed(legacy_normalize, pot)
+        (new_accel, new_accel_time) = timed(lambda: analysis.normalize(analysis.magnitude(accel)))
+        (new_pot, new_pot_time) = timed(analysis.normalize, pot)
+
+        # Arrays straight from vector_decode skip the list conversion.
+        accel_array = np.asarray(accel)
+        pot_array = np.asarray(pot)
+        (_, array_accel_time) = timed(lambda: analysis.normalize(analysis.magnitude(accel_array)))
+        (_, array_pot_time) = timed(analysis.normalize, pot_array)
+
+        assert new_accel.tolist() == old_accel
+        assert new_pot.tolist() == old_pot
+
+        print("%9d samples  accel %7.3f s -> %7.3f s (%7.3f s from arrays)   pot %7.3f s -> %7.3f s (%7.3f s from arrays)" %
+              (samples, old_accel_time, new_accel_time, array_accel_time, old_pot_time, new_pot_time, array_pot_time))
+
+if __name__ == "__main__":
+    main()
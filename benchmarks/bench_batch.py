@@ -0,0 +1,77 @@
+"""
+Runs batch.run over a directory of synthetic captures that includes a
+corrupt '.gz' and a capture with the same name in another folder. The
+batch must finish and write summary.csv, with the corrupt capture's
+error in its row and every other capture parsed into a folder of its own.
+Also checks captures whose names would collide are refused.
+
+Usage: python benchmarks/bench_batch.py [record-pairs] [worker-count]
+"""
+
+import os
+import sys
+import csv
+import gzip
+import time
+import shutil
+import tempfile
+
+from synthetic import synthetic_stream
+
+import batch
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    workdir = tempfile.mkdtemp()
+
+    try:
+        source = os.path.join(workdir, 'captures')
+        output = os.path.join(workdir, 'output')
+        for folder in ('a', 'b'):
+            os.makedirs(os.path.join(source, folder))
+        os.mkdir(output)
+
+        payload = synthetic_stream(pairs)
+        with open(os.path.join(source, 'a', 'run.txt'), 'wb') as file:
+            file.write(payload)
+        with open(os.path.join(source, 'b', 'run.txt'), 'wb') as file:
+            file.write(payload)
+
+        with open(os.path.join(source, 'b', 'broken.gz'), 'wb') as file:
+            file.write(b'not gzip data\r' * 1000)
+
+        captures = batch.find_captures(os.path.join(source, '*', '*'))
+        assert batch.output_names(captures) == ['a_run', 'b_broken', 'b_run']
+
+        start = time.perf_counter()
+        batch.run(captures, output, workers)
+        elapsed = time.perf_counter() - start
+
+        with open(os.path.join(output, 'summary.csv')) as csvfile:
+            rows = dict((row['File'], row) for row in csv.DictReader(csvfile))
+
+        assert len(rows) == 3
+        for name in ('a_run', 'b_run'):
+            row = rows[os.path.join(source, *name.split('_')) + '.txt']
+            assert (row['Accelerometer Samples'], row['Potentiometer Samples'], row['Error']) == (str(pairs), str(pairs), ''), row
+            assert os.path.isfile(os.path.join(output, name, 'accel.csv'))
+        assert rows[os.path.join(source, 'b', 'broken.gz')]['Error'], rows
+
+        with open(os.path.join(source, 'a', 'run.gz'), 'wb') as file:
+            file.write(gzip.compress(payload))
+        try:
+            batch.output_names(batch.find_captures(os.path.join(source, 'a')))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("run.txt and run.gz were given the same folder")
+
+        print("3 captures, one corrupt, on %d workers in %.2f s; the batch finished and recorded: %s" %
+              (workers, elapsed, rows[os.path.join(source, 'b', 'broken.gz')]['Error']))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
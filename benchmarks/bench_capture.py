@@ -0,0 +1,105 @@
+"""
+Runs a synthetic capture through capture.tee and pipeline.run, the way
+capture_data does, and reports the reader's throughput and the
+time from the last chunk to finished outputs for each fsync interval and
+backpressure setting; the teed rows parse while they collect. The old flow,
+collecting records and then running parse_data, is timed for comparison.
+Checks the rotated capture files replay to the same outputs.
+
+Usage: python benchmarks/bench_capture.py [record-pairs]
+"""
+
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+
+from synthetic import synthetic_stream
+
+import capture
+import parser
+import pipeline
+
+CHUNK = 4096
+
+# (name, put_timeout, fsync_interval)
+SETTINGS = [
+    ('block, no fsync', None, None),
+    ('block, fsync 1 s', None, 1.0),
+    ('block, fsync 0.1 s', None, 0.1),
+    ('drop, fsync 1 s', 0, 1.0),
+]
+
+def chunks_of(payload):
+
+    for start in range(0, len(payload), CHUNK):
+        yield payload[start:start + CHUNK]
+
+def legacy(path, payload):
+
+    framer_records = list(pipeline.frame(chunks_of(payload)))
+    stopped = time.perf_counter()
+    parser.parse_data(path, framer_records)
+
+    return stopped
+
+def teed(path, payload, put_timeout, fsync_interval):
+
+    writer = capture.CaptureWriter(capture.RotatingCapture(path, 8 << 20),
+                                   put_timeout=put_timeout, fsync_interval=fsync_interval)
+    stopped = [None]
+
+    def chunks():
+        for chunk in capture.tee(chunks_of(payload), writer):
+            yield chunk
+        stopped[0] = time.perf_counter()
+
+    try:
+        pipeline.run(path, chunks())
+    finally:
+        writer.close()
+
+    return (stopped[0], writer)
+
+def fresh(workdir, name):
+
+    path = os.path.join(workdir, name) + '/'
+    os.mkdir(path)
+
+    return path
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    payload = synthetic_stream(pairs)
+    workdir = tempfile.mkdtemp()
+    mb = len(payload) / 1e6
+
+    try:
+        path = fresh(workdir, 'legacy')
+        start = time.perf_counter()
+        stopped = legacy(path, payload)
+        done = time.perf_counter()
+        print("%-20s %7.1f MB/s collecting  %6.2f s to outputs after the last chunk" %
+              ('records, parse_data', mb / (stopped - start), done - stopped))
+
+        for (i, (name, put_timeout, fsync_interval)) in enumerate(SETTINGS):
+            path = fresh(workdir, 'tee%d' % i)
+            start = time.perf_counter()
+            (stopped, writer) = teed(path, payload, put_timeout, fsync_interval)
+            done = time.perf_counter()
+            print("%-20s %7.1f MB/s collecting  %6.2f s to outputs after the last chunk  (%s)" %
+                  (name, mb / (stopped - start), done - stopped, writer.summary()))
+
+            if writer.dropped == 0:
+                replay = fresh(workdir, 'replay%d' % i)
+                pipeline.run(replay, capture.capture_chunks(path))
+                for output in ('accel.csv', 'pot.csv'):
+                    assert filecmp.cmp(path + output, replay + output, shallow=False), output
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares writing and reloading the CSV outputs against the .npy outputs.
+
+Usage: python benchmarks/bench_columnar.py [record-pairs ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from synthetic import synthetic_stream
+
+import pipeline
+import columnar
+
+def timed(function, *args):
+
+    start = time.perf_counter()
+    result = function(*args)
+
+    return (result, time.perf_counter() - start)
+
+def write(path, sink_class, decoded):
+
+    sink = sink_class(path)
+    for tag, values in decoded:
+        sink.write(tag, values)
+
+    return sink.close()
+
+def size(path, extension):
+
+    return sum(os.path.getsize(path + name + extension) for name in ('accel', 'pot'))
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    workdir = tempfile.mkdtemp() + '/'
+
+    try:
+        for pairs in sizes:
+            decoded = list(pipeline.decode(pipeline.frame([synthetic_stream(pairs)])))
+
+            (_, csv_write) = timed(write, workdir, pipeline.CsvSink, decoded)
+            (_, npy_write) = timed(write, workdir, columnar.NpySink, decoded)
+            (_, csv_load) = timed(pipeline.load_output, workdir)
+            (_, npy_load) = timed(columnar.load_output, workdir)
+
+            print("%9d pairs  csv: write %6.2f s, %7.1f MB, load %6.2f s   npy: write %6.2f s, %7.1f MB, load %8.5f s" %
+                  (pairs, csv_write, size(workdir, '.csv') / 1e6, csv_load,
+                   npy_write, size(workdir, '.npy') / 1e6, npy_load))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
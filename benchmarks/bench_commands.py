@@ -0,0 +1,151 @@
+"""
+Drives commands.CommandChannel against a simulated MCU on a pty. The
+simulator streams accelerometer and potentiometer records the whole time,
+answers '~SHGV' with a version record after a short delay and ignores
+everything else. A batch of version requests at full rate must all be
+answered in order, each reply matched to its own request. A batch run one
+request at a time while the simulator drops every DROP_EVERY-th request
+must time exactly those out and still match the rest; pipelined, a lost
+reply would shift the matching, as the commands module explains.
+
+Usage: python benchmarks/bench_commands.py [requests] [reply-delay-ms]
+"""
+
+import os
+import sys
+import tty
+import time
+import select
+import threading
+
+import serial
+
+import synthetic
+
+import commands
+from records import VERSION_TAG
+
+DROP_EVERY = 5
+
+# Seconds the simulator waits on the pty before checking it should stop.
+POLL = 0.05
+
+class SimulatedMCU(object):
+    """
+    The MCU end of a pty: streams data records and answers version requests
+    delay seconds after they arrive, numbering the replies so the test can
+    tell which request each answered. With drop_every set, every
+    drop_every-th request goes unanswered.
+    """
+
+    def __init__(self, delay=0.002, drop_every=None):
+        (self.master, slave) = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.slave = slave
+
+        self.delay = delay
+        self.drop_every = drop_every
+        self.received = 0
+        self.dropped = set()
+        self.running = True
+        self.replies = []
+
+        self.stream = synthetic.synthetic_stream(1000).split(b'\r')[:-1]
+        self.threads = [threading.Thread(target=self.listen), threading.Thread(target=self.emit)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def write(self, data):
+        """
+        Write to the port unless it's been full for POLL seconds, as when
+        nothing's reading it any more.
+        """
+
+        while data and self.running:
+            if select.select([], [self.master], [], POLL)[1]:
+                data = data[os.write(self.master, data):]
+
+    def listen(self):
+
+        buffer = b''
+        while self.running:
+            if not select.select([self.master], [], [], POLL)[0]:
+                continue
+            try:
+                buffer += os.read(self.master, 4096)
+            except OSError:
+                break
+
+            *messages, buffer = buffer.split(b'\r')
+            for message in messages:
+                if message != b'~SHGV':
+                    continue
+                self.received += 1
+                if self.drop_every and self.received % self.drop_every == 0:
+                    self.dropped.add(self.received)
+                    continue
+                self.replies.append((time.monotonic() + self.delay, self.received))
+
+    def emit(self):
+
+        i = 0
+        while self.running:
+            now = time.monotonic()
+            while self.replies and self.replies[0][0] <= now:
+                (due, number) = self.replies.pop(0)
+                self.write(VERSION_TAG + b',%04d,0002,0003,0004\r' % number)
+
+            self.write(self.stream[i % len(self.stream)] + b'\r')
+            i += 1
+            time.sleep(0.0002)
+
+    def close(self):
+
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        os.close(self.slave)
+        os.close(self.master)
+
+def run(count, delay, drop_every=None, timeout=commands.COMMAND_TIMEOUT, max_in_flight=commands.MAX_IN_FLIGHT):
+
+    mcu = SimulatedMCU(delay, drop_every)
+    s = serial.Serial(mcu.port, timeout=0.01)
+    channel = commands.CommandChannel(s, timeout, max_in_flight)
+    channel.start_reader()
+
+    try:
+        (requests, seconds) = commands.run_batch(channel, ['version'], count)
+        channel.close()
+    finally:
+        s.close()
+        mcu.close()
+
+    return (channel, requests, seconds, mcu.dropped)
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    delay = float(sys.argv[2]) / 1000.0 if len(sys.argv) > 2 else 0.002
+
+    (channel, requests, seconds, dropped) = run(count, delay)
+    assert not dropped
+    assert [int(request.reply.split(b',')[1]) for request in requests] == list(range(1, count + 1))
+    assert channel.replied['version'] == count and not channel.timed_out
+    print("%d version requests, %.1f ms reply delay   %.2f s (%.0f commands/s)   %s   %d data records passed over" %
+          (count, delay * 1e3, seconds, count / seconds, channel.line(), channel.unmatched))
+
+    count = max(count // 10, DROP_EVERY)
+    (channel, requests, seconds, dropped) = run(count, delay, DROP_EVERY, timeout=0.1, max_in_flight=1)
+    timed_out = set(i + 1 for (i, request) in enumerate(requests) if request.timed_out)
+    assert timed_out == dropped, (timed_out, dropped)
+    for (i, request) in enumerate(requests):
+        if not request.timed_out:
+            assert int(request.reply.split(b',')[1]) == i + 1
+    print("%d version requests, every %dth dropped   %s" % (count, DROP_EVERY, channel.line()))
+    print("Every reply matched its request, and only dropped requests timed out.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Writes a synthetic capture through capture.RotatingCapture with each
+compression available here, finishing a frame every second's worth of data
+at 115200 baud as capture_data's default fsync interval does. Reports the
+compression ratio, the write throughput, and the throughput of replaying the
+file through parser.stream_file against the uncompressed capture, and checks
+every replay writes the same outputs.
+
+Usage: python benchmarks/bench_compression.py [record-pairs]
+"""
+
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+
+from synthetic import synthetic_stream
+
+import capture
+import compressed
+import parser
+
+# Bytes per second at 115200 baud, 8N1.
+FRAME_BYTES = 11520
+
+def write_capture(path, payload, compression):
+
+    raw = capture.RotatingCapture(path, rotate_bytes=len(payload) + 1, compression=compression)
+
+    start = time.perf_counter()
+    for offset in range(0, len(payload), FRAME_BYTES):
+        raw.write(payload[offset:offset + FRAME_BYTES])
+        raw.sync()
+    raw.close()
+
+    return (raw.filenames[0], time.perf_counter() - start)
+
+def replay(path, filename):
+
+    start = time.perf_counter()
+    parser.stream_file(path, filename)
+
+    return time.perf_counter() - start
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    payload = synthetic_stream(pairs)
+    mb = len(payload) / 1e6
+    workdir = tempfile.mkdtemp()
+
+    try:
+        baseline = None
+
+        for compression in [None] + compressed.available():
+            path = os.path.join(workdir, str(compression)) + '/'
+            os.mkdir(path)
+
+            (filename, write_time) = write_capture(path, payload, compression)
+            replay_time = replay(path, filename)
+            ratio = len(payload) / os.path.getsize(filename)
+
+            if baseline is None:
+                baseline = (path, replay_time)
+            else:
+                for output in ('accel.csv', 'pot.csv'):
+                    assert filecmp.cmp(baseline[0] + output, path + output, shallow=False), output
+
+            print("%-6s %8.2f MB  ratio %5.2f   write %7.1f MB/s   replay %6.1f MB/s (%.2fx uncompressed)" %
+                  (compression or 'none', os.path.getsize(filename) / 1e6, ratio, mb / write_time,
+                   mb / replay_time, baseline[1] / replay_time))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compares the throughput of vector_decode.decode_buffer against the per-record
+loop in parse_data on a synthetic capture. Also checks that garbled records
+are skipped, not raised, by every decoder that reads a capture file.
+
+Usage: python benchmarks/bench_decode.py [record-pairs ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from synthetic import synthetic_stream
+
+import numpy as np
+
+import parser
+import rawfile
+import rawindex
+import instrument
+import vector_decode
+
+# A pot record that lost its '\r' and an accel record with a bad digit.
+GARBLED = [b'~HSRD,0AD7~HSRD,0123\r', b'~HSAC,12G4,0001,0002\r']
+
+def check_malformed(workdir, pairs):
+    """
+    Garbled records in the middle of a capture are counted and skipped by
+    vector_decode, rawfile, rawindex and parse_data, which all give what
+    they give for the capture without them.
+    """
+
+    payload = synthetic_stream(pairs // 2) + b''.join(GARBLED) + synthetic_stream(pairs - pairs // 2, seed=1)
+    clean = payload.replace(b''.join(GARBLED), b'')
+    filename = os.path.join(workdir, 'noisy.txt')
+    with open(filename, 'wb') as file:
+        file.write(payload)
+
+    (accel, pot) = vector_decode.decode_buffer(clean)
+    assert len(accel) == len(pot) == pairs
+
+    instruments = instrument.Instruments()
+    (noisy_accel, noisy_pot) = vector_decode.decode_file(filename, instruments=instruments)
+    assert np.array_equal(noisy_accel, accel) and np.array_equal(noisy_pot, pot)
+    assert instruments.malformed == len(GARBLED)
+
+    instruments = instrument.Instruments()
+    (noisy_accel, noisy_pot) = rawfile.decode_file(filename, 2, chunk_size=1 << 12, instruments=instruments)
+    assert np.array_equal(noisy_accel, accel) and np.array_equal(noisy_pot, pot)
+    assert instruments.malformed == len(GARBLED)
+
+    (sample_num, window_accel, window_pot) = rawindex.open_index(filename, stride=64).read_samples(0, pairs)
+    assert window_accel.tolist() == accel.tolist() and window_pot.tolist() == pot['value'].tolist()
+
+    store = parser.parse_data(workdir + '/', parser.open_file(filename))
+    assert list(store.accel_rows()) == accel.tolist() and list(store.pot_rows()) == pot.tolist()
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    workdir = tempfile.mkdtemp()
+
+    try:
+        for pairs in sizes:
+            filename = os.path.join(workdir, 'capture.txt')
+            payload = synthetic_stream(pairs)
+            with open(filename, 'wb') as file:
+                file.write(payload)
+
+            lines = parser.open_file(filename)
+            start = time.perf_counter()
+            store = parser.parse_data(workdir + '/', lines)
+            loop_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            (accel, pot) = vector_decode.decode_buffer(payload)
+            vector_time = time.perf_counter() - start
+
+            assert accel.tolist() == list(store.accel_rows())
+            assert pot.tolist() == list(store.pot_rows())
+
+            mb = len(payload) / 1e6
+            records = pairs * 2
+            print("%9d records  parse_data %7.3f s %8.1f MB/s %11.0f rec/s   decode_buffer %7.3f s %8.1f MB/s %11.0f rec/s  (%.1fx)" %
+                  (records, loop_time, mb / loop_time, records / loop_time,
+                   vector_time, mb / vector_time, records / vector_time, loop_time / vector_time))
+
+        check_malformed(workdir, 10000)
+        print("Garbled records were counted and skipped by every decoder.")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Device discovery on a simulated rig: a fake sysfs tree with the hub, the
+OV116 board and many other USB devices, and dozens of serial ports of which
+one is the MCU board's FTDI adapter. Checks every device is found and
+port arguments resolve to the right port, and times a cold scan, a cached
+one, and the old glob and substring match of check_port_number.
+
+Usage: python benchmarks/bench_discovery.py [serial-ports] [usb-devices]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import contextlib
+
+from serial.tools.list_ports_common import ListPortInfo
+
+import synthetic
+
+import discovery
+
+ROUNDS = 100
+
+@contextlib.contextmanager
+def fake_rig(root, port_count, device_count):
+    """
+    Point discovery at a sysfs tree under root and a list of port_count
+    serial ports, the last on the MCU board.
+    """
+
+    ids = [(0x1D6B, 0x0002 + i) for i in range(device_count)]
+    ids += [(vendor, product) for (vendor, product, label) in discovery.DEVICES.values()]
+
+    for (i, (vendor, product)) in enumerate(ids):
+        device = os.path.join(root, '1-%d' % i)
+        os.makedirs(device)
+        with open(os.path.join(device, 'idVendor'), 'w') as file:
+            file.write('%04x\n' % vendor)
+        with open(os.path.join(device, 'idProduct'), 'w') as file:
+            file.write('%04x\n' % product)
+        os.makedirs(os.path.join(root, '1-%d:1.0' % i))    # An interface, without IDs.
+
+    ports = []
+    for i in range(port_count):
+        port = ListPortInfo('/dev/ttyUSB%d' % i, skip_link_detection=True)
+        (port.vid, port.pid) = (0x10C4, 0xEA60)
+        ports.append(port)
+    (ports[-1].vid, ports[-1].pid) = discovery.DEVICES['mcu'][:2]
+
+    comports = discovery.serial.tools.list_ports.comports
+    sysfs_usb_ids = discovery.sysfs_usb_ids
+    platform = discovery.sys.platform
+
+    discovery.serial.tools.list_ports.comports = lambda: list(ports)
+    discovery.sysfs_usb_ids = lambda: sysfs_usb_ids(root)
+    discovery.sys.platform = 'linux'
+    try:
+        yield ports
+    finally:
+        discovery.serial.tools.list_ports.comports = comports
+        discovery.sysfs_usb_ids = sysfs_usb_ids
+        discovery.sys.platform = platform
+
+def old_check_port_number(port_number):
+
+    for port in glob.glob('/dev/tty[A-Za-z]*'):
+        if port_number in port:
+            return port
+
+    return None
+
+def per_call(function, rounds=ROUNDS):
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        function()
+
+    return (time.perf_counter() - start) / rounds
+
+def main():
+
+    port_count = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    device_count = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    root = tempfile.mkdtemp()
+
+    try:
+        with fake_rig(root, port_count, device_count) as ports:
+            finder = discovery.Discovery()
+            scan = finder.scan()
+            mcu = ports[-1].device
+
+            assert all(scan.found.values()), scan.found
+            assert scan.mcu_port == mcu
+            assert scan.resolve('auto') == mcu
+            assert scan.resolve(str(port_count - 1)) == mcu
+            assert scan.resolve('ttyUSB1') == '/dev/ttyUSB1'
+            assert scan.resolve('nothing') is None
+
+            cold = per_call(lambda: finder.scan(force=True))
+            cached = per_call(finder.scan, ROUNDS * 100)
+
+        old = per_call(lambda: old_check_port_number('USB0'))
+
+        print("%d serial ports, %d USB devices   cold scan %.2f ms   cached scan %.2f us   old glob + match %.2f ms" %
+              (port_count, device_count + len(discovery.DEVICES), cold * 1e3, cached * 1e6, old * 1e3))
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares the byte-at-a-time reader collect_data used to run against the bulk
+RecordFramer, reading a synthetic stream through a pty pair.
+
+Usage: python benchmarks/bench_framing.py [record-pairs] [baud-rate]
+
+A baud rate of 0 writes as fast as the pty accepts, which measures the
+maximum record rate. A real baud rate (e.g. 115200) paces the writer, which
+shows how much CPU each reader burns while waiting on the device.
+"""
+
+import os
+import sys
+import time
+import threading
+
+import serial
+
+from synthetic import synthetic_stream
+from framing import READ_TIMEOUT
+
+import pipeline
+
+def open_pty_pair():
+
+    master, slave = os.openpty()
+    s = serial.Serial(os.ttyname(slave), baudrate=115200, timeout=READ_TIMEOUT)
+
+    return master, slave, s
+
+def write_stream(master, payload, baud):
+
+    view = memoryview(payload)
+    step = 4096 if baud == 0 else max(1, baud // 10 // 100)
+
+    for i in range(0, len(view), step):
+        os.write(master, view[i:i + step])
+        if baud:
+            time.sleep(step * 10.0 / baud)
+
+def legacy_reader(s, expected):
+
+    s.timeout = 0
+    data = []
+    buffer = ""
+
+    while len(data) < expected:
+        byte = s.read(1)
+
+        if byte == b'\r':
+            data.append(buffer)
+            buffer = ""
+        else:
+            buffer += byte.decode()
+
+    return data
+
+def framed_reader(s, expected):
+
+    data = []
+
+    for record in pipeline.frame(pipeline.port_chunks(s, lambda: len(data) < expected)):
+        data.append(record.decode())
+
+    return data
+
+def run(name, reader, payload, expected, baud):
+
+    master, slave, s = open_pty_pair()
+    writer = threading.Thread(target=write_stream, args=(master, payload, baud))
+
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    writer.start()
+
+    data = reader(s, expected)
+
+    cpu = time.thread_time() - start_cpu
+    wall = time.perf_counter() - start_wall
+    writer.join()
+
+    s.close()
+    os.close(master)
+    os.close(slave)
+
+    mb = len(payload) / 1e6
+    print("%-8s %9d records  %8.3f s wall  %8.3f s cpu  %8.3f cpu-s/MB  %10.0f records/s" %
+          (name, len(data), wall, cpu, cpu / mb, len(data) / wall))
+
+    return data
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    baud = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    payload = synthetic_stream(pairs)
+    expected = pairs * 2
+
+    print("%d bytes, %d records, baud %s" % (len(payload), expected, baud or 'unlimited'))
+
+    legacy = run('legacy', legacy_reader, payload, expected, baud)
+    framed = run('framed', framed_reader, payload, expected, baud)
+
+    assert legacy == framed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Random access through rawindex on synthetic captures of growing size:
+the time to build the index, to bring it up to date after an append, to
+look up a sample, and to decode a 30 second window, against decoding the
+whole file. Window contents are checked against the full decode, and a
+window past the end of the capture must come back empty and plot nothing.
+
+Usage: python benchmarks/bench_index.py [record-pairs ...]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from synthetic import synthetic_stream
+
+import parser
+import rawindex
+import vector_decode
+
+LOOKUPS = 200
+WINDOW_SECONDS = 30.0
+APPEND_PAIRS = 10000
+
+def best_of(function, rounds=3):
+
+    best = float('inf')
+
+    for i in range(rounds):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return (best, result)
+
+def run(workdir, pairs):
+
+    filename = os.path.join(workdir, 'capture-%d.txt' % pairs)
+    with open(filename, 'wb') as file:
+        file.write(synthetic_stream(pairs))
+
+    start = time.perf_counter()
+    index = rawindex.open_index(filename)
+    build = time.perf_counter() - start
+
+    with open(filename, 'ab') as file:
+        file.write(synthetic_stream(APPEND_PAIRS))
+
+    start = time.perf_counter()
+    index = rawindex.open_index(filename)
+    append = time.perf_counter() - start
+
+    samples = [random.randrange(index.counts[rawindex.ACCEL_TAG]) for i in range(LOOKUPS)]
+    start = time.perf_counter()
+    for sample in samples:
+        index.locate(rawindex.ACCEL_TAG, sample)
+    lookup = (time.perf_counter() - start) / LOOKUPS
+
+    window_start = random.uniform(0, max(0.0, pairs / 360.0 - WINDOW_SECONDS))
+    (window, (sample_num, accel, pot)) = best_of(lambda: index.read_window(window_start, window_start + WINDOW_SECONDS))
+    (whole, (all_accel, all_pot)) = best_of(lambda: vector_decode.decode_file(filename, trim_streams=False), 1)
+
+    first = sample_num[0]
+    assert np.array_equal(accel, all_accel[first:first + len(sample_num)])
+    assert np.array_equal(pot, all_pot['value'][first:first + len(sample_num)])
+
+    past_end = pairs / 360.0 + 3600.0
+    assert len(index.read_window(past_end, past_end + WINDOW_SECONDS)[0]) == 0
+    assert parser.plot_window(workdir + '/', filename, past_end, past_end + WINDOW_SECONDS) == 0
+
+    print("%9d pairs  %7.1f MB   build %7.3f s   append %6.1f ms   lookup %6.1f us   "
+          "%.0f s window (%d samples) %6.1f ms   whole file %7.3f s" %
+          (pairs, os.path.getsize(filename) / 1e6, build, append * 1e3, lookup * 1e6,
+           WINDOW_SECONDS, len(sample_num), window * 1e3, whole))
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000, 4000000]
+    workdir = tempfile.mkdtemp()
+
+    try:
+        for pairs in sizes:
+            run(workdir, pairs)
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cost of leaving the instrumentation on: runs a synthetic stream through
+pipeline.run with and without an instrument.Instruments, checks both write
+the same outputs, and prints the overhead and the stats line. Also checks
+a record garbled mid-stream is counted as malformed and skipped.
+
+Usage: python benchmarks/bench_instrument.py [record-pairs] [chunk-bytes]
+"""
+
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+
+from synthetic import synthetic_stream
+
+import instrument
+import pipeline
+
+ROUNDS = 5
+
+def chunks_of(payload, size):
+
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+def elapsed(function):
+
+    start = time.perf_counter()
+    function()
+
+    return time.perf_counter() - start
+
+def check_malformed(workdir, pairs):
+    """
+    An instrumented run over a stream with a garbled record in the middle
+    counts it, skips it and writes what a run over the clean stream does.
+    """
+
+    garbled = b'~HSRD,0AD7~HSRD,0123\r'
+    payload = synthetic_stream(pairs // 2) + garbled + synthetic_stream(pairs - pairs // 2, seed=1)
+
+    noisy_path = os.path.join(workdir, 'noisy') + '/'
+    clean_path = os.path.join(workdir, 'clean') + '/'
+    os.mkdir(noisy_path)
+    os.mkdir(clean_path)
+
+    instruments = instrument.Instruments()
+    counts = pipeline.run(noisy_path, chunks_of(payload, 256), flush=True, instruments=instruments)
+    assert counts == pipeline.run(clean_path, [payload.replace(garbled, b'')], flush=True) == (pairs, pairs)
+    assert (instruments.malformed, instruments.records) == (1, pairs * 2 + 1)
+
+    for name in ('accel.csv', 'pot.csv'):
+        assert filecmp.cmp(noisy_path + name, clean_path + name, shallow=False), name
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    payload = synthetic_stream(pairs)
+    workdir = tempfile.mkdtemp()
+
+    plain = os.path.join(workdir, 'plain') + '/'
+    timed = os.path.join(workdir, 'timed') + '/'
+    os.mkdir(plain)
+    os.mkdir(timed)
+
+    try:
+        instruments = [None]
+
+        def run_plain():
+            pipeline.run(plain, chunks_of(payload, chunk_size))
+
+        def run_instrumented():
+            instruments[0] = instrument.Instruments()
+            pipeline.run(timed, chunks_of(payload, chunk_size), instruments=instruments[0])
+
+        # Alternate the two so drift in machine load hits both alike.
+        plain_time = timed_time = float('inf')
+        for i in range(ROUNDS):
+            plain_time = min(plain_time, elapsed(run_plain))
+            timed_time = min(timed_time, elapsed(run_instrumented))
+
+        for name in ('accel.csv', 'pot.csv'):
+            assert filecmp.cmp(plain + name, timed + name, shallow=False), name
+        assert instruments[0].records == pairs * 2
+
+        records = pairs * 2
+        print("%d records in %d byte chunks   plain %.3f s (%.0f records/s)   instrumented %.3f s (%.0f records/s)   overhead %.1f%%" %
+              (records, chunk_size, plain_time, records / plain_time, timed_time, records / timed_time,
+               100.0 * (timed_time / plain_time - 1)))
+        print(instruments[0].line())
+
+        check_malformed(workdir, 1000)
+        print("A garbled record was counted as malformed and skipped.")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
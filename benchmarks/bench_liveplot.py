@@ -0,0 +1,48 @@
+"""
+Measures the cost of one live strip chart frame, blitting the lines over a
+cached background versus redrawing the whole figure, on the off-screen Agg
+canvas. Also checks the chart keeps up with a full record rate.
+
+Usage: python benchmarks/bench_liveplot.py [frames] [records-per-frame]
+"""
+
+import sys
+import time
+import random
+
+import synthetic
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from liveplot import StripChart
+
+def run(frames, per_frame, full):
+
+    figure = Figure(figsize=(6, 3), dpi=100)
+    chart = StripChart(figure, FigureCanvasAgg(figure))
+    rng = random.Random(0)
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        for i in range(per_frame // 2):
+            chart.add_accel(rng.randrange(0x100), rng.randrange(0x100), rng.randrange(0x100))
+            chart.add_pot(rng.randrange(0x1000))
+        chart.redraw(full=full)
+    elapsed = time.perf_counter() - start
+
+    times = sorted(chart.frame_times)
+
+    return (frames * per_frame / elapsed, 1000.0 * sum(times) / len(times), 1000.0 * times[int(len(times) * 0.95)])
+
+def main():
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_frame = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    for (name, full) in (('blit', False), ('full draw', True)):
+        (rate, mean, p95) = run(frames, per_frame, full)
+        print("%-9s  %7.2f ms/frame mean  %7.2f ms p95  %10.0f records/s sustained" % (name, mean, p95, rate))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Captures several pty pairs at once with multiport, each fed a synthetic
+stream at a real baud rate, the first with a garbled record up front. Every
+port's CSVs must hold exactly the samples its stream started with, the
+garbled record skipped, and every port must keep up with at least
+MIN_SHARE of the line rate.
+
+Usage: python benchmarks/bench_multiport.py [ports] [seconds] [baud-rate]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from synthetic import synthetic_stream
+
+import pipeline
+import multiport
+from records import decode
+
+# A record run into the next by a dropped '\r'.
+GARBLED = b'~HSRD,0AD7~HSRD,0123\r'
+
+# Share of the samples sent at line rate each port must have written.
+MIN_SHARE = 0.5
+
+def feed(master, payload, baud, stop):
+
+    step = max(1, baud // 10 // 100)
+    for i in range(0, len(payload), step):
+        if stop.is_set():
+            break
+        os.write(master, payload[i:i + step])
+        stop.wait(step * 10.0 / baud)
+
+def main():
+
+    ports = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    baud = int(sys.argv[3]) if len(sys.argv) > 3 else 115200
+
+    # Enough data to outlast the capture.
+    pairs = int(seconds * baud / 10 / 32) + 1000
+    workdir = tempfile.mkdtemp() + '/'
+    stop = threading.Event()
+
+    pairs_of_fds = [os.openpty() for i in range(ports)]
+    streams = [synthetic_stream(pairs, seed) for seed in range(ports)]
+    writers = [threading.Thread(target=feed, args=(master, (GARBLED if seed == 0 else b'') + streams[seed], baud, stop))
+               for seed, (master, slave) in enumerate(pairs_of_fds)]
+
+    try:
+        names = [os.ttyname(slave) for (master, slave) in pairs_of_fds]
+        captures = [multiport.PortCapture(name, multiport.port_folder(workdir, name)) for name in names]
+
+        for writer in writers:
+            writer.start()
+
+        counts = multiport.asyncio.run(multiport.capture(captures, seconds))
+
+        expected = seconds * baud / 10 / 32
+        for c, stream, (accel_count, pot_count) in zip(captures, streams, counts):
+            print("%s  %d accel / %d pot samples (~%d expected at %d baud)" % (c.port, accel_count, pot_count, expected, baud))
+
+            assert accel_count == pot_count >= MIN_SHARE * expected, (c.port, accel_count, pot_count)
+
+            decoded = [decode(record)[1] for record in stream.split(b'\r')[:2 * accel_count]]
+            (sample_num, accel, pot) = pipeline.load_output(c.path)
+            assert np.array_equal(accel, decoded[0::2]), c.port
+            assert np.array_equal(pot, [values[0] for values in decoded[1::2]]), c.port
+
+        print("Every port wrote the samples it was sent, in order.")
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+        for (master, slave) in pairs_of_fds:
+            os.close(master)
+            os.close(slave)
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Checks that the streaming pipeline writes the same CSVs as open_file and
+parse_data, and skips a garbled record rather than stopping at it, and
+compares their peak memory as the capture grows.
+
+Usage: python benchmarks/bench_pipeline.py [record-pairs ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+import tracemalloc
+
+from synthetic import synthetic_stream
+
+import parser
+import pipeline
+
+def measure(function, *args):
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    result = function(*args)
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return (result, elapsed, peak)
+
+def legacy(path, filename):
+
+    return parser.parse_data(path, parser.open_file(filename))
+
+def compare(workdir, pairs, extra):
+
+    filename = os.path.join(workdir, 'capture.txt')
+    with open(filename, 'wb') as file:
+        file.write(synthetic_stream(pairs) + extra)
+
+    old_path = os.path.join(workdir, 'old') + '/'
+    new_path = os.path.join(workdir, 'new') + '/'
+    os.mkdir(old_path)
+    os.mkdir(new_path)
+
+    (_, old_time, old_peak) = measure(legacy, old_path, filename)
+    (_, new_time, new_peak) = measure(parser.stream_file, new_path, filename)
+
+    for name in ('accel.csv', 'pot.csv'):
+        assert filecmp.cmp(old_path + name, new_path + name, shallow=False), name
+
+    print("%9d pairs  parse_data %7.2f s %9.1f MB peak   pipeline %7.2f s %9.1f MB peak" %
+          (pairs, old_time, old_peak / 1e6, new_time, new_peak / 1e6))
+
+    shutil.rmtree(old_path)
+    shutil.rmtree(new_path)
+
+def check_malformed(workdir, pairs):
+    """
+    A record garbled by a dropped '\\r' in the middle of a stream is skipped,
+    leaving the same outputs as a stream without it.
+    """
+
+    garbled = b'~HSRD,0AD7~HSRD,0123\r'
+    half = synthetic_stream(pairs // 2)
+    payload = half + garbled + synthetic_stream(pairs - pairs // 2, seed=1)
+
+    noisy_path = os.path.join(workdir, 'noisy') + '/'
+    clean_path = os.path.join(workdir, 'clean') + '/'
+    os.mkdir(noisy_path)
+    os.mkdir(clean_path)
+
+    counts = pipeline.run(noisy_path, [payload], flush=True)
+    assert counts == pipeline.run(clean_path, [payload.replace(garbled, b'')], flush=True) == (pairs, pairs)
+
+    for name in ('accel.csv', 'pot.csv'):
+        assert filecmp.cmp(noisy_path + name, clean_path + name, shallow=False), name
+
+    shutil.rmtree(noisy_path)
+    shutil.rmtree(clean_path)
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000]
+    workdir = tempfile.mkdtemp()
+
+    try:
+        # Uneven streams exercise the trailing-sample truncation.
+        compare(workdir, 1000, b'~HSAC,0001,0002,0003\r')
+        compare(workdir, 1000, b'~HSRD,0004\r~HSVI,01,02,03,04')
+        check_malformed(workdir, 1000)
+
+        for pairs in sizes:
+            compare(workdir, pairs, b'')
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
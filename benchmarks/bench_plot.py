@@ -0,0 +1,51 @@
+"""
+Times the plot_* functions with and without min/max decimation.
+
+Usage: python benchmarks/bench_plot.py [samples ...]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+import synthetic
+
+import parser
+import plotting
+
+def timed(function, *args, **kwargs):
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return (result, time.perf_counter() - start)
+
+def main():
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000, 5000000]
+    rng = np.random.default_rng(0)
+    workdir = tempfile.mkdtemp() + '/'
+
+    try:
+        for samples in sizes:
+            sample_num = np.arange(samples)
+            pot = np.cumsum(rng.integers(-8, 9, samples)) + 0x800
+            accel = rng.integers(0, 0x10000, (samples, 3))
+
+            results = []
+            for decimate_above in (None, plotting.DECIMATE_ABOVE):
+                (pot_norm, pot_time) = timed(parser.plot_potentiometer, workdir, sample_num, pot, decimate_above=decimate_above)
+                (accel_norm, accel_time) = timed(parser.plot_accelerometer, workdir, sample_num, accel, decimate_above=decimate_above)
+                (_, both_time) = timed(parser.plot_both, workdir, sample_num, pot_norm, accel_norm, decimate_above=decimate_above)
+                results.append((pot_time, accel_time, both_time))
+
+            print("%9d samples  full: pot %6.2f s accel %6.2f s both %6.2f s   decimated: pot %6.2f s accel %6.2f s both %6.2f s" %
+                  ((samples,) + results[0] + results[1]))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
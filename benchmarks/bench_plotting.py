@@ -0,0 +1,104 @@
+"""
+Serial against parallel plot rendering. Each session's three plots are
+drawn one after another with the plot_* functions, then all at once with
+parser.plot_all, and the sessions together with plotting.plot_sessions;
+the files must come out identical. Also checks importing parser doesn't
+load matplotlib, and times the import.
+
+Usage: python benchmarks/bench_plotting.py [samples] [sessions] [workers]
+"""
+
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+import subprocess
+
+import numpy as np
+
+import synthetic
+
+import parser
+import plotting
+
+FILES = ['pot.png', 'accel.png', 'both.png']
+
+def elapsed(function):
+
+    start = time.perf_counter()
+    function()
+
+    return time.perf_counter() - start
+
+def import_time():
+    """
+    Seconds to import parser in a fresh interpreter, and whether that
+    loaded matplotlib.
+    """
+
+    code = ("import sys, time; start = time.perf_counter(); import parser; "
+            "print(time.perf_counter() - start, 'matplotlib' in sys.modules)")
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    (seconds, loaded) = output.decode().split()
+
+    return (float(seconds), loaded == 'True')
+
+def main():
+
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    rng = np.random.default_rng(0)
+    workdir = tempfile.mkdtemp()
+
+    try:
+        sessions = []
+        for i in range(count):
+            sample_num = np.arange(samples)
+            pot = np.cumsum(rng.integers(-8, 9, samples)) + 0x800
+            accel = rng.integers(0, 0x10000, (samples, 3))
+            sessions.append((sample_num, accel, pot))
+
+        paths = {}
+        for name in ('serial', 'parallel', 'sessions'):
+            paths[name] = []
+            for i in range(count):
+                paths[name].append(os.path.join(workdir, name, str(i)) + '/')
+                os.makedirs(paths[name][-1])
+
+        def serial():
+            for (path, (sample_num, accel, pot)) in zip(paths['serial'], sessions):
+                pot_norm = parser.plot_potentiometer(path, sample_num, pot)
+                accel_norm = parser.plot_accelerometer(path, sample_num, accel)
+                parser.plot_both(path, sample_num, pot_norm, accel_norm)
+
+        def parallel():
+            for (path, (sample_num, accel, pot)) in zip(paths['parallel'], sessions):
+                parser.plot_all(path, sample_num, accel, pot, workers)
+
+        def together():
+            plotting.plot_sessions([(path,) + session for (path, session) in zip(paths['sessions'], sessions)], workers)
+
+        serial_time = elapsed(serial)
+        parallel_time = elapsed(parallel)
+        together_time = elapsed(together)
+
+        for name in ('parallel', 'sessions'):
+            for (expected, path) in zip(paths['serial'], paths[name]):
+                for filename in FILES:
+                    assert filecmp.cmp(expected + filename, path + filename, shallow=False), path + filename
+
+        (seconds, loaded) = import_time()
+        assert not loaded, "importing parser loaded matplotlib"
+
+        print("%d sessions of %d samples on %d CPUs   serial %.2f s   plot_all %.2f s   plot_sessions %.2f s (%.1fx)   "
+              "import parser %.0f ms without matplotlib" %
+              (count, samples, os.cpu_count(), serial_time, parallel_time, together_time, serial_time / together_time,
+               seconds * 1e3))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
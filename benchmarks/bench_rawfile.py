@@ -0,0 +1,143 @@
+"""
+Memory and throughput of the memory-mapped capture reader on a large
+synthetic file, against the readlines() approach open_file used to take.
+
+Every worker of the parallel decode holds one chunk's arrays at a time, so
+its memory is reported too: the traced peak of decoding one chunk as a
+worker does, and that times the number of workers.
+
+Also checks a gzip copy of a smaller capture decodes, from one streaming
+pass, to exactly what the uncompressed one does in parallel.
+
+Usage: python benchmarks/bench_rawfile.py [size-mb] [workers]
+
+The readlines() baseline only runs on files up to LEGACY_LIMIT_MB, since
+beyond that it's the thing that runs analysis boxes out of memory.
+"""
+
+import os
+import sys
+import gzip
+import time
+import shutil
+import resource
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from synthetic import synthetic_stream
+
+import rawfile
+
+LEGACY_LIMIT_MB = 512
+
+# Size of the capture compared against its gzip copy.
+COMPRESSED_MB = 16
+
+def write_capture(filename, size):
+
+    block = synthetic_stream(1 << 16)
+
+    with open(filename, 'wb') as file:
+        for i in range(0, size, len(block)):
+            file.write(block)
+
+def legacy_lines(filename):
+
+    with open(filename, "r") as file:
+        lines = file.readlines()
+        if len(lines) == 1:
+            lines = lines[0].split('\r')
+
+    return len(lines)
+
+def mmap_records(filename):
+
+    return sum(1 for record in rawfile.iter_records(rawfile.open_capture(filename)))
+
+def parallel_decode(filename, workers):
+
+    return sum(len(accel) + len(pot) for (accel, pot) in rawfile.decode_chunks(filename, workers))
+
+def measure(name, size, function, *args):
+
+    start = time.perf_counter()
+    records = function(*args)
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows allocation-heavy loops down, so memory gets its own run.
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print("%-16s %11d records  %7.2f s  %8.1f MB/s  %11.0f rec/s  %9.1f MB peak heap" %
+          (name, records, elapsed, size / 1e6 / elapsed, records / elapsed, peak / 1e6))
+
+def worker_memory(filename):
+    """
+    Trace decoding the first chunk of filename in this process, which is
+    what each pool worker does per chunk; tracemalloc can't see into the
+    pool itself. Returns (chunk bytes, peak heap bytes).
+    """
+
+    (start, end) = rawfile.chunk_ranges(rawfile.open_capture(filename))[0]
+
+    tracemalloc.start()
+    rawfile.decode_file_range((filename, start, end))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return (end - start, peak)
+
+def check_compressed(workdir, workers):
+
+    filename = os.path.join(workdir, 'small.txt')
+    write_capture(filename, COMPRESSED_MB << 20)
+    with open(filename, 'rb') as file, gzip.open(filename + '.gz', 'wb', compresslevel=1) as packed:
+        packed.write(file.read())
+
+    timings = []
+    results = []
+    for name in (filename, filename + '.gz'):
+        start = time.perf_counter()
+        results.append(rawfile.decode_file(name, workers, chunk_size=1 << 20))
+        timings.append(time.perf_counter() - start)
+
+    for (plain, packed) in zip(*results):
+        assert np.array_equal(plain, packed)
+
+    print("%d MB capture decoded in %.2f s, its gzip copy in %.2f s; same samples" % (COMPRESSED_MB, timings[0], timings[1]))
+
+def main():
+
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 2048) << 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    workdir = tempfile.mkdtemp()
+    filename = os.path.join(workdir, 'capture.txt')
+
+    try:
+        write_capture(filename, size)
+        size = os.path.getsize(filename)
+        print("%.1f MB synthetic capture" % (size / 1e6))
+
+        if size <= LEGACY_LIMIT_MB << 20:
+            measure('readlines', size, legacy_lines, filename)
+        measure('mmap iter', size, mmap_records, filename)
+        measure('parallel decode', size, parallel_decode, filename, workers)
+
+        (chunk, peak) = worker_memory(filename)
+        pool_size = workers or os.cpu_count() or 1
+        print("per worker: %.1f MB chunk decoded with %.1f MB peak heap (%.1fx the chunk); %d workers %.1f MB" %
+              (chunk / 1e6, peak / 1e6, peak / chunk, pool_size, pool_size * peak / 1e6))
+        check_compressed(workdir, workers)
+
+        print("max RSS %.1f MB (includes mapped pages of the capture)" %
+              (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
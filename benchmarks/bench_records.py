@@ -0,0 +1,69 @@
+"""
+Nanoseconds per record for each tag, decoding with records.decode against
+the split(',') and int('0x' + field, 16) code parse_data and
+GUI.parse_buffer used to run. Accelerometer and potentiometer values are
+checked against that code too, including records that look like the fixed
+layout but carry extra commas.
+
+Usage: python benchmarks/bench_records.py [records-per-tag]
+"""
+
+import sys
+import time
+
+import synthetic
+
+import records
+
+# Records as the device sends them, plus ones that take the slow path.
+SAMPLES = [
+    ('~HSAC', [b'~HSAC,C53E,D755,14BA', b'~HSAC,0001,FFFF,8000']),
+    ('~HSRD', [b'~HSRD,0849', b'~HSRD,0FFF']),
+    ('~HSVI', [b'~HSVI,01,02,03,04', b'~HSVI,1,0,12,A']),
+    ('~HSAC fallback', [b'~HSAC,1a2b,3c4d,5e6f', b'~HSAC,1,22,333', b'~HSAC,1,23,0001,0002']),
+    ('~HSRD fallback', [b'~HSRD,7', b'~HSRD,0fff', b'~HSRD,12,3']),
+]
+
+def legacy_decode(buffer):
+
+    split = buffer.split(',')
+
+    if split[0] == '~HSAC':
+        return (int('0x' + split[1], 16), int('0x' + split[2], 16), int('0x' + split[3], 16))
+
+    if split[0] == '~HSRD':
+        return (int("0x" + split[1], 16),)
+
+    if split[0] == '~HSVI':
+        return str(int("0x" + split[1], 16)) + "." + str(int("0x" + split[2], 16)) + "." + str(int("0x" + split[3], 16)) + "." + str(int("0x" + split[4], 16))
+
+def per_record(function, batch):
+
+    start = time.perf_counter_ns()
+    for record in batch:
+        function(record)
+
+    return (time.perf_counter_ns() - start) / len(batch)
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+
+    for name, samples in SAMPLES:
+        batch = (samples * (count // len(samples) + 1))[:count]
+        text_batch = [record.decode() for record in batch]
+
+        for record in samples:
+            (tag, values) = records.decode(record)
+            assert tag == name.split()[0].encode()
+            if tag != records.VERSION_TAG:
+                assert values == legacy_decode(record.decode()), record
+
+        legacy = per_record(legacy_decode, text_batch)
+        current = per_record(records.decode, batch)
+
+        print("%-15s  split/int %7.0f ns/record   records.decode %7.0f ns/record  (%.1fx)" %
+              (name, legacy, current, legacy / current))
+
+if __name__ == "__main__":
+    main()
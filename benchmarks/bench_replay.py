@@ -0,0 +1,121 @@
+"""
+Load test of the GUI's record path without a display. A synthetic capture,
+with a record of non-UTF-8 line noise in the middle, is replayed through replay.ReplayPort into GUI.read_serial and parse_buffer
+on the reader thread, with GUI.update_display run on the main thread every
+FRAME_INTERVAL against stand-in widgets and an off-screen strip chart.
+Reports sustained records per second, dropped records and frames, and the
+latency from queueing a record to the display taking it, for each speed.
+
+Usage: python benchmarks/bench_replay.py [record-pairs] [speed ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import collections
+
+from synthetic import synthetic_stream
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import ui
+import replay
+from liveplot import StripChart
+
+FIELDS = ['record_number', 'version_number', 'potentiometer_data', 'accelerometer_data_x',
+          'accelerometer_data_y', 'accelerometer_data_z', 'queue_depth', 'dropped_records']
+
+class Display(object):
+
+    def __init__(self):
+        for name in FIELDS:
+            setattr(self, name, name)
+        self.values = {}
+
+    def show(self, entry, text):
+        self.values[entry] = text
+
+class RawView(object):
+
+    def __init__(self):
+        self.lines = collections.deque(maxlen=ui.LINE_LIMIT)
+
+    def append(self, lines):
+        self.lines.extend(lines)
+
+class HeadlessGUI(object):
+    """
+    Just enough of ui.GUI to run its reader and display methods.
+    """
+
+    read_serial = ui.GUI.read_serial
+    parse_buffer = ui.GUI.parse_buffer
+    update_display = ui.GUI.update_display
+    start_replay = ui.GUI.start_replay
+    check_replay = ui.GUI.check_replay
+
+    def __init__(self):
+        self.records = ui.queue.Queue(maxsize=ui.QUEUE_SIZE)
+        self.instruments = ui.instrument.Instruments()
+        self.stats = ui.runstats.SampleStats(window=ui.runstats.WINDOW, batch=ui.STATS_BATCH)
+        self.read = False
+        self.s = None
+        self.commands = None
+        self.load_stats = None
+        self.next_frame = None
+
+        figure = Figure(figsize=(6, 3), dpi=100)
+        self.live_plot = collections.namedtuple('LivePlot', 'chart')(StripChart(figure, FigureCanvasAgg(figure)))
+        self.data_display = Display()
+        self.raw_serial_data = RawView()
+
+    def log_chunk(self, chunk):
+        pass
+
+    def after(self, ms, callback):
+        self.next_frame = (time.monotonic() + ms / 1000.0, callback)
+
+def run(filename, speed):
+
+    gui = HeadlessGUI()
+    gui.start_replay(filename, speed)
+    stats = gui.load_stats
+    gui.after(ui.FRAME_INTERVAL, gui.update_display)
+
+    try:
+        while gui.load_stats is not None:
+            (due, callback) = gui.next_frame
+            time.sleep(max(0.0, due - time.monotonic()))
+            callback()
+    finally:
+        gui.read = False
+
+    return (stats, gui.instruments)
+
+# Line noise that isn't UTF-8, replayed mid-stream; the reader must survive it.
+NOISE = b'\xfe\xff~HS\x80\r'
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    speeds = [None if arg.lower() == 'max' else float(arg) for arg in sys.argv[2:]] or [100.0, None]
+    workdir = tempfile.mkdtemp()
+
+    try:
+        filename = os.path.join(workdir, 'capture.txt')
+        with open(filename, 'wb') as file:
+            file.write(synthetic_stream(pairs // 2) + NOISE + synthetic_stream(pairs - pairs // 2, seed=1))
+
+        for speed in speeds:
+            (stats, instruments) = run(filename, speed)
+            assert stats.records + stats.dropped_records == pairs * 2 + 1
+            print("%-5s %s" % ('max' if speed is None else '%gx' % speed, stats.summary()))
+            print("      " + instruments.line())
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Checks runstats against batch results and times what it adds to the
+pipeline. A synthetic stream, with one extra accelerometer record so the
+trailing-sample trim is exercised, goes through pipeline.run with and
+without a runstats.SampleStats. The running min, max, mean and variance of
+every channel must match NumPy over the written outputs, normalizing with
+the running bounds must give exactly what analysis.normalize does on its
+own, and the windowed stats must match NumPy over the last WINDOW samples.
+
+Usage: python benchmarks/bench_runstats.py [record-pairs] [window]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from synthetic import synthetic_stream
+
+import analysis
+import pipeline
+import runstats
+
+ROUNDS = 3
+
+def chunks_of(payload, size=4096):
+
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+def check(name, stats, values):
+
+    assert stats.count == len(values), name
+    assert stats.min == values.min() and stats.max == values.max(), name
+    assert np.isclose(stats.mean, values.mean(), rtol=1e-12, atol=1e-9), (name, stats.mean, values.mean())
+    assert np.isclose(stats.variance(), values.var(), rtol=1e-9), (name, stats.variance(), values.var())
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else runstats.WINDOW
+    payload = synthetic_stream(pairs) + synthetic_stream(1, seed=1).split(b'\r')[0] + b'\r'
+    workdir = tempfile.mkdtemp() + '/'
+
+    try:
+        plain_time = stats_time = float('inf')
+        for i in range(ROUNDS):
+            start = time.perf_counter()
+            pipeline.run(workdir, chunks_of(payload))
+            plain_time = min(plain_time, time.perf_counter() - start)
+
+            stats = runstats.SampleStats(window=window)
+            start = time.perf_counter()
+            counts = pipeline.run(workdir, chunks_of(payload), stats=stats)
+            stats_time = min(stats_time, time.perf_counter() - start)
+
+        (sample_num, accel, pot) = pipeline.load_output(workdir)
+        assert counts == (len(accel), len(pot)) == (pairs, pairs)
+
+        magnitude = analysis.magnitude(accel)
+        columns = {'pot' : pot, 'x' : accel[:, 0], 'y' : accel[:, 1], 'z' : accel[:, 2], 'magnitude' : magnitude}
+
+        for channel in runstats.CHANNELS:
+            check(channel, stats[channel], columns[channel])
+            check(channel + ' window', stats.window[channel], columns[channel][-window:])
+
+        assert np.array_equal(analysis.normalize(pot, stats['pot'].bounds()), analysis.normalize(pot))
+        assert np.array_equal(analysis.normalize(magnitude, stats['magnitude'].bounds()), analysis.normalize(magnitude))
+
+        # A window sliding the whole way, checked at every step on a short run.
+        values = np.array(pot[:5 * window // 2 + 1])
+        sliding = runstats.WindowStats(window)
+        for (i, value) in enumerate(values):
+            sliding.add(value)
+            check('sliding %d' % i, sliding, values[max(0, i + 1 - window):i + 1])
+
+        records = pairs * 2
+        print("%d records   pipeline %.3f s (%.0f records/s)   with runstats %.3f s (%.0f records/s)   overhead %.1f%%" %
+              (records, plain_time, records / plain_time, stats_time, records / stats_time,
+               100.0 * (stats_time / plain_time - 1)))
+        for part in stats.parts():
+            print("  " + part)
+        print("Running and windowed stats match the batch results.")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
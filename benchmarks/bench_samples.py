@@ -0,0 +1,90 @@
+"""
+Peak memory per million samples of parse_data with the SampleStore, against
+the tuple + dict lists it used to build and the sample_num/accel/pot lists
+the __main__ flow rebuilt from them.
+
+Usage: python benchmarks/bench_samples.py [record-pairs]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+from synthetic import synthetic_records
+
+import parser
+
+def legacy_parse_data(filename, lines):
+
+    p_raw = []
+    a_raw = []
+    pot_data = [['Sample Number', 'Potentiometer Data']]
+    accel_data = [['Sample Number', 'X Data', 'Y Data', 'Z Data']]
+
+    i = 0
+    j = 0
+
+    for line in lines:
+        split = line.split(',')
+
+        if split[0] == '~HSAC':
+            x = int('0x' + split[1], 16)
+            y = int('0x' + split[2], 16)
+            z = int('0x' + split[3], 16)
+
+            a_raw.append((i, x, y, z))
+            accel_data.append({"Sample Number" : i, "X Data" : x, "Y Data" : y, "Z Data" : z})
+            i += 1
+
+        if split[0] == '~HSRD':
+            d = int("0x" + split[1], 16)
+
+            p_raw.append((j, d))
+            pot_data.append({"Sample Number" : j, "Potentiometer Data" : d})
+            j += 1
+
+    # What the __main__ flow built next, with everything above still alive.
+    sample_num = [sample[0] for sample in a_raw]
+    accel      = [(sample[1], sample[2], sample[3]) for sample in a_raw]
+    pot        = [sample[1] for sample in p_raw]
+
+    return (a_raw, p_raw, accel_data, pot_data, sample_num, accel, pot)
+
+def compact_parse_data(filename, lines):
+
+    store = parser.parse_data(filename, lines)
+
+    return (store, store.sample_num(), store.accel_array(), store.pot_array())
+
+def measure(function, *args):
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    result = function(*args)
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return (elapsed, peak)
+
+def main():
+
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    lines = list(synthetic_records(pairs))
+    workdir = tempfile.mkdtemp() + '/'
+    samples = pairs * 2
+
+    try:
+        for (name, function) in (('lists', legacy_parse_data), ('SampleStore', compact_parse_data)):
+            (elapsed, peak) = measure(function, workdir, lines)
+            print("%-12s %8.2f s  %8.1f MB peak  %8.1f MB per million samples" %
+                  (name, elapsed, peak / 1e6, peak / 1e6 / (samples / 1e6)))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
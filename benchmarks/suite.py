@@ -0,0 +1,286 @@
+"""
+Benchmark suite for the collect, parse, write and plot stages. Each stage
+runs against a synthetic '~HSAC'/'~HSRD' stream of each requested size,
+untraced for the best of --repeat times, then once under tracemalloc for
+the peak memory.
+collect_data reads from a FakeSerial that never runs dry, so it's measured
+as records collected per second of recording.
+
+Results are written as JSON, and a previous results file can be passed to
+--compare to flag stages that got slower or hungrier.
+
+Usage: python benchmarks/suite.py [--sizes 10000,100000] [--stages parse_data,plot_both]
+                                  [--repeat 3] [--output results.json] [--compare baseline.json]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+from synthetic import FakeSerial, synthetic_records, synthetic_stream
+
+import parser
+import analysis
+import pipeline
+
+DEFAULT_SIZES = [10000, 100000]
+REPEAT = 3
+COLLECT_SECONDS = 1
+
+# A stage counts as regressed when it's this much slower, or its peak
+# memory this much larger, than the baseline.
+TOLERANCE = 0.10
+
+@contextlib.contextmanager
+def fake_port(payload):
+    """
+    Make parser.open_port hand out a repeating FakeSerial over payload.
+    """
+
+    ports = []
+    open_port = parser.open_port
+
+    def fake_open_port(port_name):
+        ports.append(FakeSerial(payload, repeat=True))
+        return ports[-1]
+
+    parser.open_port = fake_open_port
+    try:
+        yield ports
+    finally:
+        parser.open_port = open_port
+
+class Workload(object):
+    """
+    The inputs every stage of one size works from, built once up front so
+    they don't count towards the stage being measured.
+    """
+
+    def __init__(self, workdir, pairs):
+        self.pairs = pairs
+        self.records = pairs * 2
+        self.path = os.path.join(workdir, str(pairs)) + '/'
+        os.mkdir(self.path)
+
+        self.payload = synthetic_stream(pairs)
+        self.lines = list(synthetic_records(pairs))
+        self.capture = self.path + 'capture.txt'
+        with open(self.capture, 'wb') as file:
+            file.write(self.payload)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.store = parser.parse_data(self.path, self.lines)
+
+        self.sample_num = self.store.sample_num()
+        self.accel = self.store.accel_array()
+        self.pot = self.store.pot_array()
+        self.pot_norm = analysis.normalize(self.pot)
+        self.accel_norm = analysis.normalize(analysis.magnitude(self.accel))
+
+def stage_collect_data(work):
+
+    with fake_port(work.payload) as ports:
+        records = parser.collect_data('fake', COLLECT_SECONDS)
+
+    return (len(records), ports[0].served)
+
+def stage_collect_to_disk(work):
+
+    out = work.path + 'collect/'
+    shutil.rmtree(out, ignore_errors=True)
+    os.mkdir(out)
+
+    with fake_port(work.payload) as ports:
+        (accel_count, pot_count) = parser.capture_data(out, 'fake', COLLECT_SECONDS)
+
+    return (accel_count + pot_count, ports[0].served)
+
+def stage_parse_data(work):
+
+    parser.parse_data(work.path, work.lines)
+
+    return (work.records, len(work.payload))
+
+def stage_write_to_output(work):
+
+    parser.write_to_output(work.path + 'accel', pipeline.ACCEL_FIELDS, work.store.accel_rows())
+    parser.write_to_output(work.path + 'pot', pipeline.POT_FIELDS, work.store.pot_rows())
+
+    return (work.records, None)
+
+def stage_stream_file(work):
+
+    parser.stream_file(work.path, work.capture)
+
+    return (work.records, len(work.payload))
+
+def stage_plot_potentiometer(work):
+
+    parser.plot_potentiometer(work.path, work.sample_num, work.pot)
+
+    return (len(work.pot), None)
+
+def stage_plot_accelerometer(work):
+
+    parser.plot_accelerometer(work.path, work.sample_num, work.accel)
+
+    return (len(work.accel), None)
+
+def stage_plot_both(work):
+
+    parser.plot_both(work.path, work.sample_num, work.pot_norm, work.accel_norm)
+
+    return (len(work.pot_norm), None)
+
+# (name, stage). Each stage returns (items, bytes) processed; the collect
+# stages run for COLLECT_SECONDS whatever the size.
+STAGES = [
+    ('collect_data', stage_collect_data),
+    ('collect_to_disk', stage_collect_to_disk),
+    ('parse_data', stage_parse_data),
+    ('write_to_output', stage_write_to_output),
+    ('stream_file', stage_stream_file),
+    ('plot_potentiometer', stage_plot_potentiometer),
+    ('plot_accelerometer', stage_plot_accelerometer),
+    ('plot_both', stage_plot_both),
+]
+
+def measure(stage, work, repeat=REPEAT):
+    """
+    Time the best of repeat runs of stage, then run it once more under
+    tracemalloc for its peak memory.
+    """
+
+    best = None
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            start = time.perf_counter()
+            (items, size) = stage(work)
+            seconds = time.perf_counter() - start
+
+            if best is None or items / seconds > best[0] / best[2]:
+                best = (items, size, seconds)
+
+        (items, size, seconds) = best
+
+        tracemalloc.start()
+        stage(work)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        'seconds' : seconds,
+        'items' : items,
+        'items_per_second' : items / seconds,
+        'peak_bytes' : peak,
+    }
+    if size is not None:
+        result['mb_per_second'] = size / 1e6 / seconds
+
+    return result
+
+def environment():
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit' : commit,
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'processor' : platform.processor(),
+        'numpy' : np.__version__,
+        'matplotlib' : matplotlib.__version__,
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Print each result against the baseline's and return the regressions.
+    """
+
+    previous = dict(((r['stage'], r['size']), r) for r in baseline['results'])
+    regressions = []
+
+    for result in results:
+        old = previous.get((result['stage'], result['size']))
+        if old is None:
+            continue
+
+        speed = result['items_per_second'] / old['items_per_second']
+        memory = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1.0
+        flag = ''
+
+        if speed < 1.0 - tolerance or memory > 1.0 + tolerance:
+            regressions.append(result)
+            flag = '  REGRESSED'
+
+        print("%-20s %9d   %5.2fx throughput   %5.2fx peak memory%s" %
+              (result['stage'], result['size'], speed, memory, flag))
+
+    return regressions
+
+def main():
+
+    arguments = argparse.ArgumentParser(description='Benchmark the collect, parse, write and plot stages.')
+    arguments.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                           help='comma separated record pair counts')
+    arguments.add_argument('--stages', default=None, help='comma separated stage names (default: all)')
+    arguments.add_argument('--repeat', type=int, default=REPEAT, help='timed runs per stage; the best counts')
+    arguments.add_argument('--output', default='benchmark_results.json', help='where to write the results')
+    arguments.add_argument('--compare', default=None, help='a previous results file to compare against')
+    options = arguments.parse_args()
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    names = options.stages.split(',') if options.stages else [name for (name, stage) in STAGES]
+    stages = [(name, stage) for (name, stage) in STAGES if name in names]
+
+    workdir = tempfile.mkdtemp()
+    results = []
+
+    try:
+        for pairs in sizes:
+            work = Workload(workdir, pairs)
+
+            for (name, stage) in stages:
+                result = measure(stage, work, options.repeat)
+                result.update({'stage' : name, 'size' : pairs})
+                results.append(result)
+
+                print("%-20s %9d pairs  %8.3f s  %12.0f items/s  %8.1f MB peak" %
+                      (name, pairs, result['seconds'], result['items_per_second'], result['peak_bytes'] / 1e6))
+
+            shutil.rmtree(work.path)
+    finally:
+        shutil.rmtree(workdir)
+
+    with open(options.output, 'w') as file:
+        json.dump({'environment' : environment(), 'results' : results}, file, indent=2)
+    print("Wrote " + options.output)
+
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+
+        if compare(results, baseline):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+def synthetic_records(count, seed=0):
+    """
+    Yield count pairs of '~HSAC' and '~HSRD' records as the MCU sends them,
+    without the '\\r' terminator.
+    """
+
+    rng = random.Random(seed)
+
+    for i in range(count):
+        x = rng.randrange(0x10000)
+        y = rng.randrange(0x10000)
+        z = rng.randrange(0x10000)
+        d = rng.randrange(0x1000)
+
+        yield '~HSAC,%04X,%04X,%04X' % (x, y, z)
+        yield '~HSRD,%04X' % d
+
+def synthetic_stream(count, seed=0):
+    """
+    Return count record pairs as one '\\r' terminated byte string.
+    """
+
+    return ''.join(record + '\r' for record in synthetic_records(count, seed)).encode()
+
+class FakeSerial(object):
+    """
+    An in-memory stand-in for an open serial.Serial that serves payload as
+    fast as it's read, chunk_size bytes at a time. Once the payload runs out
+    it reads empty, or with repeat set, starts over.
+    """
+
+    def __init__(self, payload, chunk_size=4096, repeat=False, baudrate=115200):
+        self.payload = memoryview(payload)
+        self.chunk_size = chunk_size
+        self.repeat = repeat
+        self.baudrate = baudrate
+        self.offset = 0
+        self.served = 0
+        self.is_open = True
+        self.written = []
+
+    @property
+    def in_waiting(self):
+
+        if self.repeat and self.offset >= len(self.payload):
+            self.offset = 0
+
+        return min(self.chunk_size, len(self.payload) - self.offset)
+
+    def read(self, size=1):
+
+        if self.repeat and self.offset >= len(self.payload):
+            self.offset = 0
+
+        data = bytes(self.payload[self.offset:self.offset + size])
+        self.offset += len(data)
+        self.served += len(data)
+
+        return data
+
+    def done(self):
+
+        return not self.repeat and self.offset >= len(self.payload)
+
+    def write(self, data):
+
+        self.written.append(data)
+
+        return len(data)
+
+    def close(self):
+
+        self.is_open = False
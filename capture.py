@@ -0,0 +1,296 @@
+"""
+Raw capture tee. Chunks read from the port are handed to a background
+writer thread through a bounded queue and appended to rotating capture
+files, <path>raw-000.txt, <path>raw-001.txt, ..., so a crash loses at most
+what hasn't reached the disk yet and the reader never waits on a write.
+Files only rotate on a record boundary, so each one can be replayed on its
+own with parser.stream_file. With a compression name, the files are
+written as compressed frames (see compressed.py) and named raw-000.txt.gz
+and so on; each sync finishes a frame, so fsync_interval also sets how much
+a crash can lose.
+
+Uncompressed files also get a <file>.times log of when their bytes
+arrived, on the monotonic clock, which rawindex uses to find a time window
+in the file.
+"""
+
+import os
+import glob
+import queue
+import threading
+import time
+
+import numpy as np
+
+import pipeline
+import compressed
+import rawindex
+
+# Start a new capture file once the current one holds this many bytes.
+ROTATE_BYTES = 64 << 20
+
+# Chunks the writer may fall behind by before backpressure kicks in.
+QUEUE_CHUNKS = 1024
+
+# Seconds between fsyncs of the current capture file. None leaves it to the
+# OS; 0 syncs after every chunk.
+FSYNC_INTERVAL = 1.0
+
+CAPTURE_PATTERN = 'raw-%03d.txt'
+
+# Seconds between entries in a capture file's .times log.
+TIME_INTERVAL = 0.1
+
+class TimeLog(object):
+    """
+    Appends (host time, byte offset) entries to a capture file's .times log,
+    each saying every byte before offset had arrived by then. Times are
+    time.monotonic(); the log opens with a wall clock anchor, as rawindex
+    describes. Entries are written at most every interval seconds.
+    """
+
+    def __init__(self, filename, offset, interval=TIME_INTERVAL):
+        self.file = open(filename + rawindex.TIMES_SUFFIX, 'ab')
+        self.interval = interval
+        self.last = None
+
+        now = time.monotonic()
+        anchor = np.array([(time.time() - now, rawindex.ANCHOR_OFFSET)], dtype=rawindex.TIMES_DTYPE)
+        self.file.write(anchor.tobytes())
+
+        self.add(now, offset)
+
+    def add(self, timestamp, offset):
+
+        if self.last is not None and timestamp - self.last < self.interval:
+            return
+
+        self.write(timestamp, offset)
+
+    def add_chunk(self, timestamp, start, end, byte_time):
+        """
+        Log the bytes from offset start to end, read at timestamp, as having
+        come in at byte_time seconds a byte up to then: one entry for when
+        they began arriving, no earlier than the last entry, and one for
+        when they all had. Every chunk is logged, whatever the interval.
+        """
+
+        if end <= start:
+            return
+
+        began = timestamp - (end - start) * byte_time
+        if self.last is None or began > self.last:
+            self.write(began, start)
+
+        self.write(timestamp, end)
+
+    def write(self, timestamp, offset):
+
+        self.file.write(np.array([(timestamp, offset)], dtype=rawindex.TIMES_DTYPE).tobytes())
+        self.last = timestamp
+
+    def sync(self):
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+
+        self.file.close()
+
+class RotatingCapture(object):
+    """
+    Append-only capture files under path that rotate past rotate_bytes of
+    raw data, optionally compressed.
+    """
+
+    def __init__(self, path, rotate_bytes=ROTATE_BYTES, terminator=b'\r', compression=None):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.terminator = terminator
+        self.suffix = compressed.suffix_for(compression)
+        self.filenames = []
+        self.file = None
+        self.times = None
+        self.size = 0
+
+        self.rotate()
+
+    def rotate(self):
+
+        if self.file is not None:
+            self.sync()
+            self.close_files()
+
+        filename = self.path + CAPTURE_PATTERN % len(self.filenames) + self.suffix
+        self.filenames.append(filename)
+
+        if self.suffix:
+            self.file = compressed.FrameWriter(filename, self.suffix)
+            self.size = 0
+        else:
+            self.file = open(filename, 'ab')
+            self.size = self.file.tell()
+            self.times = TimeLog(filename, self.size)
+
+    def write(self, chunk, timestamp=None):
+        """
+        Append chunk, which had arrived by time.monotonic() timestamp. If it
+        takes the file past rotate_bytes, everything up to its last
+        terminator goes in this file and the rest starts the next.
+        """
+
+        if self.size + len(chunk) >= self.rotate_bytes:
+            end = chunk.rfind(self.terminator)
+
+            if end != -1:
+                end += len(self.terminator)
+                self.file.write(chunk[:end])
+                self.size += end
+                self.log_time(timestamp)
+                self.rotate()
+                chunk = chunk[end:]
+
+        self.file.write(chunk)
+        self.size += len(chunk)
+        self.log_time(timestamp)
+
+    def log_time(self, timestamp):
+
+        if self.times is not None and timestamp is not None:
+            self.times.add(timestamp, self.size)
+
+    def sync(self):
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        if self.times is not None:
+            self.times.sync()
+
+    def close_files(self):
+
+        self.file.close()
+        self.file = None
+
+        if self.times is not None:
+            self.times.close()
+            self.times = None
+
+    def close(self):
+
+        if self.file is not None:
+            self.sync()
+            self.close_files()
+
+class CaptureWriter(object):
+    """
+    Writes chunks to a RotatingCapture from a background thread.
+
+    put_timeout sets the backpressure: None blocks the caller until the
+    writer catches up, 0 drops the chunk straight away, and anything else
+    waits that many seconds before dropping it. Dropped chunks are counted.
+    """
+
+    def __init__(self, capture, queue_chunks=QUEUE_CHUNKS, put_timeout=None, fsync_interval=FSYNC_INTERVAL):
+        self.capture = capture
+        self.put_timeout = put_timeout
+        self.fsync_interval = fsync_interval
+
+        self.chunks = queue.Queue(maxsize=queue_chunks)
+        self.written = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.max_depth = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, chunk):
+
+        if not chunk:
+            return
+
+        try:
+            if self.put_timeout == 0:
+                self.chunks.put_nowait((time.monotonic(), chunk))
+            else:
+                self.chunks.put((time.monotonic(), chunk), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            self.dropped_bytes += len(chunk)
+            return
+
+        self.max_depth = max(self.max_depth, self.chunks.qsize())
+
+    def run(self):
+
+        last_sync = time.monotonic()
+
+        while True:
+            item = self.chunks.get()
+            if item is None:
+                break
+
+            (timestamp, chunk) = item
+
+            if self.error is not None:
+                continue    # Keep draining so write() never blocks forever.
+
+            try:
+                self.capture.write(chunk, timestamp)
+                self.written += len(chunk)
+
+                if self.fsync_interval is not None and time.monotonic() - last_sync >= self.fsync_interval:
+                    self.capture.sync()
+                    last_sync = time.monotonic()
+            except (IOError, OSError) as e:
+                self.error = e
+
+    def close(self):
+        """
+        Write whatever is still queued, sync and close the capture.
+        """
+
+        self.chunks.put(None)
+        self.thread.join()
+        self.capture.close()
+
+        if self.error is not None:
+            raise self.error
+
+    def summary(self):
+
+        return ("wrote " + str(self.written) + " bytes to " + str(len(self.capture.filenames)) +
+                " capture file(s), dropped " + str(self.dropped) + " chunks (" + str(self.dropped_bytes) +
+                " bytes), queue peaked at " + str(self.max_depth) + " chunks")
+
+def tee(chunks, writer):
+    """
+    Pass chunks through unchanged, handing each one to writer on the way.
+    """
+
+    for chunk in chunks:
+        writer.write(chunk)
+        yield chunk
+
+def capture_files(path):
+    """
+    The capture files under path, oldest first, without their .times logs
+    and index files.
+    """
+
+    return sorted(filename for filename in glob.glob(path + 'raw-[0-9][0-9][0-9].txt*')
+                  if filename.endswith('.txt') or compressed.format_of(filename) is not None)
+
+def capture_chunks(path, chunk_size=pipeline.CHUNK_SIZE):
+    """
+    Yield the chunks of every capture file under path in order, to replay a
+    whole session through pipeline.run.
+    """
+
+    for filename in capture_files(path):
+        for chunk in pipeline.file_chunks(filename, chunk_size):
+            yield chunk
@@ -0,0 +1,151 @@
+"""
+Compact binary output written alongside (or instead of) the CSVs. Each stream
+goes to a fixed-record .npy file that is appended to in chunks while the
+capture runs; the header is rewritten with the final sample count on close.
+The files load with np.load, or memory-mapped through load() for zero-copy
+reads, and can be converted back to the usual CSVs with to_csv().
+"""
+
+import csv
+import struct
+
+import numpy as np
+
+import samples
+from pipeline import ACCEL_TAG, POT_TAG, ACCEL_FIELDS, POT_FIELDS
+
+ACCEL_DTYPE = np.dtype([('sample', '<u4'), ('x', '<i4'), ('y', '<i4'), ('z', '<i4')])
+POT_DTYPE = np.dtype([('sample', '<u4'), ('value', '<i4')])
+
+CHUNK_ROWS = 1 << 16
+
+# Fixed header size, so the header can be rewritten in place once the final
+# count is known. Must be a multiple of 64 for the .npy format.
+HEADER_SIZE = 256
+
+def npy_header(dtype, count):
+
+    text = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), count)
+    text = text.ljust(HEADER_SIZE - 10 - 1) + '\n'
+
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(text)) + text.encode('latin1')
+
+class NpyWriter(object):
+    """
+    Appends fixed-size records to a .npy file, a chunk at a time.
+    """
+
+    def __init__(self, filename, dtype, chunk_rows=CHUNK_ROWS):
+        self.file = open(filename, 'wb')
+        self.dtype = dtype
+        self.chunk = np.zeros(chunk_rows, dtype=dtype)
+        self.fill = 0
+        self.count = 0
+
+        self.file.write(npy_header(dtype, 0))
+
+    def append(self, row):
+
+        self.chunk[self.fill] = row
+        self.fill += 1
+
+        if self.fill == len(self.chunk):
+            self.flush()
+
+    def extend(self, rows):
+
+        self.flush()
+        self.file.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+        self.count += len(rows)
+
+    def flush(self):
+
+        if self.fill:
+            self.file.write(self.chunk[:self.fill].tobytes())
+            self.count += self.fill
+            self.fill = 0
+
+    def close(self, count=None):
+        """
+        Flush, optionally drop records past count, and write the final header.
+        """
+
+        self.flush()
+
+        if count is not None and count < self.count:
+            self.count = count
+            self.file.truncate(HEADER_SIZE + count * self.dtype.itemsize)
+
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self.count))
+        self.file.close()
+
+        return self.count
+
+class NpySink(object):
+    """
+    Pipeline sink writing <path>accel.npy and <path>pot.npy. Applies the same
+    trailing-sample truncation as CsvSink.
+    """
+
+    def __init__(self, path):
+        self.accel = NpyWriter(path + 'accel.npy', ACCEL_DTYPE)
+        self.pot = NpyWriter(path + 'pot.npy', POT_DTYPE)
+
+        self.accel_count = 0
+        self.pot_count = 0
+
+    def write(self, tag, values):
+
+        if tag == ACCEL_TAG:
+            self.accel.append((self.accel_count,) + values)
+            self.accel_count += 1
+
+        elif tag == POT_TAG:
+            self.pot.append((self.pot_count,) + values)
+            self.pot_count += 1
+
+    def close(self):
+
+        (self.accel_count, self.pot_count) = samples.trimmed_counts(self.accel_count, self.pot_count)
+
+        self.accel.close(self.accel_count)
+        self.pot.close(self.pot_count)
+
+        return (self.accel_count, self.pot_count)
+
+def load(path):
+    """
+    Memory-map <path>accel.npy and <path>pot.npy. Returns (accel, pot)
+    structured arrays backed by the files.
+    """
+
+    accel = np.load(path + 'accel.npy', mmap_mode='r')
+    pot = np.load(path + 'pot.npy', mmap_mode='r')
+
+    return (accel, pot)
+
+def load_output(path):
+    """
+    Return the (sample_num, accel, pot) series the plot_* functions take.
+    """
+
+    (accel, pot) = load(path)
+
+    return (accel['sample'], accel, pot['value'])
+
+def to_csv(path, chunk_rows=CHUNK_ROWS):
+    """
+    Write <path>accel.csv and <path>pot.csv from the .npy outputs, identical
+    to what CsvSink writes.
+    """
+
+    (accel, pot) = load(path)
+
+    for (name, fields, data) in (('accel', ACCEL_FIELDS, accel), ('pot', POT_FIELDS, pot)):
+        with open(path + name + '.csv', 'w') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fields)
+
+            for start in range(0, len(data), chunk_rows):
+                writer.writerows(data[start:start + chunk_rows].tolist())
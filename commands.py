@@ -0,0 +1,352 @@
+"""
+Command channel to the MCU. Commands are queued and written to the port by
+a writer thread of their own, so neither the caller nor the reader waits on
+a write, and up to max_in_flight of them can be outstanding at once.
+
+The device's replies carry no request ID, but it answers in order, so each
+reply is matched to the oldest outstanding request expecting that reply
+tag. Requests that get no reply within their timeout are failed and
+counted. Per-command latency, from the write to the reply being framed,
+goes into instrument.Histogram.
+
+The reader hands every record to handle(): the GUI's reader thread does
+so, and for scripts start_reader() runs one. A reply that's lost, or that
+arrives after its request timed out, can't be told apart from the reply to
+the next request of the same kind, so timeouts should be generous, and
+against a device that may drop requests max_in_flight should be 1.
+
+Usage: python commands.py <port-number|auto> <command>[,<command> ...] [count] [rate-per-second]
+
+Commands are names from COMMANDS or raw '~' messages, which expect no
+reply. The list is sent count times, at up to rate commands a second.
+"""
+
+import sys
+import time
+import queue
+import threading
+import collections
+
+import instrument
+from framing import RecordFramer, read_chunk
+from records import VERSION_TAG
+
+# name: (message without its terminator, reply tag or None)
+COMMANDS = collections.OrderedDict([
+    ('version', (b'~SHGV', VERSION_TAG)),
+    ('reboot', (b'~SHRB,REBOOT', None)),
+])
+
+TERMINATOR = b'\r'
+
+# Seconds a request waits for its reply before it's failed.
+COMMAND_TIMEOUT = 1.0
+
+# Requests that may be written but not yet answered at once.
+MAX_IN_FLIGHT = 16
+
+# Seconds between checks for requests past their timeout.
+SWEEP_INTERVAL = 0.01
+
+def check_arguments():
+
+    if len(sys.argv) not in (3, 4, 5):
+        print("Usage: python commands.py <port-number|auto> <command>[,<command> ...] [count] [rate-per-second]")
+        sys.exit(-1)
+
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    rate = float(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    return (sys.argv[1], sys.argv[2].split(','), count, rate)
+
+def lookup(command):
+    """
+    Return (name, message, reply tag) for a command name or a raw message.
+    """
+
+    if command in COMMANDS:
+        (message, reply_tag) = COMMANDS[command]
+        return (command, message, reply_tag)
+
+    if isinstance(command, str):
+        command = command.encode()
+    if not command.startswith(b'~'):
+        raise ValueError("Unknown command '" + command.decode(errors='replace') + "'; choose from " + ', '.join(COMMANDS) + " or a raw '~' message.")
+
+    return (command.split(b',', 1)[0].decode(errors='replace'), command, None)
+
+class Request(object):
+    """
+    One command, from being queued to its reply, timeout or, for commands
+    with no reply, being written.
+    """
+
+    def __init__(self, name, message, reply_tag, timeout):
+        self.name = name
+        self.message = message
+        self.reply_tag = reply_tag
+        self.timeout = timeout
+
+        self.sent = None
+        self.deadline = None
+        self.reply = None
+        self.latency = None
+        self.timed_out = False
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Return the reply record, or None for a command without one. Raises
+        TimeoutError if the request timed out, or timeout seconds pass first.
+        """
+
+        if not self.done.wait(timeout):
+            raise TimeoutError("No reply to '" + self.name + "' yet.")
+        if self.timed_out:
+            raise TimeoutError("No reply to '" + self.name + "' within " + str(self.timeout) + " s.")
+
+        return self.reply
+
+class CommandChannel(object):
+    """
+    Writes commands to an open port s from a writer thread and matches the
+    replies handle() is given to them.
+    """
+
+    def __init__(self, s, timeout=COMMAND_TIMEOUT, max_in_flight=MAX_IN_FLIGHT):
+        self.s = s
+        self.timeout = timeout
+
+        self.requests = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.awaiting = {}
+        self.outstanding = 0
+
+        self.sent = collections.Counter()
+        self.replied = collections.Counter()
+        self.timed_out = collections.Counter()
+        self.latency = collections.defaultdict(instrument.Histogram)
+        self.unmatched = 0
+        self.error = None
+
+        self.running = True
+        self.reader = None
+        self.writer = threading.Thread(target=self.write_loop, name='commands')
+        self.writer.daemon = True
+        self.writer.start()
+
+    def send(self, command, timeout=None):
+        """
+        Queue a command (a name or raw message) and return its Request
+        straight away.
+        """
+
+        (name, message, reply_tag) = lookup(command)
+        request = Request(name, message, reply_tag, self.timeout if timeout is None else timeout)
+        self.requests.put(request)
+
+        return request
+
+    def call(self, command, timeout=None):
+        """
+        Send a command and wait for its reply.
+        """
+
+        request = self.send(command, timeout)
+
+        return request.wait()
+
+    def write_loop(self):
+
+        while True:
+            try:
+                request = self.requests.get(timeout=SWEEP_INTERVAL)
+            except queue.Empty:
+                request = None
+
+            self.expire()
+
+            if request is None:
+                if not self.running and not self.outstanding:
+                    break
+                continue
+
+            if request.reply_tag is not None:
+                # Wait for a slot, still failing requests as they time out.
+                while not self.slots.acquire(timeout=SWEEP_INTERVAL):
+                    self.expire()
+
+                with self.lock:
+                    self.awaiting.setdefault(request.reply_tag, collections.deque()).append(request)
+                    self.outstanding += 1
+                    request.sent = time.perf_counter_ns()
+                    request.deadline = request.sent + int(request.timeout * 1e9)
+
+            try:
+                self.s.write(request.message + TERMINATOR)
+            except (IOError, OSError) as e:
+                self.error = e
+
+            self.sent[request.name] += 1
+
+            if request.reply_tag is None:
+                request.sent = time.perf_counter_ns()
+                request.done.set()
+
+    def handle(self, record):
+        """
+        Match a record from the port to the oldest request awaiting its tag.
+        Returns the request it answered, or None.
+        """
+
+        if not self.outstanding:
+            return None
+
+        now = time.perf_counter_ns()
+        tag = record.split(b',', 1)[0]
+
+        with self.lock:
+            pending = self.awaiting.get(tag)
+            if not pending:
+                return None
+
+            request = pending.popleft()
+            self.outstanding -= 1
+
+        request.reply = record
+        request.latency = now - request.sent
+        self.latency[request.name].add(request.latency)
+        self.replied[request.name] += 1
+        self.slots.release()
+        request.done.set()
+
+        return request
+
+    def expire(self):
+        """
+        Fail the outstanding requests that are past their deadline.
+        """
+
+        if not self.outstanding:
+            return
+
+        now = time.perf_counter_ns()
+        expired = []
+
+        with self.lock:
+            for (tag, pending) in self.awaiting.items():
+                if any(request.deadline <= now for request in pending):
+                    expired.extend(request for request in pending if request.deadline <= now)
+                    self.awaiting[tag] = collections.deque(request for request in pending if request.deadline > now)
+            self.outstanding -= len(expired)
+
+        for request in expired:
+            request.timed_out = True
+            self.timed_out[request.name] += 1
+            self.slots.release()
+            request.done.set()
+
+    def start_reader(self):
+        """
+        Read the port on a thread of its own, handing every record to
+        handle(), for when nothing else is reading it.
+        """
+
+        def read_loop():
+            framer = RecordFramer()
+            while self.writer.is_alive():
+                try:
+                    chunk = read_chunk(self.s)
+                except (IOError, OSError) as e:
+                    self.error = e
+                    break
+
+                for record in framer.feed(chunk):
+                    if self.handle(record) is None:
+                        self.unmatched += 1
+
+        self.reader = threading.Thread(target=read_loop, name='command replies')
+        self.reader.daemon = True
+        self.reader.start()
+
+    def close(self, wait=True):
+        """
+        Stop the writer once it has written whatever is queued and every
+        request has its reply or has timed out, then the reader if
+        start_reader() started one. With wait set, block until they have.
+        """
+
+        self.running = False
+
+        if wait:
+            self.writer.join()
+            if self.reader is not None:
+                self.reader.join()
+
+    def parts(self):
+        """
+        One line per command sent: counts and reply latency percentiles.
+        """
+
+        parts = []
+
+        for name in sorted(self.sent):
+            part = "%s sent %d replied %d timed out %d" % (name, self.sent[name], self.replied[name], self.timed_out[name])
+            if self.latency[name].count:
+                part += " latency " + self.latency[name].describe()
+            parts.append(part)
+
+        return parts
+
+    def line(self):
+
+        return " | ".join(self.parts()) or "no commands sent"
+
+def run_batch(channel, commands, count=1, rate=None):
+    """
+    Send the commands count times over, at up to rate a second (None for as
+    fast as the in-flight limit allows), then wait for every reply. Returns
+    (requests, seconds).
+    """
+
+    requests = []
+    interval = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+
+    for i in range(count):
+        for command in commands:
+            if interval:
+                delay = start + len(requests) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            requests.append(channel.send(command))
+
+    for request in requests:
+        request.done.wait()
+
+    return (requests, time.perf_counter() - start)
+
+if __name__ == "__main__":
+
+    import parser
+
+    port_number, commands, count, rate = check_arguments()
+
+    for command in commands:
+        lookup(command)
+
+    s = parser.open_port(parser.check_port_number(port_number))
+    channel = CommandChannel(s)
+    channel.start_reader()
+
+    (requests, seconds) = run_batch(channel, commands, count, rate)
+
+    channel.close()
+    s.close()
+
+    print("Sent " + str(len(requests)) + " commands in " + ('%.2f' % seconds) + " s (" +
+          ('%.0f' % (len(requests) / seconds)) + " commands/s).")
+    for part in channel.parts():
+        print("\t" + part)
@@ -0,0 +1,179 @@
+"""
+Compressed raw captures. A capture file's suffix names its compression:
+'.gz', '.bz2' and '.xz' from the standard library, and '.zst' and '.lz4'
+when the zstandard or lz4 packages are installed.
+
+Data is written as a series of independent frames (gzip members, bz2 and xz
+streams, zstd and lz4 frames), one per sync, so everything up to the last
+sync can be read back even if the writer never closed the file. The readers
+decompress frame after frame as a stream.
+"""
+
+import bz2
+import gzip
+import lzma
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Compression level for each format; fast enough to keep up with the port.
+GZIP_LEVEL = 6
+BZ2_LEVEL = 9
+XZ_PRESET = 1
+ZSTD_LEVEL = 3
+
+def _zstd_writer(file):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(file, closefd=False)
+
+def _zstd_reader(file):
+    return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True, closefd=False)
+
+# Suffix -> (frame writer, stream reader). Both wrap an open binary file
+# and leave it open when they're closed.
+FORMATS = {
+    '.gz' : (lambda file: gzip.GzipFile(fileobj=file, mode='wb', compresslevel=GZIP_LEVEL),
+             lambda file: gzip.GzipFile(fileobj=file, mode='rb')),
+    '.bz2' : (lambda file: bz2.BZ2File(file, 'wb', compresslevel=BZ2_LEVEL),
+              lambda file: bz2.BZ2File(file, 'rb')),
+    '.xz' : (lambda file: lzma.LZMAFile(file, 'wb', preset=XZ_PRESET),
+             lambda file: lzma.LZMAFile(file, 'rb')),
+}
+
+if zstandard is not None:
+    FORMATS['.zst'] = (_zstd_writer, _zstd_reader)
+
+if lz4 is not None:
+    FORMATS['.lz4'] = (lambda file: lz4.frame.LZ4FrameFile(file, 'wb'),
+                       lambda file: lz4.frame.LZ4FrameFile(file, 'rb'))
+
+# Names accepted for the compression option, in order of preference.
+NAMES = {'zstd' : '.zst', 'lz4' : '.lz4', 'gzip' : '.gz', 'bz2' : '.bz2', 'xz' : '.xz'}
+
+def available():
+    """
+    The compression names usable here, best first.
+    """
+
+    return [name for (name, suffix) in NAMES.items() if suffix in FORMATS]
+
+def suffix_for(compression):
+    """
+    Return the file suffix for a compression name, '' for None.
+    """
+
+    if compression is None:
+        return ''
+
+    if NAMES.get(compression) not in FORMATS:
+        raise ValueError("Compression '" + str(compression) + "' isn't available here; choose from " + ', '.join(available()) + ".")
+
+    return NAMES[compression]
+
+def format_of(filename):
+    """
+    Return the suffix of a compressed capture, or None for a plain one.
+    """
+
+    for suffix in FORMATS:
+        if filename.endswith(suffix):
+            return suffix
+
+    return None
+
+class FrameWriter(object):
+    """
+    Appends compressed frames to filename. A frame is opened on the first
+    write after a flush, and flush() finishes it and hands it to the OS.
+    """
+
+    def __init__(self, filename, suffix):
+        self.file = open(filename, 'ab')
+        self.new_frame = FORMATS[suffix][0]
+        self.frame = None
+
+    def write(self, data):
+
+        if self.frame is None:
+            self.frame = self.new_frame(self.file)
+
+        self.frame.write(data)
+
+    def flush(self):
+
+        if self.frame is not None:
+            self.frame.close()
+            self.frame = None
+
+        self.file.flush()
+
+    def fileno(self):
+
+        return self.file.fileno()
+
+    def close(self):
+
+        self.flush()
+        self.file.close()
+
+def open_read(filename):
+    """
+    Open a capture for reading, decompressing on the fly if its suffix says
+    it's compressed.
+    """
+
+    suffix = format_of(filename)
+    if suffix is None:
+        return open(filename, 'rb')
+
+    return StreamReader(filename, suffix)
+
+class StreamReader(object):
+    """
+    A decompressing reader that also closes the underlying file.
+    """
+
+    def __init__(self, filename, suffix):
+        self.file = open(filename, 'rb')
+        self.stream = FORMATS[suffix][1](self.file)
+
+    def read(self, size=-1):
+        """
+        Return up to size decompressed bytes. Reads stop at frame boundaries,
+        so if the last frame was cut short by a crash, everything before it
+        is still returned before reads come back empty.
+        """
+
+        pieces = []
+        length = 0
+
+        while size < 0 or length < size:
+            try:
+                piece = self.stream.read1(size - length if size >= 0 else -1)
+            except EOFError:
+                piece = b''
+
+            if not piece:
+                break
+
+            pieces.append(piece)
+            length += len(piece)
+
+        return b''.join(pieces)
+
+    def close(self):
+
+        self.stream.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
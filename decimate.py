@@ -0,0 +1,37 @@
+"""
+Min/max decimation for plotting long captures. Each series is cut into
+equal buckets and only the lowest and highest sample of every bucket is
+kept, in their original order, so spikes survive and the drawn envelope
+looks the same as the full-resolution line.
+"""
+
+import numpy as np
+
+def minmax(x, y, buckets):
+    """
+    Reduce the series (x, y) to at most 2 * buckets points.
+    """
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+
+    if buckets < 1 or n <= 2 * buckets:
+        return (x, y)
+
+    size = -(-n // buckets)
+    count = -(-n // size)
+
+    # Pad with the final sample so the last bucket can be reshaped too.
+    padded = np.empty(count * size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(count, size)
+
+    offsets = np.arange(count) * size
+    lows = np.minimum(offsets + rows.argmin(axis=1), n - 1)
+    highs = np.minimum(offsets + rows.argmax(axis=1), n - 1)
+
+    index = np.column_stack((np.minimum(lows, highs), np.maximum(lows, highs))).ravel()
+
+    return (x[index], y[index])
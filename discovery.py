@@ -0,0 +1,208 @@
+"""
+Finds the rig's USB devices by vendor and product ID: the USB hub, the OV116
+board and the MCU board's FTDI serial adapter. Serial ports come from
+serial.tools.list_ports on every platform. The hub and OV116 board aren't
+serial ports, so they're found in sysfs on Linux, through WMI on Windows
+when the wmi package is installed, and among the serial ports elsewhere.
+
+A Discovery keeps its last scan for a few seconds, so rescans and
+reconnects don't enumerate the bus again. Where pyudev is installed, it
+also watches for USB and tty hotplug events, rescanning as soon as a device
+comes or goes, so the cache is never stale.
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import threading
+import collections
+
+import serial.tools.list_ports
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+# name: (vendor ID, product ID, label)
+DEVICES = collections.OrderedDict([
+    ('hub', (0x04B4, 0x6572, 'USB Hub')),
+    ('ov', (0x05A9, 0x8065, 'OV116 Board')),
+    ('mcu', (0x0403, 0x6015, 'MCU Board')),
+])
+
+# Seconds a scan is reused for, unless a hotplug event says otherwise.
+CACHE_SECONDS = 2.0
+
+# Port arguments that mean whichever port the MCU board is on.
+AUTO_PORTS = ('', 'auto')
+
+SYSFS_USB = '/sys/bus/usb/devices'
+
+WINDOWS_ID = re.compile(r'VID_([0-9A-F]{4})&PID_([0-9A-F]{4})', re.IGNORECASE)
+
+def sysfs_usb_ids(root=SYSFS_USB):
+    """
+    The (vendor, product) IDs of the USB devices attached, read from sysfs.
+    """
+
+    ids = set()
+
+    for device in glob.glob(os.path.join(root, '*')):
+        try:
+            with open(os.path.join(device, 'idVendor')) as file:
+                vendor = int(file.read(), 16)
+            with open(os.path.join(device, 'idProduct')) as file:
+                product = int(file.read(), 16)
+        except (IOError, OSError, ValueError):
+            continue    # Interfaces and hubs' ports have no IDs of their own.
+
+        ids.add((vendor, product))
+
+    return ids
+
+def wmi_usb_ids():
+    """
+    The (vendor, product) IDs of the USB devices attached, from WMI, or None
+    without the wmi package.
+    """
+
+    try:
+        import wmi
+    except ImportError:
+        return None
+
+    ids = set()
+
+    for device in wmi.WMI().query("Select * From Win32_USBControllerDevice"):
+        match = WINDOWS_ID.search(device.Dependent.DeviceID)
+        if match:
+            ids.add((int(match.group(1), 16), int(match.group(2), 16)))
+
+    return ids
+
+def usb_ids(ports):
+    """
+    The (vendor, product) IDs of the USB devices attached, by whatever means
+    this platform has, always including those of the serial ports.
+    """
+
+    ids = set((port.vid, port.pid) for port in ports if port.vid is not None)
+
+    if sys.platform.startswith('linux'):
+        ids |= sysfs_usb_ids()
+    elif sys.platform.startswith('win'):
+        ids |= wmi_usb_ids() or set()
+
+    return ids
+
+class Scan(object):
+    """
+    What one enumeration found: the serial ports, which of DEVICES are
+    attached, and the MCU board's port.
+    """
+
+    def __init__(self, ports, ids):
+        self.time = time.monotonic()
+        self.ports = ports
+        self.found = dict((name, (vendor, product) in ids) for (name, (vendor, product, label)) in DEVICES.items())
+
+        (vendor, product, label) = DEVICES['mcu']
+        mcu_ports = sorted(port.device for port in ports if (port.vid, port.pid) == (vendor, product))
+        self.mcu_port = mcu_ports[0] if mcu_ports else None
+
+    def port_names(self):
+        """
+        The serial port device names, the MCU board's first.
+        """
+
+        return sorted((port.device for port in self.ports), key=lambda device: (device != self.mcu_port, device))
+
+    def resolve(self, port_number):
+        """
+        Return the port a command line port argument names: the MCU board's
+        for '' or 'auto', an existing device path as is, or otherwise the
+        first port whose name contains it, preferring the MCU board's.
+        Returns None when nothing matches.
+        """
+
+        if port_number in AUTO_PORTS:
+            return self.mcu_port
+
+        if os.path.exists(port_number):
+            return port_number
+
+        for device in self.port_names():
+            if port_number in device:
+                return device
+
+        return None
+
+class Discovery(object):
+    """
+    Scans for the rig's devices, caching the result for cache_seconds.
+    generation goes up whenever a hotplug event is seen, so callers can
+    notice changes without rescanning themselves.
+    """
+
+    def __init__(self, cache_seconds=CACHE_SECONDS):
+        self.cache_seconds = cache_seconds
+        self.lock = threading.Lock()
+        self.last = None
+        self.generation = 0
+        self.observer = None
+
+    def scan(self, force=False):
+        """
+        Return the cached Scan, or a new one if it's older than
+        cache_seconds or force is set.
+        """
+
+        with self.lock:
+            last = self.last
+
+        if force or last is None or time.monotonic() - last.time > self.cache_seconds:
+            ports = serial.tools.list_ports.comports()
+            last = Scan(ports, usb_ids(ports))
+
+            with self.lock:
+                self.last = last
+
+        return last
+
+    def watch(self):
+        """
+        Start watching for hotplug events. Returns False when pyudev isn't
+        available, in which case scans just expire after cache_seconds.
+        """
+
+        if pyudev is None or self.observer is not None:
+            return self.observer is not None
+
+        try:
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by('usb')
+            monitor.filter_by('tty')
+            self.observer = pyudev.MonitorObserver(monitor, callback=self.hotplug, name='hotplug')
+        except (OSError, ValueError):
+            return False    # No netlink access, as in some containers.
+
+        self.observer.daemon = True
+        self.observer.start()
+
+        return True
+
+    def hotplug(self, device):
+
+        self.scan(force=True)
+
+        with self.lock:
+            self.generation += 1
+
+    def stop(self):
+
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
@@ -0,0 +1,98 @@
+import time
+
+# Seconds a read may block waiting for the first byte. Keeps the reader
+# responsive to stop requests without spinning on an empty port.
+READ_TIMEOUT = 0.05
+
+class RecordFramer(object):
+    """
+    Splits a raw serial byte stream into '\\r' terminated records. Bytes are
+    accumulated in a bytearray and split in bulk, so the cost per chunk is
+    independent of how many bytes the chunk holds.
+    """
+
+    def __init__(self, terminator=b'\r'):
+        self.terminator = terminator
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        Add a chunk of bytes and return the list of complete records in it.
+        Any trailing partial record is kept until the next call.
+        """
+
+        if not chunk:
+            return []
+
+        self.buffer += chunk
+
+        end = self.buffer.rfind(self.terminator)
+        if end == -1:
+            return []
+
+        records = bytes(memoryview(self.buffer)[:end]).split(self.terminator)
+        del self.buffer[:end + len(self.terminator)]
+
+        return records
+
+    def flush(self):
+        """
+        Return whatever partial record is left over and reset the framer.
+        """
+
+        remainder = bytes(self.buffer)
+        self.buffer = bytearray()
+
+        return remainder
+
+def read_chunk(s):
+    """
+    Read everything the port has buffered, or block for up to the port's
+    timeout waiting for at least one byte.
+    """
+
+    return s.read(max(1, s.in_waiting))
+
+def running_for(recording_time):
+    """
+    Return a callable that stays True for recording_time seconds.
+    """
+
+    start_time = time.time()
+
+    return lambda: time.time() - start_time < recording_time
+
+class OffsetFramer(RecordFramer):
+    """
+    RecordFramer that also reports where in the stream each record ends: the
+    offset just past its terminator, counting every byte fed so far. Paired
+    with a .times log of when those offsets arrived, that gives each
+    record's host time.
+    """
+
+    def __init__(self, terminator=b'\r'):
+        super().__init__(terminator)
+        self.offset = 0
+
+    def feed_offsets(self, chunk):
+        """
+        Like feed, but returns a list of (end offset, record) pairs.
+        """
+
+        self.offset += len(chunk)
+        records = self.feed(chunk)
+        offsets = [0] * len(records)
+        end = self.offset - len(self.buffer)
+
+        for i in range(len(records) - 1, -1, -1):
+            offsets[i] = end
+            end -= len(records[i]) + len(self.terminator)
+
+        return list(zip(offsets, records))
+
+def byte_time(baudrate):
+    """
+    Seconds per byte on an 8N1 line.
+    """
+
+    return 10.0 / baudrate
@@ -0,0 +1,308 @@
+"""
+Counters and latency histograms for the capture hot path, cheap enough to
+leave on at the full record rate. Counts are exact. Per-chunk stages (read,
+frame) and the GUI's display stages are timed every time; per-record stages
+(decode, write) for one record in SAMPLE_EVERY. Histograms bucket
+nanoseconds by power of two, so recording one is an int.bit_length() and a
+list increment.
+
+The same Instruments object is threaded through pipeline.run,
+align.run_timed, collect_data and capture_data, which print its stats line
+every report_interval seconds, and is kept by ui.GUI for its stats panel.
+"""
+
+import time
+
+from records import ACCEL_TAG, POT_TAG, VERSION_TAG, decode
+
+# Time one record in this many. Must be a power of two.
+SAMPLE_EVERY = 32
+SAMPLE_MASK = SAMPLE_EVERY - 1
+
+# Seconds between stats lines on the command line.
+REPORT_INTERVAL = 5.0
+
+STAGES = ['read', 'frame', 'decode', 'write', 'queue', 'display']
+
+def format_ns(ns):
+
+    if ns < 1000:
+        return '%dns' % ns
+    if ns < 1000000:
+        return '%.1fus' % (ns / 1e3)
+    if ns < 1000000000:
+        return '%.1fms' % (ns / 1e6)
+
+    return '%.2fs' % (ns / 1e9)
+
+class Histogram(object):
+    """
+    Nanosecond latencies in power of two buckets: bucket i holds values
+    below 2**i. Percentiles come back as the upper bound of their bucket.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * 65
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns):
+
+        self.buckets[ns.bit_length()] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+
+        target = q / 100.0 * self.count
+        seen = 0
+
+        for (i, n) in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min((1 << i) - 1, self.max)
+
+        return self.max
+
+    def mean(self):
+
+        return self.total / self.count if self.count else 0.0
+
+    def describe(self):
+
+        return "p50 %s p99 %s max %s" % (format_ns(self.percentile(50)), format_ns(self.percentile(99)), format_ns(self.max))
+
+class Instruments(object):
+
+    def __init__(self, report_interval=None, report=print):
+        self.report_interval = report_interval
+        self.report = report
+
+        self.bytes = 0
+        self.chunks = 0
+        self.empty_reads = 0
+        self.records = 0
+        self.decoded = 0
+        self.tags = {ACCEL_TAG : 0, POT_TAG : 0, VERSION_TAG : 0}
+        self.unknown = 0
+        self.malformed = 0
+        self.dropped = 0
+
+        self.latency = dict((stage, Histogram()) for stage in STAGES)
+
+        self.start = time.monotonic()
+        self.next_report = self.start + report_interval if report_interval else None
+        self.last = (self.start, 0, 0)
+
+    def watch_chunks(self, chunks):
+        """
+        Yield from a chunk source, counting bytes and timing each read.
+        Prints the stats line every report_interval seconds.
+        """
+
+        histogram = self.latency['read']
+        chunks = iter(chunks)
+
+        while True:
+            start = time.perf_counter_ns()
+            chunk = next(chunks, None)
+            histogram.add(time.perf_counter_ns() - start)
+
+            if chunk is None:
+                return
+
+            self.count_chunk(chunk)
+            self.maybe_report()
+
+            yield chunk
+
+    def watch_timed_chunks(self, timed_chunks):
+        """
+        Like watch_chunks, for (timestamp, chunk) pairs.
+        """
+
+        histogram = self.latency['read']
+        timed_chunks = iter(timed_chunks)
+
+        while True:
+            start = time.perf_counter_ns()
+            item = next(timed_chunks, None)
+            histogram.add(time.perf_counter_ns() - start)
+
+            if item is None:
+                return
+
+            self.count_chunk(item[1])
+            self.maybe_report()
+
+            yield item
+
+    def read(self, read_chunk, s):
+        """
+        read_chunk(s), timed and counted, for readers that loop themselves.
+        """
+
+        start = time.perf_counter_ns()
+        chunk = read_chunk(s)
+        self.latency['read'].add(time.perf_counter_ns() - start)
+        self.count_chunk(chunk)
+
+        return chunk
+
+    def count_chunk(self, chunk):
+
+        self.chunks += 1
+        self.bytes += len(chunk)
+        if not chunk:
+            self.empty_reads += 1
+
+    def feed(self, framer, chunk):
+        """
+        framer.feed, timed and counting the records it returns.
+        """
+
+        start = time.perf_counter_ns()
+        records = framer.feed(chunk)
+        self.latency['frame'].add(time.perf_counter_ns() - start)
+        self.records += len(records)
+
+        return records
+
+    def feed_offsets(self, framer, chunk):
+
+        start = time.perf_counter_ns()
+        items = framer.feed_offsets(chunk)
+        self.latency['frame'].add(time.perf_counter_ns() - start)
+        self.records += len(items)
+
+        return items
+
+    def decode(self, records):
+        """
+        pipeline.decode with the counting of decode_record inlined, skipping
+        malformed records as pipeline.decode does. For one record in
+        SAMPLE_EVERY, the decode is timed, and so is the time the consumer
+        takes with it before asking for the next (the sink write).
+        """
+
+        return self._decode(records, False)
+
+    def decode_offsets(self, offset_records):
+        """
+        Like decode, for (offset, record) pairs, yielding (offset, tag, values).
+        """
+
+        return self._decode(offset_records, True)
+
+    def _decode(self, items, keyed):
+
+        tags = self.tags
+        decode_latency = self.latency['decode']
+        write_latency = self.latency['write']
+        key = None
+        decoded_count = self.decoded
+
+        for item in items:
+            if keyed:
+                (key, record) = item
+            else:
+                record = item
+
+            decoded_count += 1
+            self.decoded = decoded_count
+            start = None
+
+            try:
+                if decoded_count & SAMPLE_MASK:
+                    decoded = decode(record)
+                else:
+                    start = time.perf_counter_ns()
+                    decoded = decode(record)
+                    decode_latency.add(time.perf_counter_ns() - start)
+            except (ValueError, IndexError):
+                self.malformed += 1
+                continue
+
+            if decoded is None:
+                self.unknown += 1
+                continue
+
+            tags[decoded[0]] += 1
+
+            if decoded[0] == VERSION_TAG:
+                continue
+
+            if keyed:
+                decoded = (key, decoded[0], decoded[1])
+
+            if start is None:
+                yield decoded
+            else:
+                start = time.perf_counter_ns()
+                yield decoded
+                write_latency.add(time.perf_counter_ns() - start)
+
+    def decode_record(self, record):
+        """
+        records.decode, counting tags, unknown and malformed records. Malformed
+        records are counted and, like unknown ones, come back as None.
+        """
+
+        self.decoded += 1
+
+        try:
+            if self.decoded & SAMPLE_MASK:
+                decoded = decode(record)
+            else:
+                start = time.perf_counter_ns()
+                decoded = decode(record)
+                self.latency['decode'].add(time.perf_counter_ns() - start)
+        except (ValueError, IndexError):
+            self.malformed += 1
+            return None
+
+        if decoded is None:
+            self.unknown += 1
+        else:
+            self.tags[decoded[0]] += 1
+
+        return decoded
+
+    def maybe_report(self):
+
+        if self.next_report is not None and time.monotonic() >= self.next_report:
+            self.report(self.line())
+            self.next_report += self.report_interval
+
+    def line(self):
+        """
+        One line of stats: totals, rates since the previous line, and the
+        latency percentiles of every stage that's seen any traffic.
+        """
+
+        return " | ".join(self.parts())
+
+    def parts(self):
+
+        now = time.monotonic()
+        (last_time, last_bytes, last_records) = self.last
+        interval = max(now - last_time, 1e-9)
+        self.last = (now, self.bytes, self.records)
+
+        parts = [
+            "%.1f s" % (now - self.start),
+            "%d bytes (%.0f B/s)" % (self.bytes, (self.bytes - last_bytes) / interval),
+            "%d records (%.0f/s)" % (self.records, (self.records - last_records) / interval),
+            "accel %d pot %d version %d" % (self.tags[ACCEL_TAG], self.tags[POT_TAG], self.tags[VERSION_TAG]),
+            "unknown %d malformed %d dropped %d empty reads %d" % (self.unknown, self.malformed, self.dropped, self.empty_reads),
+        ]
+
+        for stage in STAGES:
+            histogram = self.latency[stage]
+            if histogram.count:
+                parts.append(stage + " " + histogram.describe())
+
+        return parts
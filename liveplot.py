@@ -0,0 +1,166 @@
+"""
+Live strip chart of potentiometer and accelerometer magnitude over a
+sliding window. Samples go into preallocated circular buffers from the
+reader thread; the chart updates its line data in place and blits only the
+lines over a cached background, falling back to a full draw when the axes
+have to be rescaled.
+"""
+
+import math
+import time
+import threading
+import collections
+
+import numpy as np
+
+# Samples shown in the window.
+WINDOW = 2000
+
+# Milliseconds between redraws. Caps the redraw rate however fast
+# records arrive.
+REDRAW_INTERVAL = 50
+
+class CircularBuffer(object):
+    """
+    Fixed-capacity float64 buffer that overwrites its oldest values.
+    """
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+
+    def append(self, value):
+
+        self.data[self.index] = value
+        self.index = (self.index + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def clear(self):
+
+        self.index = 0
+        self.count = 0
+
+    def ordered(self):
+        """
+        Return a copy of the buffered values, oldest first.
+        """
+
+        if self.count < len(self.data):
+            return self.data[:self.count].copy()
+
+        return np.concatenate((self.data[self.index:], self.data[:self.index]))
+
+class StripChart(object):
+    """
+    Draws the pot and accel magnitude buffers onto a figure and canvas. Works
+    with any canvas that supports copy_from_bbox/restore_region/blit, so it
+    can be measured off-screen with the Agg canvas.
+    """
+
+    def __init__(self, figure, canvas, window=WINDOW):
+        self.figure = figure
+        self.canvas = canvas
+        self.lock = threading.Lock()
+
+        self.pot = CircularBuffer(window)
+        self.accel = CircularBuffer(window)
+        self.x = np.arange(window)
+        self.samples = 0
+
+        self.axes = figure.subplots(2, 1, sharex=True)
+        self.lines = [ax.plot([], [], animated=True)[0] for ax in self.axes]
+
+        self.axes[0].set_ylabel('Rotation')
+        self.axes[1].set_ylabel('Motion')
+        self.axes[1].set_xlabel('Sample')
+        self.axes[1].set_xlim(0, window)
+
+        self.background = None
+        self.frame_times = collections.deque(maxlen=100)
+
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def add_pot(self, value):
+
+        with self.lock:
+            self.pot.append(value)
+            self.samples += 1
+
+    def add_accel(self, x, y, z):
+
+        magnitude = math.sqrt((x ** 2) + (y ** 2) + (z ** 2))
+
+        with self.lock:
+            self.accel.append(magnitude)
+            self.samples += 1
+
+    def clear(self):
+
+        with self.lock:
+            self.pot.clear()
+            self.accel.clear()
+
+    def on_draw(self, event):
+
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+
+        for ax, line in zip(self.axes, self.lines):
+            ax.draw_artist(line)
+
+    def rescale(self, ax, data):
+        """
+        Widen the y limits of ax to fit data. Returns True if they changed.
+        """
+
+        (low, high) = ax.get_ylim()
+        (data_low, data_high) = (data.min(), data.max())
+
+        if data_low >= low and data_high <= high:
+            return False
+
+        span = max(data_high - data_low, 1.0)
+        ax.set_ylim(min(low, data_low - 0.1 * span), max(high, data_high + 0.1 * span))
+
+        return True
+
+    def redraw(self, full=False):
+        """
+        Push the buffered data into the lines and redraw them. Returns the
+        time the redraw took, which is also kept in frame_times.
+        """
+
+        start = time.perf_counter()
+
+        with self.lock:
+            series = (self.pot.ordered(), self.accel.ordered())
+
+        for ax, line, data in zip(self.axes, self.lines, series):
+            line.set_data(self.x[:len(data)], data)
+            if len(data) and self.rescale(ax, data):
+                full = True
+
+        if full or self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.figure.bbox)
+
+        elapsed = time.perf_counter() - start
+        self.frame_times.append(elapsed)
+
+        return elapsed
+
+    def frame_cost(self):
+        """
+        Mean redraw time over the recent frames, in milliseconds.
+        """
+
+        if not self.frame_times:
+            return 0.0
+
+        return 1000.0 * sum(self.frame_times) / len(self.frame_times)
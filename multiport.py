@@ -0,0 +1,181 @@
+"""
+Captures many serial ports at once from a single asyncio event loop. Each
+port is opened non-blocking and registered with loop.add_reader, so one
+thread services every board. Records are framed and decoded as they arrive
+and streamed into a per-port output folder.
+
+Usage: python multiport.py <output-folder-name> <recording-time-seconds> <port-number> [<port-number> ...]
+
+POSIX only, since it relies on add_reader for serial file descriptors.
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import serial
+
+import parser
+import pipeline
+from framing import RecordFramer
+
+READ_SIZE = 1 << 16
+
+# Seconds between metrics lines while capturing.
+REPORT_INTERVAL = 1.0
+
+def check_arguments():
+
+    if len(sys.argv) < 4:
+        print("Usage: python multiport.py <output-folder-name> <recording-time-seconds> <port-number> [<port-number> ...]")
+        sys.exit(-1)
+
+    return (sys.argv[1], sys.argv[2], sys.argv[3:])
+
+class PortCapture(object):
+    """
+    Reads one port from the event loop into a pipeline sink at path, and
+    keeps throughput and backlog metrics for it.
+
+    The backlog is the most bytes one read found waiting, and the line time
+    those bytes took to arrive at the port's baud rate. It's a bound on how
+    far behind the port the loop fell, not a measured delay; the loop lag
+    capture() prints is the measured one. Malformed records are skipped, as
+    pipeline.decode does.
+    """
+
+    def __init__(self, port, path, baudrate=115200, sink_class=pipeline.CsvSink):
+        self.port = port
+        self.path = path
+        self.baudrate = baudrate
+
+        self.s = serial.Serial(
+            port = port,
+            baudrate = baudrate,
+            parity = serial.PARITY_NONE,
+            stopbits = serial.STOPBITS_ONE,
+            bytesize = serial.EIGHTBITS,
+            timeout = 0)
+        self.fd = self.s.fileno()
+
+        self.framer = RecordFramer()
+        self.sink = sink_class(path)
+        self.closed = False
+
+        self.bytes = 0
+        self.records = 0
+        self.reads = 0
+        self.max_read = 0
+        self.start = time.perf_counter()
+
+    def on_readable(self):
+
+        try:
+            chunk = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b''
+
+        if not chunk:
+            # The other end went away (e.g. the board was unplugged).
+            asyncio.get_running_loop().remove_reader(self.fd)
+            return
+
+        self.bytes += len(chunk)
+        self.reads += 1
+        self.max_read = max(self.max_read, len(chunk))
+
+        records = self.framer.feed(chunk)
+        self.records += len(records)
+
+        for tag, values in pipeline.decode(records):
+            self.sink.write(tag, values)
+
+    def backlog_time(self):
+        """
+        Seconds of line time in the largest read: how long its bytes took to
+        arrive, at 10 bits a byte.
+        """
+
+        return self.max_read * 10.0 / self.baudrate
+
+    def summary(self):
+
+        elapsed = time.perf_counter() - self.start
+
+        return (self.port + ": " + str(self.records) + " records, " + ('%.0f' % (self.records / elapsed)) +
+                " records/s, " + ('%.1f' % (self.bytes / 1e3 / elapsed)) + " kB/s, " + str(self.reads) +
+                " reads, max backlog " + str(self.max_read) + " bytes (" + ('%.1f' % (self.backlog_time() * 1000)) +
+                " ms of line time)")
+
+    def close(self):
+
+        if self.closed:
+            return (0, 0)
+
+        self.closed = True
+        asyncio.get_running_loop().remove_reader(self.fd)
+        self.s.close()
+
+        return self.sink.close()
+
+async def capture(captures, recording_time, report_interval=REPORT_INTERVAL):
+    """
+    Run every PortCapture for recording_time seconds, printing each port's
+    metrics and the event loop's scheduling lag every report_interval.
+    Returns the (accel, pot) counts written for each capture.
+    """
+
+    loop = asyncio.get_running_loop()
+    for c in captures:
+        loop.add_reader(c.fd, c.on_readable)
+
+    end = loop.time() + recording_time
+    try:
+        while loop.time() < end:
+            wake = loop.time() + min(report_interval, end - loop.time())
+            await asyncio.sleep(wake - loop.time())
+
+            print("loop lag " + ('%.1f' % ((loop.time() - wake) * 1000)) + " ms")
+            for c in captures:
+                print("\t" + c.summary())
+    finally:
+        counts = [c.close() for c in captures]
+
+    return counts
+
+def port_folder(path, port):
+    """
+    Return the output folder for port under path, named after the device.
+    """
+
+    folder = path + os.path.basename(port)
+    os.mkdir(folder)
+
+    return folder + '/'
+
+def run(path, ports, recording_time, sink_class=pipeline.CsvSink):
+    """
+    Capture every port in ports into its own folder under path.
+    """
+
+    captures = [PortCapture(port, port_folder(path, port), sink_class=sink_class) for port in ports]
+
+    print("Beginning data collection on " + str(len(captures)) + " ports...")
+    counts = asyncio.run(capture(captures, recording_time))
+
+    for c, (accel_count, pot_count) in zip(captures, counts):
+        print(c.port + ": wrote " + str(accel_count) + " accelerometer and " + str(pot_count) + " potentiometer samples to " + c.path)
+
+    return counts
+
+if __name__ == "__main__":
+
+    filename, recording_time, port_numbers = check_arguments()
+
+    path = parser.check_filename(filename)
+    ports = [parser.check_port_number(port_number) for port_number in port_numbers]
+
+    run(path, ports, float(recording_time))
@@ -2,20 +2,38 @@ import os
 import io
 import sys
 import csv
-import math
-import glob
-import time
 import shutil
-import serial.tools.list_ports
-import matplotlib.pyplot as plt
+import serial
+
+import align
+import analysis
+import capture
+import columnar
+import compressed
+import discovery
+import instrument
+import pipeline
+import plotting
+import rawfile
+import rawindex
+import records
+import samples
+from framing import READ_TIMEOUT, byte_time, running_for
 
 # pip install tox
 # pip install pyserial
 
+# Sinks stream_data and stream_file can write. 'npy' writes compact binary
+# files that columnar.to_csv converts to the usual CSVs.
+OUTPUT_FORMATS = {
+    'csv' : pipeline.CsvSink,
+    'npy' : columnar.NpySink,
+}
+
 def check_arguments():
 
     if len(sys.argv) != 4:
-        print("Usage: python parser.py <output-folder-name> <port-number> <recording-time-seconds>")
+        print("Usage: python parser.py <output-folder-name> <port-number|auto> <recording-time-seconds>")
         sys.exit(-1)
 
     return (sys.argv[-3], sys.argv[-2], sys.argv[-1])
@@ -44,57 +62,148 @@ def check_filename(filename):
     return filename + '/'
 
 def check_port_number(port_number):
+    """
+    Resolve a port argument with discovery: 'auto' for the MCU board by
+    USB ID, a device path, or part of a serial port's name.
+    """
 
-    if sys.platform.startswith('win'):
-        ports = ['COM' + str(i) for i in range(1, 257)]
-    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-        ports = glob.glob('/dev/tty[A-Za-z]*')
-    elif sys.platform.startswith('darwin'):
-        ports = glob.glob('/dev/tty.*')
-    else:
-        raise EnvironmentError('Unsupported platform')
+    scan = discovery.Discovery().scan()
+    port = scan.resolve(port_number)
 
-    for port in ports:
-        if port_number in port:
-            return port
+    if port is not None:
+        return port
 
     print('Provided port number doesn\'t exist. Available ports include:')
-    if sys.platform.startswith('win'):
-        for port in serial.tools.list_ports.comports():
-            print('\t' + str(port))
-    else:
-        for port in ports:
-            print('\t' + port)
-            
+    for port in scan.ports:
+        print('\t' + str(port) + ('  (MCU board)' if port.device == scan.mcu_port else ''))
+
     exit(-1)
-    
+
     return
 
-def collect_data(port, recording_time):
+def collect_data(port, recording_time, report_interval=instrument.REPORT_INTERVAL, stats=None):
+    """
+    Return the records collected from the port. A stats line is printed
+    every report_interval seconds (None for only the final one). Given
+    stats, a runstats.SampleStats, every sample is added to it as its
+    record is framed, so the min, max, mean and variance of each channel
+    are ready the moment collection ends; without, nothing is decoded here.
+    """
 
     s = open_port(port)
 
     recording_time = int(recording_time)
-    start_time = time.time()
+    instruments = instrument.Instruments(report_interval)
+
     data = []
-    buffer = ""
 
     print("Beginning data collection...")
-    while time.time() - start_time < recording_time:
-        byte = s.read(1)     #read one byte of data.
-        
-        if byte == b'\r':
-            data.append(buffer)
-            buffer = ""
-        else:
-            buffer += byte.decode()
+    chunks = instruments.watch_chunks(pipeline.port_chunks(s, running_for(recording_time)))
+    framed = pipeline.frame(chunks, instruments=instruments)
+
+    if stats is None:
+        data.extend(framed)
+    else:
+        for record in framed:
+            data.append(record)
+
+            try:
+                decoded = records.decode(record)
+            except (ValueError, IndexError):
+                continue    # Skipped, as parse_data skips it.
+
+            if decoded is not None:
+                stats.write(*decoded)
+
+        stats.close()
 
     print("Data collection completed - collected " + str(len(data)) + " points of data.")
+    print("Stats: " + instruments.line())
+    if stats is not None:
+        print("Samples: " + stats.line())
 
     s.close()
 
     return data
 
+def capture_data(path, port, recording_time, output_format='csv', rotate_bytes=capture.ROTATE_BYTES,
+                 put_timeout=None, fsync_interval=capture.FSYNC_INTERVAL, compression=None,
+                 report_interval=instrument.REPORT_INTERVAL, stats=None):
+    """
+    Collect from the port into the outputs at path, teeing the raw bytes to
+    rotating capture files under path from a background writer thread as
+    they arrive, so nothing is held in memory and a crash keeps the
+    capture. Returns (accel_count, pot_count). put_timeout and
+    fsync_interval are as for capture.CaptureWriter; compression is any of
+    compressed.available(). Stats are printed, and kept when stats is given,
+    as for collect_data.
+    """
+
+    s = open_port(port)
+
+    recording_time = int(recording_time)
+    instruments = instrument.Instruments(report_interval)
+
+    writer = capture.CaptureWriter(capture.RotatingCapture(path, rotate_bytes, compression=compression),
+                                   put_timeout=put_timeout, fsync_interval=fsync_interval)
+
+    print("Beginning data collection...")
+    try:
+        chunks = capture.tee(pipeline.port_chunks(s, running_for(recording_time)), writer)
+        (accel_count, pot_count) = pipeline.run(path, chunks, sink_class=OUTPUT_FORMATS[output_format],
+                                                instruments=instruments, stats=stats)
+    finally:
+        s.close()
+        writer.close()
+
+    print("Data collection completed - wrote " + str(accel_count) + " accelerometer and " + str(pot_count) + " potentiometer samples.")
+    print("Raw capture: " + writer.summary() + ".")
+    print("Stats: " + instruments.line())
+    if stats is not None:
+        print("Samples: " + stats.line())
+
+    return (accel_count, pot_count)
+
+def stream_data(path, port, recording_time, output_format='csv', report_interval=instrument.REPORT_INTERVAL,
+                stats=None):
+    """
+    Collect from the port straight into the outputs at path, without
+    keeping the recording in memory. A .times log of when the bytes arrived
+    and each sample's offset are written alongside, for align.align_outputs. A stats line is printed
+    every report_interval seconds, and each sample is added to stats, if
+    given, as for collect_data.
+    """
+
+    s = open_port(port)
+    instruments = instrument.Instruments(report_interval)
+
+    print("Beginning data collection...")
+    (accel_count, pot_count) = align.run_timed(path, pipeline.port_timed_chunks(s, running_for(int(recording_time))),
+                                               byte_time(s.baudrate), sink_class=OUTPUT_FORMATS[output_format],
+                                               instruments=instruments, stats=stats)
+
+    print("Data collection completed - wrote " + str(accel_count) + " accelerometer and " + str(pot_count) + " potentiometer samples.")
+    print("Stats: " + instruments.line())
+    if stats is not None:
+        print("Samples: " + stats.line())
+
+    s.close()
+
+    return (accel_count, pot_count)
+
+def stream_file(path, filename, output_format='csv'):
+    """
+    Parse a raw capture file straight into the outputs at path.
+    """
+
+    try:
+        return pipeline.run(path, pipeline.file_chunks(filename), flush=True,
+                            sink_class=OUTPUT_FORMATS[output_format])
+    except IOError:
+        print("Provide a text file with a raw serial data stream.")
+        print("Usage: python parser.py <filename> [optional-port-number]")
+        exit(-1)
+
 def open_port(port_name):
 
     try:
@@ -104,7 +213,7 @@ def open_port(port_name):
             parity = serial.PARITY_NONE,
             stopbits = serial.STOPBITS_ONE,
             bytesize = serial.EIGHTBITS,
-            timeout = 0)
+            timeout = READ_TIMEOUT)
     except:
         print("Error: Could not open port '" + port_name + "'.")
         exit(-1)
@@ -115,146 +224,126 @@ def open_port(port_name):
     return s
 
 def open_file(filename):
+    """
+    Return an iterator over the records of a raw capture file. The file is
+    memory-mapped and each record is copied out as bytes when it's consumed.
+    Compressed captures are decompressed as a stream instead.
+    """
 
-    lines = list()
     try:
-        with open(filename, "r") as file:
-            lines = file.readlines()
-            if len(lines) == 1:
-                lines = lines[0].split('\r')
+        if compressed.format_of(filename) is not None:
+            return pipeline.frame(pipeline.file_chunks(filename), flush=True)
 
+        data = rawfile.open_capture(filename)
     except IOError:
         print("Provide a text file with a raw serial data stream.")
         print("Usage: python parser.py <filename> [optional-port-number]")
         exit(-1)
 
-    return lines
+    return (bytes(record) for record in rawfile.iter_records(data))
 
 def parse_data(filename, lines):
 
-    p_raw = []
-    a_raw = []
-    pot_data = [['Sample Number', 'Potentiometer Data']]
-    accel_data = [['Sample Number', 'X Data', 'Y Data', 'Z Data']]
-    
-    i = 0
-    j = 0
+    store = samples.SampleStore()
 
     for line in lines:
-        split = line.split(',')
-        
-        if split[0] == '~HSAC':
-            x = int('0x' + split[1], 16)
-            y = int('0x' + split[2], 16)
-            z = int('0x' + split[3], 16)
-
-            a_raw.append((i, x, y, z))
-            
-            accel_data.append(
-                {"Sample Number" : i, "X Data" : x, "Y Data" : y, "Z Data" : z}
-            )
-            i += 1
-        
-        if split[0] == '~HSRD':
-            d = int("0x" + split[1], 16)
-            
-            p_raw.append((j, d))
-            
-            pot_data.append(
-                {"Sample Number" : j, "Potentiometer Data" : d}
-            )
-            j += 1
-
-    if len(accel_data) > len(pot_data):
-        a_raw = a_raw[:-1]
-        accel_data = accel_data[:-1]
-    elif len(pot_data) > len(accel_data):
-        p_raw = p_raw[:-1]
-        pot_data = pot_data[:-1]
-
-    write_to_output(filename + "accel", accel_data)
-    write_to_output(filename + "pot", pot_data)
-
-    return (a_raw, p_raw)
-
-def write_to_output(name, data):
+        if isinstance(line, str):
+            line = line.encode()
+
+        try:
+            decoded = records.decode(line)
+        except (ValueError, IndexError):
+            continue    # Line noise; skipped as pipeline.decode does.
+
+        if decoded is None:
+            continue
+
+        (tag, values) = decoded
+
+        if tag == records.ACCEL_TAG:
+            store.add_accel(*values)
+
+        if tag == records.POT_TAG:
+            store.add_pot(*values)
+
+    store.trim()
+
+    write_to_output(filename + "accel", pipeline.ACCEL_FIELDS, store.accel_rows())
+    write_to_output(filename + "pot", pipeline.POT_FIELDS, store.pot_rows())
+
+    return store
+
+def write_to_output(name, field_names, rows):
 
     with open(name + '.csv', 'w') as csvfile:
-        field_names = data.pop(0)
-        writer = csv.DictWriter(csvfile, fieldnames=field_names)
+        writer = csv.writer(csvfile)
 
-        writer.writeheader()
-        for data in data:
-            writer.writerow(data)
+        writer.writerow(field_names)
+        writer.writerows(rows)
 
     return
 
-def plot_potentiometer(filename, sample_num, data):
+def plot_potentiometer(filename, sample_num, data, decimate_above=plotting.DECIMATE_ABOVE, bounds=None):
     """
-    Normalize the data to comparse to the accelerometer data.
+    Normalize the data to comparse to the accelerometer data. bounds is the
+    (min, max) of data if it's already known, as from runstats.
     """
 
-    min_data = min(data)
-    max_data = max(data)
-
-    try:
-        normalized = [float(x - min_data)/float(max_data - min_data) for x in data]
-    except ZeroDivisionError:
-        normalized = [float(x - min_data)/0.00001 for x in data]
-
-    plt.plot(sample_num, normalized)
-    plt.ylabel('Normalized Potentiometer Value')
-    plt.xlabel('Sample Number')
-    plt.title('Potentiometer Value with Respect to Time')
-
-    plt.tight_layout()
-    plt.savefig(filename + 'pot.png')
+    normalized = analysis.normalize(data, bounds)
 
-    plt.clf()
+    plotting.render(filename, 'pot', plotting.lines(sample_num, (normalized,), decimate_above))
 
     return normalized
 
-def plot_accelerometer(filename, sample_num, data):
+def plot_accelerometer(filename, sample_num, data, decimate_above=plotting.DECIMATE_ABOVE, bounds=None):
     """
-    Normalize the vector data and plot the x, y, and z components.
+    Normalize the vector data and plot the x, y, and z components. bounds is
+    the (min, max) magnitude if it's already known, as from runstats.
     """
 
-    magnitude = [math.sqrt((i[0] ** 2) + (i[1] ** 2) + (i[2] ** 2)) for i in data]
+    normalized = analysis.normalize(analysis.magnitude(data), bounds)
 
-    min_data = min(magnitude)
-    max_data = max(magnitude)
+    plotting.render(filename, 'accel', plotting.lines(sample_num, (normalized,), decimate_above))
 
-    try:
-        normalized = [float(x - min_data)/float(max_data - min_data) for x in magnitude]
-    except ZeroDivisionError:
-        normalized = [float(x - min_data)/0.00001 for x in magnitude]
+    return normalized
 
-    plt.plot(sample_num, normalized)
-    plt.ylabel('Normalized Accelerometer Data')
-    plt.xlabel('Sample Number')
-    plt.title('Accelerometer Data with Respect to Sample Number')
+def plot_both(filename, sample_num, pot_norm, accel_norm, decimate_above=plotting.DECIMATE_ABOVE):
 
-    plt.tight_layout()
-    plt.savefig(filename + 'accel.png')
+    plotting.render(filename, 'both', plotting.lines(sample_num, (pot_norm, accel_norm), decimate_above))
 
-    plt.clf()
+    return
 
-    return normalized
+def plot_all(path, sample_num, accel, pot, workers=None, decimate_above=plotting.DECIMATE_ABOVE,
+             pot_bounds=None, accel_bounds=None):
+    """
+    Write the same three plots as plot_potentiometer, plot_accelerometer and
+    plot_both, rendering them at once in worker processes. Returns the
+    normalized (pot, accel magnitude) series.
+    """
 
-def plot_both(filename, sample_num, pot_norm, accel_norm):
+    (jobs, pot_norm, accel_norm) = plotting.session_jobs(path, sample_num, accel, pot, decimate_above,
+                                                         pot_bounds, accel_bounds)
+    plotting.render_jobs(jobs, workers)
 
-    plt.plot(sample_num, pot_norm, sample_num, accel_norm)
-    plt.ylabel('Normalized Sensor Data')
-    plt.xlabel('Sample Number')
-    plt.title('Combined Sensor Data with Respect to Sample Number')
-    plt.legend(['Potentiometer', 'Accelerometer'], fontsize='x-small')
+    return (pot_norm, accel_norm)
 
-    plt.tight_layout()
-    plt.savefig(filename + 'both.png')
+def plot_window(path, filename, start, end):
+    """
+    Plot the samples received from start to end seconds into a raw capture,
+    decoding only that part of it through its rawindex sidecar index.
+    Returns the number of samples plotted; a window with none, past the end
+    of the capture or inside a pause, plots nothing and returns 0.
+    """
 
-    plt.clf()
+    (sample_num, accel, pot) = rawindex.open_index(filename).read_window(start, end)
 
-    return
+    if len(sample_num) == 0:
+        print("No samples between " + str(start) + " and " + str(end) + " seconds into '" + filename + "'.")
+        return 0
+
+    plot_all(path, sample_num, accel, pot)
+
+    return len(sample_num)
 
 """
 if __name__ == "__main__":
@@ -263,19 +352,16 @@ if __name__ == "__main__":
     
     path = check_filename(filename)
     port = check_port_number(port_number)
-    data = collect_data(port, recording_time)
+    stats = runstats.SampleStats()
+    stream_data(path, port, recording_time, stats=stats)
 
     try:
-        (accel, pot) = parse_data(path, data)
-
-        sample_num = [sample[0] for sample in accel]
-        accel      = [(sample[1], sample[2], sample[3]) for sample in accel]
-        pot        = [sample[1] for sample in pot]
+        align.align_outputs(path)
 
-        pot_norm   = plot_potentiometer(path, sample_num, pot)
-        accel_norm = plot_accelerometer(path, sample_num, accel)
+        (sample_num, accel, pot) = pipeline.load_output(path)
 
-        plot_both(path, sample_num, pot_norm, accel_norm)
+        plot_all(path, sample_num, accel, pot, pot_bounds=stats['pot'].bounds(),
+                 accel_bounds=stats['magnitude'].bounds())
     except Error as e:
         print("Something went wrong!")
         print(e)
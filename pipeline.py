@@ -0,0 +1,240 @@
+"""
+Generator pipeline that turns a serial port or a raw capture file into the
+accel.csv and pot.csv outputs without holding the session in memory:
+
+    source -> frame -> decode -> CsvSink
+"""
+
+import csv
+import time
+
+import samples
+import compressed
+from framing import RecordFramer, OffsetFramer, read_chunk
+from records import ACCEL_TAG, POT_TAG, VERSION_TAG, decode as decode_record
+
+CHUNK_SIZE = 1 << 16
+
+ACCEL_FIELDS = ['Sample Number', 'X Data', 'Y Data', 'Z Data']
+POT_FIELDS = ['Sample Number', 'Potentiometer Data']
+
+def port_chunks(s, running):
+    """
+    Yield chunks of bytes read from an open serial port while running() is True.
+    """
+
+    while running():
+        yield read_chunk(s)
+
+def port_timed_chunks(s, running):
+    """
+    Like port_chunks, but yields (timestamp, chunk) with the host time each
+    chunk was read, on the time.monotonic() clock .times logs use.
+    """
+
+    while running():
+        chunk = read_chunk(s)
+        yield (time.monotonic(), chunk)
+
+def file_chunks(filename, chunk_size=CHUNK_SIZE):
+    """
+    Return an iterator over chunks of bytes from a raw capture file,
+    decompressing compressed ones as they're read. The file is opened
+    straight away, so a missing one raises IOError here. Line feeds are
+    turned into carriage returns so files saved with '\\n' or '\\r\\n'
+    endings frame the same way as the serial stream does.
+    """
+
+    return read_chunks(compressed.open_read(filename), chunk_size)
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks from an open file as file_chunks does, closing it at the end.
+    """
+
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+
+            yield chunk.replace(b'\n', b'\r')
+
+def frame(chunks, flush=False, instruments=None):
+    """
+    Yield '\\r' terminated records from a stream of byte chunks. With flush set,
+    an unterminated record at the end of the stream is yielded as well.
+    """
+
+    framer = RecordFramer()
+
+    for chunk in chunks:
+        records = framer.feed(chunk) if instruments is None else instruments.feed(framer, chunk)
+        for record in records:
+            yield record
+
+    if flush:
+        remainder = framer.flush()
+        if remainder:
+            yield remainder
+
+def frame_offsets(chunks, instruments=None):
+    """
+    Yield (end offset, record) from a stream of byte chunks, the offset
+    being where in the stream the record's terminator ends.
+    """
+
+    framer = OffsetFramer()
+
+    for chunk in chunks:
+        if instruments is None:
+            items = framer.feed_offsets(chunk)
+        else:
+            items = instruments.feed_offsets(framer, chunk)
+
+        for item in items:
+            yield item
+
+def decode(records, instruments=None):
+    """
+    Yield (tag, values) for every '~HSAC' and '~HSRD' record. Other records
+    are skipped, and so are malformed ones, as line noise garbles a record
+    now and then and shouldn't end the session.
+    """
+
+    if instruments is not None:
+        for decoded in instruments.decode(records):
+            yield decoded
+        return
+
+    for record in records:
+        try:
+            decoded = decode_record(record)
+        except (ValueError, IndexError):
+            continue
+
+        if decoded is not None and decoded[0] != VERSION_TAG:
+            yield decoded
+
+def decode_offsets(offset_records, instruments=None):
+    """
+    Like decode, but for (offset, record) pairs. Yields (offset, tag, values).
+    """
+
+    if instruments is not None:
+        for item in instruments.decode_offsets(offset_records):
+            yield item
+        return
+
+    for (offset, record) in offset_records:
+        try:
+            decoded = decode_record(record)
+        except (ValueError, IndexError):
+            continue
+
+        if decoded is not None and decoded[0] != VERSION_TAG:
+            yield (offset, decoded[0], decoded[1])
+
+class CsvSink(object):
+    """
+    Writes decoded samples to <path>accel.csv and <path>pot.csv as they arrive.
+
+    The last row of each stream is held back until close(), where, as in
+    parse_data, the final sample of the longer stream is dropped when the two
+    streams end up different lengths.
+    """
+
+    def __init__(self, path):
+        self.accel_file = open(path + 'accel.csv', 'w')
+        self.pot_file = open(path + 'pot.csv', 'w')
+
+        self.accel_writer = csv.writer(self.accel_file)
+        self.pot_writer = csv.writer(self.pot_file)
+
+        self.accel_writer.writerow(ACCEL_FIELDS)
+        self.pot_writer.writerow(POT_FIELDS)
+
+        self.accel_count = 0
+        self.pot_count = 0
+        self.accel_pending = None
+        self.pot_pending = None
+
+    def write(self, tag, values):
+
+        if tag == ACCEL_TAG:
+            if self.accel_pending is not None:
+                self.accel_writer.writerow(self.accel_pending)
+            self.accel_pending = (self.accel_count,) + values
+            self.accel_count += 1
+
+        elif tag == POT_TAG:
+            if self.pot_pending is not None:
+                self.pot_writer.writerow(self.pot_pending)
+            self.pot_pending = (self.pot_count,) + values
+            self.pot_count += 1
+
+    def close(self):
+
+        (accel_count, pot_count) = samples.trimmed_counts(self.accel_count, self.pot_count)
+        if accel_count < self.accel_count:
+            self.accel_pending = None
+        if pot_count < self.pot_count:
+            self.pot_pending = None
+        (self.accel_count, self.pot_count) = (accel_count, pot_count)
+
+        if self.accel_pending is not None:
+            self.accel_writer.writerow(self.accel_pending)
+        if self.pot_pending is not None:
+            self.pot_writer.writerow(self.pot_pending)
+
+        self.accel_file.close()
+        self.pot_file.close()
+
+        return (self.accel_count, self.pot_count)
+
+def run(path, chunks, flush=False, sink_class=CsvSink, instruments=None, stats=None):
+    """
+    Drive chunks through the pipeline into a sink_class sink at path. Returns
+    the number of accel and pot rows written. With an instrument.Instruments,
+    every stage is counted and timed; with a runstats.SampleStats, every
+    sample written is added to it.
+    """
+
+    sink = sink_class(path)
+
+    if instruments is not None:
+        chunks = instruments.watch_chunks(chunks)
+
+    try:
+        for tag, values in decode(frame(chunks, flush, instruments), instruments):
+            sink.write(tag, values)
+            if stats is not None:
+                stats.write(tag, values)
+    finally:
+        counts = sink.close()
+        if stats is not None:
+            stats.close()
+
+    return counts
+
+def load_output(path):
+    """
+    Read <path>accel.csv and <path>pot.csv back into the (sample_num, accel, pot)
+    series the plot_* functions take.
+    """
+
+    store = samples.SampleStore()
+
+    with open(path + 'accel.csv', 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for row in reader:
+            store.add_accel(int(row[1]), int(row[2]), int(row[3]))
+
+    with open(path + 'pot.csv', 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for row in reader:
+            store.add_pot(int(row[1]))
+
+    return (store.sample_num(), store.accel_array(), store.pot_array())
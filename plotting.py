@@ -0,0 +1,125 @@
+"""
+Renders the potentiometer, accelerometer and combined plots with
+matplotlib's Figure API on the Agg canvas, so no figure touches pyplot's
+shared state and any number of them can be drawn at once in worker
+processes. matplotlib is only imported by the process that renders, the
+first time it does, so capture-only runs never load it.
+
+Series are normalized and decimated before they're handed to a worker,
+so what crosses the process boundary is a few thousand points per line
+however long the session.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+import analysis
+import decimate
+
+# Series with more samples than this are reduced to a min/max pair per pixel
+# column before plotting. Set to None to always plot every sample.
+DECIMATE_ABOVE = 20000
+
+# pyplot's default figure size and resolution, which the plots always had.
+FIGSIZE = (6.4, 4.8)
+DPI = 100
+
+# kind: (file suffix, y label, title, legend)
+PLOTS = {
+    'pot' : ('pot.png', 'Normalized Potentiometer Value', 'Potentiometer Value with Respect to Time', None),
+    'accel' : ('accel.png', 'Normalized Accelerometer Data', 'Accelerometer Data with Respect to Sample Number', None),
+    'both' : ('both.png', 'Normalized Sensor Data', 'Combined Sensor Data with Respect to Sample Number',
+              ['Potentiometer', 'Accelerometer']),
+}
+
+def lines(sample_num, series, decimate_above=DECIMATE_ABOVE):
+    """
+    Return the (x, y, x, y, ...) arguments plotting each series against
+    sample_num, decimating long series to the pixel width of the figure.
+    """
+
+    buckets = int(FIGSIZE[0] * DPI)
+    arguments = []
+
+    for data in series:
+        if decimate_above is not None and len(data) > decimate_above:
+            arguments.extend(decimate.minmax(sample_num, data, buckets))
+        else:
+            arguments.extend((np.asarray(sample_num), np.asarray(data)))
+
+    return arguments
+
+def render(filename, kind, arguments):
+    """
+    Draw one plot from lines() arguments and save it as filename plus the
+    kind's suffix. Runs in whichever process calls it.
+    """
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    (suffix, ylabel, title, legend) = PLOTS[kind]
+
+    figure = Figure(figsize=FIGSIZE, dpi=DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+
+    axes.plot(*arguments)
+    axes.set_ylabel(ylabel)
+    axes.set_xlabel('Sample Number')
+    axes.set_title(title)
+    if legend:
+        axes.legend(legend, fontsize='x-small')
+
+    figure.tight_layout()
+    figure.savefig(filename + suffix)
+
+    return filename + suffix
+
+def session_jobs(path, sample_num, accel, pot, decimate_above=DECIMATE_ABOVE, pot_bounds=None, accel_bounds=None):
+    """
+    Return the render() arguments for the three plots of a session, and the
+    normalized (pot, accel magnitude) series. bounds are as for
+    analysis.normalize.
+    """
+
+    pot_norm = analysis.normalize(pot, pot_bounds)
+    accel_norm = analysis.normalize(analysis.magnitude(accel), accel_bounds)
+
+    jobs = [
+        (path, 'pot', lines(sample_num, (pot_norm,), decimate_above)),
+        (path, 'accel', lines(sample_num, (accel_norm,), decimate_above)),
+        (path, 'both', lines(sample_num, (pot_norm, accel_norm), decimate_above)),
+    ]
+
+    return (jobs, pot_norm, accel_norm)
+
+def render_jobs(jobs, workers=None):
+    """
+    Render every job, each a render() argument tuple, on a pool of worker
+    processes. Returns the files written, in job order. With one worker, or
+    one job, they're rendered here instead.
+    """
+
+    if workers is None:
+        workers = min(len(jobs), multiprocessing.cpu_count())
+
+    if workers <= 1 or len(jobs) <= 1:
+        return [render(*job) for job in jobs]
+
+    with multiprocessing.Pool(workers) as pool:
+        return pool.starmap(render, jobs)
+
+def plot_sessions(sessions, workers=None, decimate_above=DECIMATE_ABOVE):
+    """
+    Write pot.png, accel.png and both.png for every (path, sample_num,
+    accel, pot) session, rendering all of them concurrently.
+    """
+
+    jobs = []
+
+    for (path, sample_num, accel, pot) in sessions:
+        jobs.extend(session_jobs(path, sample_num, accel, pot, decimate_above)[0])
+
+    return render_jobs(jobs, workers)
@@ -0,0 +1,196 @@
+"""
+Memory-mapped access to raw capture files. Records are found with a regex
+run directly over the mapping and handed out as memoryview slices, so a
+multi-GB capture can be walked without reading it into memory. Ranges of a
+file can start at any byte offset, and are snapped to record boundaries, so
+a file can be split into chunks that decode independently in parallel.
+Compressed captures can't be mapped or split without decompressing them,
+so they're decompressed once, as a stream, and decoded chunk by chunk in
+the calling process instead.
+"""
+
+import os
+import re
+import mmap
+import collections
+import multiprocessing
+
+import numpy as np
+
+import compressed
+import instrument
+import vector_decode
+
+RECORD = re.compile(rb'[^\r\n]+')
+TERMINATORS = b'\r\n'
+
+CHUNK_SIZE = 8 << 20
+
+def open_capture(filename):
+    """
+    Return a read-only mmap of filename. Empty files, which can't be mapped,
+    come back as an empty bytes object. Compressed captures raise
+    ValueError; read them with compressed.open_read.
+    """
+
+    if compressed.format_of(filename) is not None:
+        raise ValueError("Can't map compressed capture " + filename + "; read it as a stream instead.")
+
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def record_start(data, offset):
+    """
+    Return the offset of the first record starting at or after offset.
+    """
+
+    if offset <= 0:
+        return 0
+    if offset >= len(data):
+        return len(data)
+    if data[offset - 1] in TERMINATORS:
+        return offset
+
+    ends = [end for end in (data.find(b'\r', offset), data.find(b'\n', offset)) if end != -1]
+    if not ends:
+        return len(data)
+
+    return min(ends) + 1
+
+def iter_records(data, start=0, end=None):
+    """
+    Yield a memoryview of every record starting in [start, end) of data.
+    Terminators aren't included and empty lines are skipped.
+    """
+
+    if end is None:
+        end = len(data)
+
+    view = memoryview(data)
+
+    for match in RECORD.finditer(data, record_start(data, start), record_start(data, end)):
+        yield view[match.start():match.end()]
+
+def chunk_ranges(data, chunk_size=CHUNK_SIZE):
+    """
+    Return (start, end) ranges of about chunk_size bytes covering data, each
+    starting and ending on a record boundary.
+    """
+
+    bounds = [record_start(data, offset) for offset in range(0, len(data), chunk_size)]
+    bounds.append(len(data))
+
+    return [(start, end) for (start, end) in zip(bounds, bounds[1:]) if end > start]
+
+def decode_range(data, start, end, instruments=None):
+    """
+    Decode the records in [start, end) of data with vector_decode, without
+    trimming the streams. Sample numbers start at 0 for the range.
+    Malformed records are skipped, and counted in instruments if given.
+    """
+
+    buffer = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+
+    return vector_decode.decode_buffer(buffer, trim_streams=False, instruments=instruments)
+
+def decode_file_range(args):
+    """
+    decode_range in a worker process. Returns (accel, pot, malformed).
+    """
+
+    (filename, start, end) = args
+    instruments = instrument.Instruments()
+    (accel, pot) = decode_range(open_capture(filename), start, end, instruments)
+
+    return (accel, pot, instruments.malformed)
+
+def pool_chunks(filename, workers, chunk_size):
+    """
+    Yield (accel, pot, malformed) per chunk of an uncompressed capture,
+    decoded on a pool of worker processes that each map the file
+    themselves. No more than two chunks per worker are in flight at once.
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    ranges = collections.deque(chunk_ranges(open_capture(filename), chunk_size))
+    pending = collections.deque()
+
+    with multiprocessing.Pool(workers) as pool:
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                (start, end) = ranges.popleft()
+                pending.append(pool.apply_async(decode_file_range, ((filename, start, end),)))
+
+            yield pending.popleft().get()
+
+def stream_chunks(filename, chunk_size):
+    """
+    Yield (accel, pot, malformed) per chunk of a compressed capture,
+    decompressing it once, as a stream, and decoding each chunk up to its
+    last record boundary here. Only a chunk and a partial record are held
+    at a time.
+    """
+
+    with compressed.open_read(filename) as file:
+        remainder = b''
+
+        while True:
+            block = file.read(chunk_size)
+            data = remainder + block
+            end = len(data) if not block else max(data.rfind(b'\r'), data.rfind(b'\n')) + 1
+
+            if end:
+                instruments = instrument.Instruments()
+                (accel, pot) = decode_range(data, 0, end, instruments)
+                yield (accel, pot, instruments.malformed)
+
+            remainder = data[end:]
+            if not block:
+                break
+
+def decode_chunks(filename, workers=None, chunk_size=CHUNK_SIZE, instruments=None):
+    """
+    Decode filename in chunks, on a pool of worker processes unless it's
+    compressed. Yields (accel, pot) arrays per chunk, in file order and
+    numbered continuously across chunks. Malformed records are skipped,
+    and counted in instruments if given.
+    """
+
+    if compressed.format_of(filename) is not None:
+        chunks = stream_chunks(filename, chunk_size)
+    else:
+        chunks = pool_chunks(filename, workers, chunk_size)
+
+    accel_offset = 0
+    pot_offset = 0
+
+    for (accel, pot, malformed) in chunks:
+        if instruments is not None:
+            instruments.malformed += malformed
+
+        accel['sample'] += accel_offset
+        pot['sample'] += pot_offset
+        accel_offset += len(accel)
+        pot_offset += len(pot)
+
+        yield (accel, pot)
+
+def decode_file(filename, workers=None, chunk_size=CHUNK_SIZE, instruments=None):
+    """
+    Decode a whole capture in parallel. Returns the same (accel, pot) arrays
+    as vector_decode.decode_file.
+    """
+
+    accel = [np.zeros(0, dtype=vector_decode.ACCEL_DTYPE)]
+    pot = [np.zeros(0, dtype=vector_decode.POT_DTYPE)]
+
+    for (accel_chunk, pot_chunk) in decode_chunks(filename, workers, chunk_size, instruments):
+        accel.append(accel_chunk)
+        pot.append(pot_chunk)
+
+    return vector_decode.trim(np.concatenate(accel), np.concatenate(pot))
@@ -0,0 +1,356 @@
+"""
+Sidecar index for random access into long raw captures. For each of the
+'~HSAC' and '~HSRD' streams, <capture>.idx.npz holds the byte offset of
+every STRIDE-th sample, so a sample number is found with a lookup in a
+small array and a scan of at most STRIDE records, however big the file.
+Host timestamps come from the <capture>.times log capture.RotatingCapture
+writes alongside each uncompressed capture file: (time, offset) pairs
+saying every byte before offset had arrived by time, on the host's
+monotonic clock, so a wall clock step can't open a false gap or fold
+samples onto one time. Each time the log is opened it also gets an
+anchor entry, marked by ANCHOR_OFFSET, holding the wall clock minus the
+monotonic clock at that moment, for turning log times into dates.
+
+The index is built the first time a capture is opened and saved next to
+it. When the capture has grown since, only the new records are scanned.
+Compressed captures can't be read at an offset, so they aren't indexed.
+"""
+
+import os
+import zlib
+
+import numpy as np
+
+import rawfile
+import compressed
+import vector_decode
+from framing import byte_time
+from vector_decode import ACCEL_TAG, POT_TAG
+
+INDEX_SUFFIX = '.idx.npz'
+TIMES_SUFFIX = '.times'
+
+# One (host time, byte offset) entry in a .times log.
+TIMES_DTYPE = np.dtype([('time', '<f8'), ('offset', '<u8')])
+
+# The offset of a .times log's wall clock anchor entries.
+ANCHOR_OFFSET = np.iinfo(np.uint64).max
+
+# Samples of a stream between indexed offsets.
+STRIDE = 1024
+
+# Bytes checked to tell an appended capture from a replaced one.
+HEAD_BYTES = 4096
+
+# Line rate assumed for captures without a .times log.
+BAUDRATE = 115200
+
+TAGS = [ACCEL_TAG, POT_TAG]
+
+def is_sidecar(filename):
+    """
+    True for the index and .times files kept next to a capture.
+    """
+
+    return filename.endswith(INDEX_SUFFIX) or filename.endswith(TIMES_SUFFIX)
+
+def tag_starts(data, start, end):
+    """
+    Return the absolute offsets of the '~HSAC' and '~HSRD' records starting
+    in [start, end) of data, which must both be record boundaries. Records
+    are found by vector_decode.decode_records, malformed ones dropped, so
+    the nth offset is the record decode_buffer numbers n.
+    """
+
+    if end <= start:
+        return dict((tag, np.zeros(0, dtype=np.int64)) for tag in TAGS)
+
+    buffer = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+    (decoded, malformed) = vector_decode.decode_records(buffer)
+
+    return dict((tag, decoded[tag][0] + start) for tag in TAGS)
+
+def complete_end(data, start):
+    """
+    The end of the last terminated record in data at or after start, so a
+    record still being written is left for the next update.
+    """
+
+    end = max(data.rfind(b'\r', start), data.rfind(b'\n', start)) + 1
+
+    return end if end > start else start
+
+def read_times(filename):
+    """
+    Read the .times log of a capture. Returns the (time, offset) entries,
+    or None if it has none, and the wall clock anchor, which added to a log
+    time gives the wall clock time (None if the log hasn't one). A partly
+    written last entry is ignored.
+    """
+
+    try:
+        with open(filename + TIMES_SUFFIX, 'rb') as file:
+            raw = file.read()
+    except (IOError, OSError):
+        return (None, None)
+
+    entries = np.frombuffer(raw, dtype=TIMES_DTYPE, count=len(raw) // TIMES_DTYPE.itemsize)
+    anchors = entries['offset'] == ANCHOR_OFFSET
+    anchor = float(entries['time'][anchors][0]) if anchors.any() else None
+
+    times = entries[~anchors].copy()
+    if len(times) == 0:
+        return (None, anchor)
+
+    # Appending to a capture after a reboot restarts the monotonic clock;
+    # keep the log ordered for searching.
+    times['time'] = np.maximum.accumulate(times['time'])
+    times['offset'] = np.maximum.accumulate(times['offset'])
+
+    return (times, anchor)
+
+def load_times(filename):
+    """
+    The (time, offset) entries of a capture's .times log, as read_times
+    reads them, or None if it has none.
+    """
+
+    return read_times(filename)[0]
+
+def time_of(times, offsets):
+    """
+    The host time each byte offset had arrived by, from a load_times log.
+    Arrival is interpolated linearly between log entries, the same rule
+    CaptureIndex.offset_at inverts, so times and offsets from one log
+    always agree. An offset logged more than once, as at the start of a
+    pause, gets its earliest time.
+    """
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    logged = times['offset'].astype(np.int64)
+    clock = times['time']
+
+    if len(logged) == 1:
+        return np.full(len(offsets), clock[0])
+
+    after = np.clip(np.searchsorted(logged, offsets, side='left'), 1, len(logged) - 1)
+    span = logged[after] - logged[after - 1]
+    fraction = np.clip((offsets - logged[after - 1]) / np.maximum(span, 1), 0.0, 1.0)
+
+    return clock[after - 1] + fraction * (clock[after] - clock[after - 1])
+
+class CaptureIndex(object):
+    """
+    The index of one uncompressed capture file. Use open_index rather than
+    building one directly.
+    """
+
+    def __init__(self, filename, stride=STRIDE):
+        if compressed.format_of(filename) is not None:
+            raise ValueError("Compressed captures can't be indexed: " + filename)
+
+        self.filename = filename
+        self.stride = stride
+        self.data = b''
+        self.times = None
+        self.anchor = None
+        self.reset()
+
+    def reset(self):
+
+        self.indexed = 0
+        self.head = 0
+        self.counts = dict((tag, 0) for tag in TAGS)
+        self.offsets = dict((tag, np.zeros(0, dtype=np.uint64)) for tag in TAGS)
+
+    def load(self):
+        """
+        Read the saved index, if there is one for the same stride. Returns
+        whether it was found.
+        """
+
+        try:
+            with np.load(self.filename + INDEX_SUFFIX) as saved:
+                (indexed, head, accel_count, pot_count, stride) = saved['state'].tolist()
+                accel = saved['accel']
+                pot = saved['pot']
+        except (IOError, OSError, KeyError, ValueError):
+            return False
+
+        if stride != self.stride:
+            return False
+
+        self.indexed = indexed
+        self.head = head
+        self.counts = {ACCEL_TAG : accel_count, POT_TAG : pot_count}
+        self.offsets = {ACCEL_TAG : accel, POT_TAG : pot}
+
+        return True
+
+    def save(self):
+
+        temporary = self.filename + '.idx.tmp.npz'
+        state = np.array([self.indexed, self.head, self.counts[ACCEL_TAG], self.counts[POT_TAG], self.stride],
+                         dtype=np.int64)
+
+        np.savez(temporary, state=state, accel=self.offsets[ACCEL_TAG], pot=self.offsets[POT_TAG])
+        os.replace(temporary, self.filename + INDEX_SUFFIX)
+
+    def head_crc(self, data, size):
+
+        return zlib.crc32(data[:min(size, HEAD_BYTES)])
+
+    def refresh(self):
+        """
+        Remap the capture and index any records appended since the last
+        refresh. If the file has shrunk or its start has changed, it's
+        indexed again from scratch. Returns the number of bytes scanned.
+        """
+
+        self.data = rawfile.open_capture(self.filename)
+        (self.times, self.anchor) = read_times(self.filename)
+        data = self.data
+
+        if len(data) < self.indexed or self.head_crc(data, self.indexed) != self.head:
+            self.reset()
+
+        start = self.indexed
+        end = complete_end(data, start)
+
+        if end == start:
+            return 0
+
+        range_start = start
+        while range_start < end:
+            range_end = min(end, rawfile.record_start(data, range_start + rawfile.CHUNK_SIZE))
+            starts = tag_starts(data, range_start, range_end)
+            range_start = range_end
+
+            for tag in TAGS:
+                count = self.counts[tag]
+                first = -count % self.stride
+                self.offsets[tag] = np.concatenate((self.offsets[tag], starts[tag][first::self.stride].astype(np.uint64)))
+                self.counts[tag] = count + len(starts[tag])
+
+        self.indexed = end
+        self.head = self.head_crc(data, end)
+
+        return end - start
+
+    def locate(self, tag, sample):
+        """
+        Return the byte offset of sample number sample of the tag stream, or
+        the end of the indexed records if there aren't that many.
+        """
+
+        if sample >= self.counts[tag]:
+            return self.indexed
+        if sample <= 0:
+            sample = 0
+
+        (checkpoint, skip) = divmod(sample, self.stride)
+        offsets = self.offsets[tag]
+        start = int(offsets[checkpoint])
+        end = int(offsets[checkpoint + 1]) if checkpoint + 1 < len(offsets) else self.indexed
+
+        return int(tag_starts(self.data, start, end)[tag][skip])
+
+    def sample_at(self, tag, offset):
+        """
+        Return the number of tag records starting before offset, which must
+        be a record boundary: the number of the first sample at or after it.
+        """
+
+        if offset >= self.indexed:
+            return self.counts[tag]
+
+        offsets = self.offsets[tag]
+        checkpoint = int(np.searchsorted(offsets, offset, side='right')) - 1
+        if checkpoint < 0:
+            return 0
+
+        start = int(offsets[checkpoint])
+
+        return checkpoint * self.stride + len(tag_starts(self.data, start, offset)[tag])
+
+    def start_time(self):
+        """
+        The wall clock time the capture started, or None without a .times
+        log or its anchor.
+        """
+
+        if self.times is None or self.anchor is None:
+            return None
+
+        return float(self.times['time'][0]) + self.anchor
+
+    def offset_at(self, timestamp):
+        """
+        Return the record boundary nearest to where the capture was at
+        timestamp, on the .times log's monotonic clock. Byte arrival is
+        interpolated between log entries.
+        """
+
+        if self.times is None:
+            raise ValueError("No host timestamps for " + self.filename)
+
+        offset = int(np.interp(timestamp, self.times['time'], self.times['offset']))
+
+        return rawfile.record_start(self.data, min(offset, self.indexed))
+
+    def offset_after(self, seconds, baudrate=BAUDRATE):
+        """
+        Like offset_at, for seconds since the start of the capture. Without
+        a .times log, the bytes are assumed to have arrived at baudrate.
+        """
+
+        if self.times is not None:
+            return self.offset_at(float(self.times['time'][0]) + seconds)
+
+        offset = int(max(seconds, 0) / byte_time(baudrate))
+
+        return rawfile.record_start(self.data, min(offset, self.indexed))
+
+    def read_samples(self, first, last):
+        """
+        Decode samples first to last (exclusive) of both streams, reading
+        only their part of the file. Returns (sample_num, accel, pot) as the
+        plot_* functions take them, cut to the shorter stream.
+        """
+
+        ranges = [(self.locate(tag, first), self.locate(tag, last)) for tag in TAGS]
+        (accel, unused) = rawfile.decode_range(self.data, *ranges[0])
+        (unused, pot) = rawfile.decode_range(self.data, *ranges[1])
+
+        count = min(len(accel), len(pot))
+        sample_num = np.arange(max(first, 0), max(first, 0) + count)
+        accel = accel[:count]
+        accel['sample'] = sample_num
+
+        return (sample_num, accel, pot['value'][:count])
+
+    def read_window(self, start, end, baudrate=BAUDRATE):
+        """
+        Like read_samples, for the samples of both streams received between
+        start and end seconds into the capture.
+        """
+
+        offsets = (self.offset_after(start, baudrate), self.offset_after(end, baudrate))
+        first = max(self.sample_at(tag, offsets[0]) for tag in TAGS)
+        last = min(self.sample_at(tag, offsets[1]) for tag in TAGS)
+
+        return self.read_samples(first, max(first, last))
+
+def open_index(filename, stride=STRIDE):
+    """
+    Return the CaptureIndex of filename, loading the saved index, bringing
+    it up to date with anything appended, and saving it back if it changed.
+    """
+
+    index = CaptureIndex(filename, stride)
+    found = index.load()
+
+    if index.refresh() or not found:
+        index.save()
+
+    return index
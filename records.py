@@ -0,0 +1,78 @@
+"""
+Decoder for single device records, shared by the command line parser and the
+GUI. Records are bytes as they come off the framer. Fields in the width the
+device sends them (four upper-case hex digits) are looked up by slicing the
+record at fixed offsets; lower-case digits in the same layout go to
+int(field, 16) on those slices, and other widths, or records with commas
+beyond the layout's, to split(), so anything parse_data used to accept
+still decodes to what it did.
+
+The lookup table takes about 7 MB and some tens of milliseconds to build,
+so it's built on the first decode rather than at import.
+"""
+
+ACCEL_TAG = b'~HSAC'
+POT_TAG = b'~HSRD'
+VERSION_TAG = b'~HSVI'
+
+COMMA = ord(',')
+
+# Every four digit upper-case hex field mapped to its value, once hex4_table
+# has built it.
+HEX4 = None
+
+ACCEL_PREFIX = ACCEL_TAG + b','
+POT_PREFIX = POT_TAG + b','
+VERSION_PREFIX = VERSION_TAG + b','
+
+def hex4_table():
+
+    global HEX4
+
+    if HEX4 is None:
+        HEX4 = dict((('%04X' % value).encode(), value) for value in range(0x10000))
+
+    return HEX4
+
+def decode(record):
+    """
+    Return (tag, values) for a '~HSAC', '~HSRD' or '~HSVI' record, or None for
+    anything else. Malformed fields raise ValueError, as parse_data always has.
+    """
+
+    tag = record[:6]
+    table = HEX4 if HEX4 is not None else hex4_table()
+
+    if tag == ACCEL_PREFIX:
+        if len(record) == 20 and record[10] == COMMA and record[15] == COMMA:
+            x = table.get(record[6:10])
+            y = table.get(record[11:15])
+            z = table.get(record[16:20])
+
+            if x is not None and y is not None and z is not None:
+                return (ACCEL_TAG, (x, y, z))
+
+            if record.count(b',') == 3:
+                return (ACCEL_TAG, (int(record[6:10], 16), int(record[11:15], 16), int(record[16:20], 16)))
+
+        split = record.split(b',')
+
+        return (ACCEL_TAG, (int(split[1], 16), int(split[2], 16), int(split[3], 16)))
+
+    if tag == POT_PREFIX:
+        if len(record) == 10:
+            d = table.get(record[6:])
+            if d is not None:
+                return (POT_TAG, (d,))
+
+            if COMMA not in record[6:]:
+                return (POT_TAG, (int(record[6:], 16),))
+
+        return (POT_TAG, (int(record.split(b',')[1], 16),))
+
+    if tag == VERSION_PREFIX:
+        split = record.split(b',')
+
+        return (VERSION_TAG, (int(split[1], 16), int(split[2], 16), int(split[3], 16), int(split[4], 16)))
+
+    return None
@@ -0,0 +1,197 @@
+"""
+Replays a recorded capture as if it were the serial port, so the GUI can be
+debugged against field logs. ReplayPort hands out the file's bytes through
+the same read()/in_waiting calls read_chunk makes, paced at the line rate
+of the original baud rate times speed, or as fast as they're asked for.
+LoadStats measures how the GUI keeps up, which makes a max-speed replay a
+load test of the reader thread, record queue and display.
+"""
+
+import time
+import collections
+
+import pipeline
+import compressed
+from framing import READ_TIMEOUT, byte_time
+
+BAUDRATE = 115200
+
+# Speeds offered in the GUI. None replays as fast as the reader can take it.
+SPEEDS = collections.OrderedDict([
+    ('1x', 1.0),
+    ('2x', 2.0),
+    ('10x', 10.0),
+    ('100x', 100.0),
+    ('Max', None),
+])
+
+# Bytes reported waiting at a time when replaying at maximum speed.
+MAX_READ = 1 << 16
+
+# Per-frame latencies kept for the percentiles in the summary.
+LATENCY_HISTORY = 10000
+
+class ReplayPort(object):
+    """
+    A stand-in for an open serial.Serial that reads from a capture file
+    (compressed or not). Writes are kept in .written rather than sent.
+    """
+
+    def __init__(self, filename, speed=1.0, baudrate=BAUDRATE, timeout=READ_TIMEOUT):
+        self.filename = filename
+        self.speed = speed
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.byte_time = byte_time(baudrate)
+
+        self.file = compressed.open_read(filename)
+        self.chunks = pipeline.read_chunks(self.file)
+        self.pending = bytearray()
+        self.released = 0
+        self.start = None
+        self.finished = False
+        self.exhausted = False
+        self.is_open = True
+        self.written = []
+
+    def _fill(self, size):
+
+        while len(self.pending) < size and not self.finished:
+            try:
+                chunk = next(self.chunks, None)
+            except ValueError:
+                chunk = None    # Closed by close() while being read.
+
+            if chunk is None:
+                self.finished = True
+            else:
+                self.pending += chunk
+
+    def _due(self):
+        """
+        Bytes the replay clock says should have arrived but haven't been read.
+        """
+
+        if self.start is None:
+            self.start = time.monotonic()
+
+        if self.speed is None:
+            return MAX_READ
+
+        return int((time.monotonic() - self.start) * self.speed / self.byte_time) - self.released
+
+    @property
+    def in_waiting(self):
+
+        due = self._due()
+        self._fill(due)
+
+        return max(0, min(due, len(self.pending)))
+
+    def read(self, size=1):
+        """
+        Return up to size bytes that are due, waiting up to the timeout for
+        the first one. Returns b'' once the capture is used up.
+        """
+
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            due = self._due()
+            self._fill(min(size, max(due, 1)))
+
+            if not self.pending:
+                self.exhausted = True
+                time.sleep(self.timeout)
+                return b''
+
+            if due > 0:
+                break
+
+            wait = min(deadline - time.monotonic(), (1 - due) * self.byte_time / self.speed)
+            if wait <= 0:
+                return b''
+
+            time.sleep(wait)
+
+        count = min(size, due, len(self.pending))
+        data = bytes(self.pending[:count])
+        del self.pending[:count]
+        self.released += count
+
+        return data
+
+    def done(self):
+        """
+        True once every byte of the capture has been read and the reader has
+        come back for more, so it's finished with the last chunk.
+        """
+
+        return self.exhausted
+
+    def write(self, data):
+
+        self.written.append(data)
+
+        return len(data)
+
+    def close(self):
+
+        self.is_open = False
+        self.file.close()
+
+class LoadStats(object):
+    """
+    Counts what the display took off the record queue. Each frame reports
+    how many records it drained and when the oldest of them was queued;
+    frames arriving more than one interval late count as dropped.
+    """
+
+    def __init__(self, frame_interval, dropped=0):
+        self.frame_interval = frame_interval
+        self.start = time.monotonic()
+        self.last_frame = self.start
+        self.records = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.dropped_at_start = dropped
+        self.dropped_records = 0
+        self.busy_frames = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY)
+        self.end = None
+
+    def frame(self, records, oldest=None, dropped=0):
+
+        now = time.monotonic()
+
+        self.frames += 1
+        self.records += records
+        self.dropped_frames += max(0, int((now - self.last_frame) / self.frame_interval) - 1)
+        self.dropped_records = dropped - self.dropped_at_start
+        self.last_frame = now
+
+        if oldest is not None:
+            latency = now - oldest
+            self.busy_frames += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latencies.append(latency)
+
+    def finish(self):
+
+        self.end = time.monotonic()
+
+    def summary(self):
+
+        elapsed = (self.end or time.monotonic()) - self.start
+        latencies = sorted(self.latencies)
+
+        mean = 1000.0 * self.latency_total / self.busy_frames if self.busy_frames else 0.0
+        p95 = 1000.0 * latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+
+        return ("%d records in %.2f s (%.0f records/s), %d records dropped, %d of %d frames dropped, "
+                "UI latency %.1f ms mean, %.1f ms p95, %.1f ms max" %
+                (self.records, elapsed, self.records / elapsed if elapsed else 0.0, self.dropped_records,
+                 self.dropped_frames, self.frames + self.dropped_frames, mean, p95, 1000.0 * self.latency_max))
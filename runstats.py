@@ -0,0 +1,329 @@
+"""
+Single-pass statistics updated as samples are decoded, so a session's
+min, max, mean and variance are known the moment it ends, without going
+back over the data. RunningStats uses Welford's update for the mean and
+variance, or for a batch of values, the pairwise combination of the
+batch's with the running ones; WindowStats keeps the same figures over the
+last few samples, dropping the oldest as each new one arrives.
+SampleStats keeps both for every channel and is fed by the GUI reader,
+and by pipeline.run, align.run_timed, collect_data and capture_data when
+they're given one; they keep no stats otherwise.
+"""
+
+import math
+import collections
+from array import array
+
+import numpy as np
+
+import analysis
+import samples
+from records import ACCEL_TAG, POT_TAG
+
+# Samples a WindowStats covers unless told otherwise.
+WINDOW = 1000
+
+# Samples SampleStats buffers before folding them into its stats.
+BATCH = 4096
+
+CHANNELS = ['pot', 'x', 'y', 'z', 'magnitude']
+
+class RunningStats(object):
+    """
+    Count, min, max, mean and variance of every value added.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def add_array(self, values):
+        """
+        Add every value in a NumPy array at once, combining its count, mean
+        and sum of squared differences with the running ones (Chan et al.).
+        """
+
+        count = len(values)
+        if count == 0:
+            return
+
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        low = values.min().item()
+        high = values.max().item()
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+    def variance(self, ddof=0):
+
+        if self.count <= ddof:
+            return 0.0
+
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+
+        return math.sqrt(self.variance(ddof))
+
+    def bounds(self):
+        """
+        (min, max), as analysis.normalize takes them.
+        """
+
+        return (self.min, self.max)
+
+    def describe(self):
+
+        if not self.count:
+            return "no samples"
+
+        return "min %s max %s mean %.2f std %.2f" % (self.min, self.max, self.mean, self.std())
+
+class WindowStats(RunningStats):
+    """
+    Like RunningStats, over only the last size values. The mean and
+    variance are updated in place as the oldest value is swapped for the
+    newest; min and max come from monotonic queues, so every add is O(1)
+    amortized.
+    """
+
+    def __init__(self, size=WINDOW):
+        super().__init__()
+
+        self.size = size
+        self.values = collections.deque()
+        self.added = 0
+        self.lows = collections.deque()
+        self.highs = collections.deque()
+
+    def add(self, value):
+
+        self.values.append(value)
+
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            delta = value - old
+            old_mean = self.mean
+            self.mean += delta / self.size
+            self.m2 += delta * (value - self.mean + old - old_mean)
+        else:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+
+        # Entries are (position, value); anything that can no longer be the
+        # min or max of the window is dropped from the back, and anything
+        # that's left the window from the front.
+        position = self.added
+        first = position - len(self.values) + 1
+        self.added += 1
+
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((position, value))
+        while self.lows[0][0] < first:
+            self.lows.popleft()
+
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((position, value))
+        while self.highs[0][0] < first:
+            self.highs.popleft()
+
+        self.min = self.lows[0][1]
+        self.max = self.highs[0][1]
+
+    def add_array(self, values):
+        """
+        Add every value in a NumPy array. Only the last size of them can
+        still be in the window, so a batch at least that long replaces it.
+        """
+
+        if len(values) < self.size:
+            for value in values.tolist():
+                self.add(value)
+            return
+
+        values = values[-self.size:]
+        self.values = collections.deque(values.tolist())
+        self.count = self.size
+        self.mean = float(values.mean())
+        self.m2 = float(((values - self.mean) ** 2).sum())
+
+        self.lows = collections.deque()
+        self.highs = collections.deque()
+        self.added += len(self.values)
+        position = self.added - len(self.values)
+
+        for value in self.values:
+            while self.lows and self.lows[-1][1] >= value:
+                self.lows.pop()
+            self.lows.append((position, value))
+            while self.highs and self.highs[-1][1] <= value:
+                self.highs.pop()
+            self.highs.append((position, value))
+            position += 1
+
+        self.min = self.lows[0][1]
+        self.max = self.highs[0][1]
+
+    def variance(self, ddof=0):
+
+        # The windowed update can leave a tiny negative from rounding.
+        return max(super().variance(ddof), 0.0)
+
+class SampleStats(object):
+    """
+    RunningStats for the potentiometer, the accelerometer x, y and z, and
+    the accelerometer magnitude, plus WindowStats of each when window is
+    given.
+
+    Samples are appended to array buffers, and folded into the stats with
+    NumPy once batch of them have built up, so adding one costs little more
+    than an array append. The stats are read without folding, so they may
+    be up to batch samples behind until close(), which folds the rest. The
+    last sample of each stream stays buffered until close(), where, as in
+    the sinks, the final sample of the longer stream is dropped, so the
+    totals match the written outputs.
+    """
+
+    def __init__(self, window=None, batch=BATCH):
+        self.total = dict((channel, RunningStats()) for channel in CHANNELS)
+        self.window = dict((channel, WindowStats(window)) for channel in CHANNELS) if window else None
+        self.batch = batch
+
+        self.x = array(samples.TYPECODE)
+        self.y = array(samples.TYPECODE)
+        self.z = array(samples.TYPECODE)
+        self.pot = array(samples.TYPECODE)
+
+    def add_accel(self, x, y, z):
+
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+
+        if len(self.x) > self.batch:
+            self.fold_accel(len(self.x) - 1)
+
+    def add_pot(self, d):
+
+        self.pot.append(d)
+
+        if len(self.pot) > self.batch:
+            self.fold_pot(len(self.pot) - 1)
+
+    def write(self, tag, values):
+        """
+        Take a decoded sample, as a pipeline sink does.
+        """
+
+        # add_accel and add_pot inlined; this runs for every record.
+        if tag == ACCEL_TAG:
+            (x, y, z) = values
+            self.x.append(x)
+            self.y.append(y)
+            self.z.append(z)
+
+            if len(self.x) > self.batch:
+                self.fold_accel(len(self.x) - 1)
+
+        elif tag == POT_TAG:
+            self.pot.append(values[0])
+
+            if len(self.pot) > self.batch:
+                self.fold_pot(len(self.pot) - 1)
+
+    def fold(self, channel, values):
+
+        self.total[channel].add_array(values)
+
+        if self.window is not None:
+            self.window[channel].add_array(values)
+
+    def fold_accel(self, count):
+
+        columns = np.column_stack([np.frombuffer(column, dtype=np.intc, count=count) for column in (self.x, self.y, self.z)])
+        del self.x[:count]
+        del self.y[:count]
+        del self.z[:count]
+
+        self.fold('x', columns[:, 0])
+        self.fold('y', columns[:, 1])
+        self.fold('z', columns[:, 2])
+        self.fold('magnitude', analysis.magnitude(columns))
+
+    def fold_pot(self, count):
+
+        values = np.frombuffer(self.pot, dtype=np.intc, count=count).copy()
+        del self.pot[:count]
+
+        self.fold('pot', values)
+
+    def close(self):
+        """
+        Fold in the buffered samples, less the final one of the longer stream.
+        """
+
+        accel_count = self.total['x'].count + len(self.x)
+        pot_count = self.total['pot'].count + len(self.pot)
+        (keep_accel, keep_pot) = samples.trimmed_counts(accel_count, pot_count)
+
+        # The dropped sample is always still buffered; see the class docstring.
+        del self.x[len(self.x) - (accel_count - keep_accel):]
+        del self.y[len(self.y) - (accel_count - keep_accel):]
+        del self.z[len(self.z) - (accel_count - keep_accel):]
+        del self.pot[len(self.pot) - (pot_count - keep_pot):]
+
+        self.fold_accel(len(self.x))
+        self.fold_pot(len(self.pot))
+
+    def __getitem__(self, channel):
+
+        return self.total[channel]
+
+    def parts(self):
+        """
+        One line per channel, with its windowed figures when kept.
+        """
+
+        parts = []
+
+        for channel in CHANNELS:
+            part = channel + " " + self.total[channel].describe()
+            if self.window is not None:
+                part += " | last %d: %s" % (self.window[channel].size, self.window[channel].describe())
+            parts.append(part)
+
+        return parts
+
+    def line(self):
+
+        return " | ".join(channel + " " + self.total[channel].describe() for channel in CHANNELS)
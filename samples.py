@@ -0,0 +1,100 @@
+"""
+Compact, column-oriented storage for decoded samples. Each channel is an
+array of machine integers rather than a list of tuples or dicts, so a
+sample costs a few bytes instead of several Python objects. The sample
+number is implied by position.
+"""
+
+from array import array
+
+import numpy as np
+
+# 32-bit signed; the device sends 16-bit hex fields.
+TYPECODE = 'i'
+
+def trimmed_counts(accel_count, pot_count):
+    """
+    Return the (accel, pot) counts left once the final sample of the longer
+    stream is dropped, as parse_data always has. Every sink, decoder and
+    stats object that trims goes through this, so they all keep the same
+    samples.
+    """
+
+    if accel_count > pot_count:
+        return (accel_count - 1, pot_count)
+    if pot_count > accel_count:
+        return (accel_count, pot_count - 1)
+
+    return (accel_count, pot_count)
+
+class SampleStore(object):
+
+    def __init__(self):
+        self.x = array(TYPECODE)
+        self.y = array(TYPECODE)
+        self.z = array(TYPECODE)
+        self.pot = array(TYPECODE)
+
+    def add_accel(self, x, y, z):
+
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+
+    def add_pot(self, d):
+
+        self.pot.append(d)
+
+    def accel_count(self):
+
+        return len(self.x)
+
+    def pot_count(self):
+
+        return len(self.pot)
+
+    def trim(self):
+        """
+        Drop the final sample of the longer stream, as parse_data always has.
+        """
+
+        (accel_count, pot_count) = trimmed_counts(len(self.x), len(self.pot))
+
+        del self.x[accel_count:]
+        del self.y[accel_count:]
+        del self.z[accel_count:]
+        del self.pot[pot_count:]
+
+    def accel_rows(self):
+        """
+        Iterate (sample number, x, y, z) rows for the CSV writer.
+        """
+
+        return zip(range(len(self.x)), self.x, self.y, self.z)
+
+    def pot_rows(self):
+        """
+        Iterate (sample number, value) rows for the CSV writer.
+        """
+
+        return zip(range(len(self.pot)), self.pot)
+
+    def sample_num(self):
+
+        return np.arange(len(self.x))
+
+    def accel_array(self):
+        """
+        Return the accelerometer data as an (n, 3) array for plotting.
+        """
+
+        return np.column_stack((np.frombuffer(self.x, dtype=np.intc),
+                                np.frombuffer(self.y, dtype=np.intc),
+                                np.frombuffer(self.z, dtype=np.intc)))
+
+    def pot_array(self):
+        """
+        Return the potentiometer data as an array view, without copying.
+        """
+
+        return np.frombuffer(self.pot, dtype=np.intc)
@@ -0,0 +1,110 @@
+"""
+Running and windowed statistics against NumPy over the same samples, both
+fed through pipeline.run and as collect_data keeps them per record.
+"""
+
+import numpy as np
+import pytest
+
+from synthetic import FakeSerial, synthetic_stream
+
+import analysis
+import parser
+import pipeline
+import records
+import runstats
+
+PAIRS = 5000
+WINDOW = 100
+
+def check(stats, values):
+
+    assert stats.count == len(values)
+    assert stats.min == values.min() and stats.max == values.max()
+    assert np.isclose(stats.mean, values.mean(), rtol=1e-12, atol=1e-9)
+    assert np.isclose(stats.variance(), values.var(), rtol=1e-9)
+
+def columns(accel, pot):
+
+    accel = np.asarray(accel)
+    pot = np.asarray(pot)
+
+    return {'pot' : pot, 'x' : accel[:, 0], 'y' : accel[:, 1], 'z' : accel[:, 2],
+            'magnitude' : analysis.magnitude(accel)}
+
+@pytest.fixture
+def payload():
+
+    # One extra accelerometer record, so the trailing-sample trim is exercised.
+    return synthetic_stream(PAIRS) + synthetic_stream(1, seed=1).split(b'\r')[0] + b'\r'
+
+def test_pipeline_stats_match_outputs(tmp_path, payload):
+
+    path = str(tmp_path) + '/'
+    stats = runstats.SampleStats(window=WINDOW, batch=256)
+
+    counts = pipeline.run(path, [payload[i:i + 4096] for i in range(0, len(payload), 4096)], stats=stats)
+    (sample_num, accel, pot) = pipeline.load_output(path)
+    assert counts == (len(accel), len(pot)) == (PAIRS, PAIRS)
+
+    for (channel, values) in columns(accel, pot).items():
+        check(stats[channel], values)
+        check(stats.window[channel], values[-WINDOW:])
+
+    assert np.array_equal(analysis.normalize(pot, stats['pot'].bounds()), analysis.normalize(pot))
+
+def test_window_slides():
+
+    values = np.random.RandomState(0).randint(0, 0x1000, size=5 * WINDOW // 2 + 1)
+    window = runstats.WindowStats(WINDOW)
+
+    for (i, value) in enumerate(values.tolist()):
+        window.add(value)
+        check(window, values[max(0, i + 1 - WINDOW):i + 1])
+
+def test_window_add_array():
+
+    values = np.random.RandomState(1).randint(0, 0x10000, size=3 * WINDOW).astype(np.intc)
+    window = runstats.WindowStats(WINDOW)
+
+    window.add_array(values[:WINDOW // 2])
+    window.add_array(values[WINDOW // 2:])
+    check(window, values[-WINDOW:])
+
+def test_collect_data_updates_stats_per_record(monkeypatch, payload):
+
+    port = FakeSerial(payload, chunk_size=1024)
+    served = []
+
+    class Watched(runstats.SampleStats):
+        def write(self, tag, values):
+            served.append(port.served)
+            super().write(tag, values)
+
+    monkeypatch.setattr(parser, 'open_port', lambda port_name: port)
+    monkeypatch.setattr(parser, 'running_for', lambda recording_time: lambda: not port.done())
+
+    stats = Watched()
+    data = parser.collect_data('fake', 1, report_interval=None, stats=stats)
+
+    # Fed as the records came in, not in a pass over them afterwards.
+    assert served[0] < len(payload) and served[-1] == len(payload)
+
+    decoded = [records.decode(record) for record in data]
+    accel = [values for (tag, values) in decoded if tag == records.ACCEL_TAG][:PAIRS]
+    pot = [values[0] for (tag, values) in decoded if tag == records.POT_TAG]
+    for (channel, values) in columns(accel, pot).items():
+        check(stats[channel], values)
+
+def test_collect_data_without_stats_decodes_nothing(monkeypatch, payload):
+
+    port = FakeSerial(payload)
+
+    def fail(record):
+        raise AssertionError("decoded without stats")
+
+    monkeypatch.setattr(parser, 'open_port', lambda port_name: port)
+    monkeypatch.setattr(parser, 'running_for', lambda recording_time: lambda: not port.done())
+    monkeypatch.setattr(records, 'decode', fail)
+
+    assert len(parser.collect_data('fake', 1, report_interval=None)) == 2 * PAIRS + 1
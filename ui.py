@@ -1,16 +1,43 @@
 from tkinter import *
 from tkinter.ttk import *
+from tkinter import filedialog
 
 import os
 import sys
+import time
+import queue
+import collections
 import threading
 import serial
-import platform
 
-try:
-    import wmi
-except:
-    print("For full functionality, please run on Windows.")
+import replay
+import runstats
+import commands
+import discovery
+import instrument
+from framing import READ_TIMEOUT, RecordFramer, read_chunk
+from liveplot import REDRAW_INTERVAL, StripChart
+from records import ACCEL_TAG, POT_TAG, VERSION_TAG
+
+# Records waiting for the display. The reader drops records past this.
+QUEUE_SIZE = 10000
+
+# Milliseconds between display refreshes.
+FRAME_INTERVAL = 33
+
+# Milliseconds between checks for hotplug events.
+HOTPLUG_INTERVAL = 250
+
+# Milliseconds between stats panel refreshes.
+STATS_INTERVAL = 1000
+
+# Samples the channel stats may lag the display by; see runstats.SampleStats.
+STATS_BATCH = 256
+
+# Lines kept in the raw serial view, and how far past that the view may
+# grow before the oldest lines are trimmed in one go.
+LINE_LIMIT = 5000
+TRIM_SLACK = 500
 
 class GUI(Tk):
     def __init__(self, *args, **kwargs):
@@ -23,73 +50,203 @@ class GUI(Tk):
         self.com_port = ""
         self.s = None
         self.read = False
+        self.commands = None
+
+        self.records = queue.Queue(maxsize=QUEUE_SIZE)
+        self.instruments = instrument.Instruments()
+        self.stats = runstats.SampleStats(window=runstats.WINDOW, batch=STATS_BATCH)
+        self.raw_log = None
+        self.load_stats = None
+        self.discovery = discovery.Discovery()
+        self.hotplug_generation = 0
 
         self.connectionarea = ConnectionArea(self)
         self.data_display = DataDisplay(self)
+        self.live_plot = LivePlot(self)
         self.raw_serial_data = RawSerialData(self)
+        self.stats_panel = StatsPanel(self)
 
         self.connectionarea.pack(side=TOP, anchor=N, fill=X)
         self.data_display.pack(side=TOP, anchor=N, fill=X)
+        self.live_plot.pack(side=TOP, anchor=N, fill=X)
         self.raw_serial_data.pack(side=TOP, anchor=N, fill=BOTH)
+        self.stats_panel.pack(side=TOP, anchor=N, fill=X)
         
         self.protocol('WM_DELETE_WINDOW', self.__destroy__)
 
+        self.after(FRAME_INTERVAL, self.update_display)
+
+        if self.discovery.watch():
+            self.after(HOTPLUG_INTERVAL, self.check_hotplug)
+
     def read_serial(self):
         
         def callback():
-            buffer = ""
+            framer = RecordFramer()
             r_num = 0
             while self.read is True:
                 try:
-                    byte = self.s.read(1)     #read one byte of data.
-                    if byte == b'\r':
+                    chunk = self.instruments.read(read_chunk, self.s)
+                    self.log_chunk(chunk)
+                    for record in self.instruments.feed(framer, chunk):
+                        if self.commands is not None:
+                            self.commands.handle(record)
                         r_num += 1
-                        self.parse_buffer(buffer, r_num)
-                        buffer = ""
-                    else:
-                        buffer += byte.decode()
+                        self.parse_buffer(record, r_num)
                 except ClearCommError as e:
                     print('Tried to read from the serial port when it was already closed.')
 
         t = threading.Thread(target=callback)
         t.start()
 
+    def start_log(self):
+        """
+        Write the raw serial stream to a timestamped file from the reader
+        thread, independent of what the view shows.
+        """
+
+        filename = time.strftime('serial_log_%Y%m%d_%H%M%S.txt')
+        self.raw_log = open(filename, 'wb')
+        print("Logging raw serial data to '" + filename + "'.")
+
+    def stop_log(self):
+        log = self.raw_log
+        self.raw_log = None
+        if log is not None:
+            log.close()
+
+    def log_chunk(self, chunk):
+        log = self.raw_log
+        if log is not None and chunk:
+            try:
+                log.write(chunk)
+            except ValueError:
+                pass    # Closed by stop_log while we were writing.
+
     def parse_buffer(self, buffer, r_num):
-        self.data_display.record_number.delete(0, END)
-        self.data_display.record_number.insert(0, str( int(r_num / 2) ))
+        """
+        Decode a record (bytes) on the reader thread and queue it for the display.
+        Records are dropped, and counted, when the display falls behind.
+        Malformed records are counted and only shown raw. Bytes that aren't UTF-8,
+        as line noise can produce, show up as replacement characters.
+        """
 
-        self.raw_serial_data.serial_data.insert(END, str(buffer) + '\n')
-        self.raw_serial_data.serial_data.see(END)
+        fields = {'record_number' : str( int(r_num / 2) )}
 
-        split = buffer.split(',')
-        
-        if split[0] == '~HSAC':
-            x = int('0x' + split[1], 16)
-            y = int('0x' + split[2], 16)
-            z = int('0x' + split[3], 16)
+        decoded = self.instruments.decode_record(buffer)
+        tag = decoded[0] if decoded is not None else None
+
+        if tag == ACCEL_TAG:
+            (x, y, z) = decoded[1]
+
+            self.live_plot.chart.add_accel(x, y, z)
+            self.stats.add_accel(x, y, z)
+
+            fields['accelerometer_data_x'] = str( x )
+            fields['accelerometer_data_y'] = str( y )
+            fields['accelerometer_data_z'] = str( z )
 
-            self.data_display.accelerometer_data_x.delete(0, END)
-            self.data_display.accelerometer_data_x.insert(0, str( x ))
+        if tag == POT_TAG:
+            (d,) = decoded[1]
 
-            self.data_display.accelerometer_data_y.delete(0, END)
-            self.data_display.accelerometer_data_y.insert(0, str( y ))
+            self.live_plot.chart.add_pot(d)
+            self.stats.add_pot(d)
 
-            self.data_display.accelerometer_data_z.delete(0, END)
-            self.data_display.accelerometer_data_z.insert(0, str( z ))
+            fields['potentiometer_data'] = str( d )
 
-        if split[0] == '~HSRD':
-            d = int("0x" + split[1], 16)
+        if tag == VERSION_TAG:
+            fields['version_number'] = '.'.join(str(number) for number in decoded[1])
 
-            self.data_display.potentiometer_data.delete(0, END)
-            self.data_display.potentiometer_data.insert(0, str( d ))
+        try:
+            self.records.put_nowait((time.monotonic(), buffer.decode(errors='replace'), fields))
+        except queue.Full:
+            self.instruments.dropped += 1
+
+    def update_display(self):
+        """
+        Drain the record queue on the Tk main loop. Each field shows only the
+        latest value and raw lines are appended in one insert per frame.
+        """
+
+        start = time.perf_counter_ns()
+        lines = []
+        fields = {}
+        oldest = None
+
+        try:
+            while True:
+                (queued, buffer, record_fields) = self.records.get_nowait()
+                if oldest is None:
+                    oldest = queued
+                lines.append(buffer)
+                fields.update(record_fields)
+        except queue.Empty:
+            pass
+
+        for name, value in fields.items():
+            self.data_display.show(getattr(self.data_display, name), value)
+
+        if lines:
+            self.raw_serial_data.append(lines)
+
+        self.data_display.show(self.data_display.queue_depth, str( self.records.qsize() ))
+        self.data_display.show(self.data_display.dropped_records, str( self.instruments.dropped ))
+
+        if oldest is not None:
+            self.instruments.latency['queue'].add(int((time.monotonic() - oldest) * 1e9))
+        self.instruments.latency['display'].add(time.perf_counter_ns() - start)
+
+        if self.load_stats is not None:
+            self.load_stats.frame(len(lines), oldest, self.instruments.dropped)
+            self.check_replay()
+
+        self.after(FRAME_INTERVAL, self.update_display)
+
+    def start_replay(self, filename, speed):
+        """
+        Read from a recorded capture instead of the serial port, timing how
+        the display keeps up.
+        """
+
+        self.s = replay.ReplayPort(filename, speed)
+        self.load_stats = replay.LoadStats(FRAME_INTERVAL / 1000.0, self.instruments.dropped)
+        self.read = True
+        self.read_serial()
+
+    def check_replay(self):
+        """
+        Once a replay has been read and displayed in full, report the load
+        statistics.
+        """
+
+        if not isinstance(self.s, replay.ReplayPort) or not self.s.done() or not self.records.empty():
+            return
+
+        self.load_stats.finish()
+        message = "Replay of '" + self.s.filename + "' finished: " + self.load_stats.summary() + "."
+        self.load_stats = None
 
-        if split[0] == '~HSVI':
-            ver = str(int("0x" + split[1], 16)) + "." + str(int("0x" + split[2], 16)) + "." + str(int("0x" + split[3], 16)) + "." + str(int("0x" + split[4], 16))
+        print(message)
+        self.raw_serial_data.append([message])
 
-            self.data_display.version_number.delete(0, END)
-            self.data_display.version_number.insert(0, ver)
+    def check_hotplug(self):
+        """
+        Show the devices again after a hotplug event, unless a port is being
+        read. Discovery has already rescanned on its own thread, so this
+        doesn't enumerate anything.
+        """
+
+        if self.discovery.generation != self.hotplug_generation and not self.read:
+            self.hotplug_generation = self.discovery.generation
+            self.connectionarea.buttons.scan_for_devices()
+
+        self.after(HOTPLUG_INTERVAL, self.check_hotplug)
 
     def __destroy__(self):
+        if self.commands is not None:
+            self.commands.close(wait=False)
+        self.discovery.stop()
+        self.stop_log()
         self.destroy()
 
 class ConnectionArea(Frame):
@@ -149,6 +306,8 @@ class Buttons(Frame):
         self.connect_button = Button(self, text='Connect to MCU', command=self.connect_to_mcu)
         self.disconnect_button = Button(self, text='Disconnect from MCU', command=self.disconnect_from_mcu)
         self.clear_display = Button(self, text='Clear Display', command=self.clear_raw_area)
+        self.replay_button = Button(self, text='Replay File', command=self.replay_file)
+        self.replay_speed = Combobox(self, values=list(replay.SPEEDS), state='readonly', width=6)
         self.send_reboot = Button(self, text='Send Reboot Message', command=self.send_reboot_message)
         self.get_version = Button(self, text='Get Device Version', command=self.send_version_get)
 
@@ -172,45 +331,43 @@ class Buttons(Frame):
         self.get_version.grid(row=2, column=1, columnspan=1, padx=padding, pady=padding, sticky='NESW')
         self.get_version.config(state=DISABLED)
 
+        self.replay_button.grid(row=0, column=2, columnspan=1, padx=padding, pady=padding, sticky='NESW')
+        self.replay_speed.grid(row=1, column=2, columnspan=1, padx=padding, pady=padding, sticky='NESW')
+        self.replay_speed.current(0)
+
         self.pack(side=TOP, anchor=W)
 
     def scan_for_devices(self):
-        hub_descriptors = 'VID_04B4&PID_6572'
-        ov_descriptors = 'VID_05A9&PID_8065'
-        mcu_descriptors = 'VID_0403&PID_6015'
-
-        if (platform.system() is 'Windows'):
-            c = wmi.WMI()
-            wql = "Select * From Win32_USBControllerDevice"
-            devices = [device.Dependent for device in c.query(wql)]
-        else:
-            print('Can not list USB devices on a', platform.system(), 'machine.')
-            devices = []
+        scan = self.master.master.discovery.scan()
 
-        self.master.connectionstatus.hub_status.config(text='Disconnected', foreground='red')
-        self.master.connectionstatus.ov_status.config(text='Disconnected', foreground='red')
-        self.master.connectionstatus.mcu_status.config(text='Disconnected', foreground='red')
         self.connect_button.config(state=DISABLED)
         self.disconnect_button.config(state=DISABLED)
         self.send_reboot.config(state=DISABLED)
         self.get_version.config(state=DISABLED)
         self.master.master.read = False
 
-        for device in devices:
-            if hub_descriptors in device.DeviceID:
-                self.master.connectionstatus.hub_status.config(text='Connected', foreground='green')
-            if ov_descriptors in device.DeviceID:
-                self.master.connectionstatus.ov_status.config(text='Connected', foreground='green')
-            if mcu_descriptors in device.DeviceID:
-                self.master.connectionstatus.mcu_status.config(text='Connected', foreground='green')
-                self.connect_button.config(state=NORMAL)
-            if 'FTDIBUS' in device.DeviceID:
-                self.master.master.com_port = device.Name.split("(")[1].split(")")[0]
-                
+        statuses = {
+            'hub' : self.master.connectionstatus.hub_status,
+            'ov' : self.master.connectionstatus.ov_status,
+            'mcu' : self.master.connectionstatus.mcu_status,
+        }
+
+        for (name, status) in statuses.items():
+            if scan.found[name]:
+                status.config(text='Connected', foreground='green')
+            else:
+                status.config(text='Disconnected', foreground='red')
+
+        if scan.mcu_port is not None:
+            self.master.master.com_port = scan.mcu_port
+            self.connect_button.config(state=NORMAL)
+
     def connect_to_mcu(self):
         
+        self.scan_button.config(state=DISABLED)
         self.connect_button.config(state=DISABLED)
         self.disconnect_button.config(state=NORMAL)
+        self.replay_button.config(state=DISABLED)
         self.send_reboot.config(state=NORMAL)
         self.get_version.config(state=NORMAL)
 
@@ -221,43 +378,76 @@ class Buttons(Frame):
                 parity = serial.PARITY_NONE,
                 stopbits = serial.STOPBITS_ONE,
                 bytesize = serial.EIGHTBITS,
-                timeout = 0)
+                timeout = READ_TIMEOUT)
             
         except Exception as e:
             print("Error: Could not open port '" + self.master.master.com_port + "'.")
             print(e)
+            self.scan_button.config(state=NORMAL)
+            self.connect_button.config(state=NORMAL)
+            self.disconnect_button.config(state=DISABLED)
+            self.replay_button.config(state=NORMAL)
+            self.send_reboot.config(state=DISABLED)
+            self.get_version.config(state=DISABLED)
             return
 
         if not self.master.master.s.is_open:
             self.master.master.s.open()
         
+        self.master.master.commands = commands.CommandChannel(self.master.master.s)
         self.master.master.read = True
         self.master.master.read_serial()
 
+    def replay_file(self):
+
+        filename = filedialog.askopenfilename(title='Replay a raw capture')
+        if not filename:
+            return
+
+        self.scan_button.config(state=DISABLED)
+        self.connect_button.config(state=DISABLED)
+        self.disconnect_button.config(state=NORMAL)
+        self.replay_button.config(state=DISABLED)
+
+        self.master.master.start_replay(filename, replay.SPEEDS[self.replay_speed.get()])
+
     def disconnect_from_mcu(self):
 
+        self.scan_button.config(state=NORMAL)
         self.connect_button.config(state=NORMAL)
         self.disconnect_button.config(state=DISABLED)
         self.send_reboot.config(state=DISABLED)
         self.get_version.config(state=DISABLED)
 
+        self.replay_button.config(state=NORMAL)
+
         self.master.master.read = False
+        self.master.master.load_stats = None
+        if self.master.master.commands is not None:
+            self.master.master.commands.close(wait=False)
+            self.master.master.commands = None
         self.master.master.s.close()
 
     def clear_raw_area(self):
-        self.master.master.raw_serial_data.serial_data.delete('1.0', END)
+        self.master.master.raw_serial_data._clear_entries()
+        self.master.master.live_plot.chart.clear()
 
-    def send_reboot_message(self):
-        message = "~SHRB,REBOOT\r"
+    def send_command(self, command):
+        """
+        Queue a command on the channel's writer thread; the reply, if any,
+        shows up in the raw view like any other record.
+        """
 
-        self.master.master.raw_serial_data.serial_data.insert(END, message + '\n')
-        self.master.master.s.write(message.encode())
+        (name, message, reply_tag) = commands.lookup(command)
 
-    def send_version_get(self):
-        message = "~SHGV\r"
+        self.master.master.raw_serial_data.append([message.decode()])
+        self.master.master.commands.send(command)
 
-        self.master.master.raw_serial_data.serial_data.insert(END, message + '\n')
-        self.master.master.s.write(message.encode())
+    def send_reboot_message(self):
+        self.send_command('reboot')
+
+    def send_version_get(self):
+        self.send_command('version')
 
 class DataDisplay(Frame):
     def __init__(self, parent):
@@ -288,6 +478,12 @@ class DataDisplay(Frame):
         self.accelerometer_data_z_label = Label(self, text='Motion Z:', anchor=E, font='Consolas 12 bold')
         self.accelerometer_data_z = Entry(self, font='Consolas 12 normal', width=width)
 
+        self.queue_depth_label = Label(self, text='Queue Depth:', anchor=W, font='Consolas 12 bold')
+        self.queue_depth = Entry(self, font='Consolas 12 normal', width=width)
+
+        self.dropped_records_label = Label(self, text='Dropped:', anchor=W, font='Consolas 12 bold')
+        self.dropped_records = Entry(self, font='Consolas 12 normal', width=width)
+
     def _place_widgets(self):
         padding=1
 
@@ -309,6 +505,12 @@ class DataDisplay(Frame):
         self.accelerometer_data_z_label.grid(row=1, column=4, columnspan=1, padx=padding, pady=padding, sticky='E')
         self.accelerometer_data_z.grid(row=1, column=5, columnspan=1, padx=padding, pady=padding, sticky='W')
 
+        self.queue_depth_label.grid(row=2, column=0, columnspan=1, padx=padding, pady=padding, sticky='W')
+        self.queue_depth.grid(row=2, column=1, columnspan=1, padx=padding, pady=padding, sticky='W')
+
+        self.dropped_records_label.grid(row=2, column=2, columnspan=1, padx=padding, pady=padding, sticky='W')
+        self.dropped_records.grid(row=2, column=3, columnspan=1, padx=padding, pady=padding, sticky='W')
+
         self.pack(side=TOP, fill=X)
 
     def _clear_entries(self):
@@ -330,10 +532,114 @@ class DataDisplay(Frame):
         self.accelerometer_data_z.delete(0, END)
         self.accelerometer_data_z.insert(0, "0")
 
-class RawSerialData(Frame):
+        self.queue_depth.delete(0, END)
+        self.queue_depth.insert(0, "0")
+
+        self.dropped_records.delete(0, END)
+        self.dropped_records.insert(0, "0")
+
+    def show(self, entry, text):
+        entry.delete(0, END)
+        entry.insert(0, text)
+
+class LivePlot(Frame):
     def __init__(self, parent):
         super().__init__(parent)
 
+        self.drawn = 0
+
+        self._init_widgets()
+        self._place_widgets()
+
+        # matplotlib is only loaded once the window is up, so it doesn't
+        # hold up startup.
+        self.after_idle(self._init_chart)
+
+    def _init_widgets(self):
+        self.frame_cost = Label(self, text='Redraw: 0.0 ms', anchor=W, font='Consolas 10 normal')
+
+    def _place_widgets(self):
+        padding=5
+
+        self.frame_cost.pack(side=TOP, anchor=W, padx=padding)
+
+        self.pack(side=TOP, fill=X)
+
+    def _init_chart(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        padding=5
+
+        self.figure = Figure(figsize=(6, 3), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.chart = StripChart(self.figure, self.canvas)
+
+        self.canvas.get_tk_widget().pack(side=TOP, fill=BOTH, expand=1, padx=padding, before=self.frame_cost)
+
+        self.after(REDRAW_INTERVAL, self.update_plot)
+
+    def update_plot(self):
+        """
+        Redraw at most once per REDRAW_INTERVAL, and only when new samples
+        have arrived.
+        """
+
+        if self.chart.samples != self.drawn:
+            self.drawn = self.chart.samples
+            self.chart.redraw()
+            self.frame_cost.config(text='Redraw: %.1f ms' % self.chart.frame_cost())
+
+        self.after(REDRAW_INTERVAL, self.update_plot)
+
+class StatsPanel(Frame):
+    def __init__(self, parent, interval=STATS_INTERVAL):
+        super().__init__(parent)
+
+        self.interval = interval
+
+        self._init_widgets()
+        self._place_widgets()
+
+        self.after(self.interval, self.refresh)
+
+    def _init_widgets(self):
+        self.label_stats = Label(self, text='Pipeline Stats:', anchor=W, font='Consolas 12 bold')
+        self.stats = Label(self, text='', anchor=W, justify=LEFT, font='Consolas 10 normal')
+
+    def _place_widgets(self):
+        padding=5
+
+        self.label_stats.pack(side=TOP, anchor=W, padx=padding)
+        self.stats.pack(side=TOP, anchor=W, padx=padding)
+
+        self.pack(side=TOP, fill=X)
+
+    def refresh(self):
+        """
+        Show the counters, rates since the last refresh and stage latencies,
+        the running and windowed stats of each channel, then the commands
+        sent and their reply latencies.
+        """
+
+        channel = self.master.commands
+        parts = self.master.instruments.parts() + self.master.stats.parts()
+        if channel is not None:
+            parts += channel.parts()
+
+        self.stats.config(text='\n'.join(parts))
+
+        self.after(self.interval, self.refresh)
+
+class RawSerialData(Frame):
+    def __init__(self, parent, line_limit=LINE_LIMIT):
+        super().__init__(parent)
+
+        # The most recent lines, whether or not the view is paused.
+        self.lines = collections.deque(maxlen=line_limit)
+        self.line_limit = line_limit
+        self.shown = 0
+
         self._init_widgets()
         self._place_widgets()
         self._clear_entries()
@@ -341,18 +647,73 @@ class RawSerialData(Frame):
     def _init_widgets(self):
         width=10
 
+        self.controls = Frame(self)
+        self.paused = BooleanVar(self, False)
+        self.logging = BooleanVar(self, False)
+
+        self.pause_view = Checkbutton(self.controls, text='Pause View', variable=self.paused, command=self.toggle_pause)
+        self.log_to_file = Checkbutton(self.controls, text='Log to File', variable=self.logging, command=self.toggle_log)
+
         self.serial_data = Text(self, font='Consolas 12 normal', width=width, state=NORMAL)
 
     def _place_widgets(self):
         padding=5
 
+        self.pause_view.pack(side=LEFT, padx=padding)
+        self.log_to_file.pack(side=LEFT, padx=padding)
+        self.controls.pack(side=TOP, anchor=W)
+
         self.serial_data.pack(side=TOP, fill=BOTH, expand=1, padx=padding, pady=padding)#.grid(row=0, column=1, columnspan=1, padx=padding, pady=padding, sticky='W')
 
         self.pack(side=TOP, fill=BOTH, expand=1)
 
     def _clear_entries(self):
+        self.lines.clear()
+        self.shown = 0
         self.serial_data.delete('1.0', END)
 
+    def append(self, lines):
+        """
+        Add a batch of lines. While the view is paused they're only kept in
+        the ring buffer; otherwise they're rendered with one insert and the
+        oldest lines are trimmed in bulk once the view is TRIM_SLACK over
+        the line limit.
+        """
+
+        self.lines.extend(lines)
+
+        if self.paused.get():
+            return
+
+        if len(lines) >= self.line_limit:
+            self.redraw()
+            return
+
+        self.serial_data.insert(END, '\n'.join(lines) + '\n')
+        self.shown += len(lines)
+
+        if self.shown > self.line_limit + TRIM_SLACK:
+            self.serial_data.delete('1.0', str(self.shown - self.line_limit + 1) + '.0')
+            self.shown = self.line_limit
+
+        self.serial_data.see(END)
+
+    def redraw(self):
+        self.serial_data.delete('1.0', END)
+        self.serial_data.insert(END, '\n'.join(self.lines) + '\n' if self.lines else '')
+        self.shown = len(self.lines)
+        self.serial_data.see(END)
+
+    def toggle_pause(self):
+        if not self.paused.get():
+            self.redraw()
+
+    def toggle_log(self):
+        if self.logging.get():
+            self.master.start_log()
+        else:
+            self.master.stop_log()
+
 def main():
     app = GUI()
     app.mainloop()
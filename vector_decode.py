@@ -0,0 +1,232 @@
+"""
+Batch decoder for raw capture buffers. Instead of splitting and converting
+one record at a time, the whole buffer is viewed as a uint8 array, records
+are grouped by length and layout, and the hex fields of every record in a
+group are converted at once through a digit lookup table.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import samples
+import compressed
+
+ACCEL_DTYPE = np.dtype([('sample', np.int64), ('x', np.int64), ('y', np.int64), ('z', np.int64)])
+POT_DTYPE = np.dtype([('sample', np.int64), ('value', np.int64)])
+
+ACCEL_TAG = b'~HSAC'
+POT_TAG = b'~HSRD'
+
+# Records of one length decoded at a time.
+BLOCK = 1 << 12
+
+# Hex fields decoded from each record type.
+FIELD_COUNTS = {ACCEL_TAG : 3, POT_TAG : 1}
+
+CR = ord('\r')
+LF = ord('\n')
+COMMA = ord(',')
+
+TERMINATOR = np.zeros(256, dtype=bool)
+TERMINATOR[[CR, LF]] = True
+
+# Bytes searched for terminators at a time.
+SPLIT_BYTES = 1 << 22
+
+# Maps every byte to its hex digit value, or -1 for anything else.
+HEX_DIGITS = np.full(256, -1, dtype=np.int8)
+for digit in b'0123456789':
+    HEX_DIGITS[digit] = digit - ord('0')
+for digit in b'abcdef':
+    HEX_DIGITS[digit] = digit - ord('a') + 10
+    HEX_DIGITS[digit - 32] = digit - ord('a') + 10
+
+def split_records(data):
+    """
+    Return (starts, ends) arrays giving the byte range of every '\\r' or '\\n'
+    terminated record in data, including an unterminated final record.
+    """
+
+    ends = np.concatenate([np.zeros(0, dtype=np.intp)] +
+                          [np.flatnonzero(TERMINATOR[data[offset:offset + SPLIT_BYTES]]) + offset
+                           for offset in range(0, len(data), SPLIT_BYTES)])
+    if len(ends) == 0 or ends[-1] != len(data) - 1:
+        ends = np.append(ends, len(data))
+
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    keep = ends > starts
+    if keep.all():
+        return (starts, ends)
+
+    return (starts[keep], ends[keep])
+
+def tag_mask(data, starts, lengths, tag):
+    """
+    Return a mask of the records whose first comma separated field is tag.
+    """
+
+    mask = (lengths == len(tag)) | (data.take(starts + len(tag), mode='clip') == COMMA)
+    mask &= lengths >= len(tag)
+
+    for column, byte in enumerate(tag):
+        mask &= data.take(starts + column, mode='clip') == byte
+
+    return mask
+
+def decode_fallback(data, start, end, count):
+    """
+    Decode one record the way parse_data does. Used for records whose layout
+    doesn't match the rest of their group. Returns None for a malformed
+    record, which the caller drops, as parse_data does.
+    """
+
+    split = bytes(data[start:end]).split(b',')
+
+    try:
+        return [int(split[field], 16) for field in range(1, count + 1)]
+    except (ValueError, IndexError):
+        return None
+
+def decode_fields(data, starts, ends, count):
+    """
+    Decode the first count hex fields after the tag of every record given
+    by starts and ends. Returns an (n, count) int64 array and a mask of the
+    records that decoded; the values of the others are undefined.
+
+    Records are grouped by length and each group decoded BLOCK records at
+    a time, picked out of a strided view of data, so the temporaries stay
+    a few MB however big the buffer.
+    """
+
+    values = np.empty((len(starts), count), dtype=np.int64)
+    decoded = np.ones(len(starts), dtype=bool)
+    lengths = ends - starts
+
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        windows = sliding_window_view(data, length)
+
+        for first_row in range(0, len(group), BLOCK):
+            block = group[first_row:first_row + BLOCK]
+            rows = windows[starts[block]]
+
+            commas = rows == COMMA
+            pattern = commas[0]
+            same = (commas == pattern).all(axis=1)
+
+            positions = np.flatnonzero(pattern)
+            bounds = np.append(positions, length)
+
+            if len(positions) >= count:
+                selected = rows[same]
+                valid = np.ones(len(selected), dtype=bool)
+                targets = block[same]
+
+                for field in range(count):
+                    first = bounds[field] + 1
+                    last = bounds[field + 1]
+
+                    field_digits = HEX_DIGITS[selected[:, first:last]]
+                    valid &= (field_digits >= 0).all(axis=1) & (last > first)
+
+                    field_values = np.zeros(len(selected), dtype=np.int64)
+                    for column in range(last - first):
+                        field_values <<= 4
+                        field_values += field_digits[:, column]
+                    values[targets, field] = field_values
+
+                # Anything the table couldn't decode goes through the slow path.
+                same_rows = np.flatnonzero(same)
+                same[same_rows[~valid]] = False
+
+            for row in block[~same]:
+                fields = decode_fallback(data, starts[row], ends[row], count)
+                if fields is None:
+                    decoded[row] = False
+                else:
+                    values[row] = fields
+
+    return (values, decoded)
+
+def decode_records(data):
+    """
+    Split a uint8 array into records and decode the '~HSAC' and '~HSRD'
+    ones. Returns {tag : (starts, values)}, where starts are the offsets of
+    the records that decoded and values their fields, and the number of
+    malformed records dropped. rawindex finds records with this too, so
+    its nth offset is always the record decode_buffer numbers n.
+    """
+
+    decoded = {}
+    malformed = 0
+
+    if len(data) == 0:
+        for (tag, count) in FIELD_COUNTS.items():
+            decoded[tag] = (np.zeros(0, dtype=np.int64), np.zeros((0, count), dtype=np.int64))
+        return (decoded, malformed)
+
+    (starts, ends) = split_records(data)
+    lengths = ends - starts
+
+    for (tag, count) in FIELD_COUNTS.items():
+        mask = tag_mask(data, starts, lengths, tag)
+        (values, ok) = decode_fields(data, starts[mask], ends[mask], count)
+        if ok.all():
+            decoded[tag] = (starts[mask], values)
+        else:
+            decoded[tag] = (starts[mask][ok], values[ok])
+        malformed += len(ok) - int(ok.sum())
+
+    return (decoded, malformed)
+
+def trim(accel, pot):
+    """
+    Drop the final sample of the longer stream, as parse_data does.
+    """
+
+    (accel_count, pot_count) = samples.trimmed_counts(len(accel), len(pot))
+
+    return (accel[:accel_count], pot[:pot_count])
+
+def decode_buffer(buffer, trim_streams=True, instruments=None):
+    """
+    Decode every '~HSAC' and '~HSRD' record in a raw byte buffer. Returns a
+    pair of structured arrays (accel, pot) using ACCEL_DTYPE and POT_DTYPE.
+    Malformed records are skipped, and counted in instruments if given,
+    and the samples after them numbered as if they weren't there.
+    """
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    (decoded, malformed) = decode_records(data)
+
+    if instruments is not None:
+        instruments.malformed += malformed
+
+    xyz = decoded[ACCEL_TAG][1]
+    accel = np.zeros(len(xyz), dtype=ACCEL_DTYPE)
+    accel['sample'] = np.arange(len(xyz))
+    accel['x'] = xyz[:, 0]
+    accel['y'] = xyz[:, 1]
+    accel['z'] = xyz[:, 2]
+
+    d = decoded[POT_TAG][1]
+    pot = np.zeros(len(d), dtype=POT_DTYPE)
+    pot['sample'] = np.arange(len(d))
+    pot['value'] = d[:, 0]
+
+    if trim_streams:
+        (accel, pot) = trim(accel, pot)
+
+    return (accel, pot)
+
+def decode_file(filename, trim_streams=True, instruments=None):
+    """
+    Read a whole raw capture file, decompressing it if need be, and decode it
+    with decode_buffer.
+    """
+
+    with compressed.open_read(filename) as file:
+        return decode_buffer(file.read(), trim_streams, instruments)